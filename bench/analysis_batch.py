@@ -0,0 +1,109 @@
+"""Vidage d'un backlog d'analyses IA : un email par appel vs micro-lots.
+
+Des workers (comme ANALYSIS_WORKERS) vident une file d'emails avec AIAgent
+contre le faux serveur OpenAI, d'abord avec `analyze_email` (un appel par
+email) puis avec `analyze_emails` par lots de --batch. Affiche le nombre
+d'appels, les appels par email et la durée totale.
+
+    python bench/analysis_batch.py --messages 200 --workers 4 --batch 10 --latency 0.8
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+
+from openai_standin import OpenAIStandIn  # noqa: E402
+
+SUBJECTS = ["Facture n°{i}", "Commande {i} expédiée", "Support : ticket {i}", "Newsletter semaine {i}"]
+
+
+def make_email(index: int) -> dict:
+    return {
+        "from": f"sender{index}@example.com",
+        "to": "inbox@example.com",
+        "subject": SUBJECTS[index % len(SUBJECTS)].format(i=index),
+        "body": f"Contenu du message {index}. " * 40,
+    }
+
+
+def drain(agent, messages: int, workers: int, batch_size: int) -> dict:
+    backlog = queue.Queue()
+    for i in range(messages):
+        backlog.put((i, make_email(i)))
+
+    results = {}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            batch = {}
+            while len(batch) < batch_size:
+                try:
+                    key, item = backlog.get_nowait()
+                except queue.Empty:
+                    break
+                batch[key] = item
+            if not batch:
+                return
+            if batch_size == 1:
+                (key, item), = batch.items()
+                analyzed = {key: agent.analyze_email(item)}
+            else:
+                analyzed = agent.analyze_emails(batch)
+            with lock:
+                results.update(analyzed)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    return {
+        "batch_size": batch_size,
+        "analyzed": len(results),
+        "mock_fallbacks": sum(1 for r in results.values() if r.get("analysis_type") == "mock"),
+        "wall_seconds": round(wall, 2),
+        "emails_per_second": round(len(results) / wall, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.8, help="latence fixe d'un appel (s)")
+    parser.add_argument("--per-item", type=float, default=0.05, help="latence par email d'un lot (s)")
+    args = parser.parse_args()
+
+    standin = OpenAIStandIn(latency=args.latency, jitter=args.latency / 10, per_item=args.per_item).start()
+    os.environ.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": standin.base_url})
+
+    from parser.ai_agent import AIAgent
+    agent = AIAgent()
+
+    results = []
+    try:
+        for batch_size in (1, args.batch):
+            standin.stats.clear()
+            run = drain(agent, args.messages, args.workers, batch_size)
+            run["llm_calls"] = standin.stats["requests"]
+            run["calls_per_email"] = round(run["llm_calls"] / args.messages, 3)
+            results.append(run)
+    finally:
+        standin.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Pièces jointes : mémoire de pointe et disque, avant / après le stockage par contenu.
+
+Avant : la taille était `len(part.get_payload())` (texte base64, ~33 % de
+trop) et décoder une pièce jointe en créait une copie complète en mémoire
+(`get_payload(decode=True)`). Après : décodage par tranches vers
+ContentAddressedStore, une seule copie sur disque par contenu.
+
+Mesure, pour un message avec une pièce jointe de --size-mb Mo, la mémoire
+allouée en plus du message parsé (tracemalloc) pendant l'extraction, puis
+l'espace disque après --forwards ingestions du même PDF « transféré ».
+
+    python bench/attachment_store.py --size-mb 25 --forwards 20
+"""
+import argparse
+import email
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+
+from archive_store import ContentAddressedStore  # noqa: E402
+from parser.email_analyzer import EmailAnalyzer  # noqa: E402
+
+
+def make_message(index: int, pdf: bytes) -> bytes:
+    msg = MIMEMultipart("mixed")
+    msg["From"] = f"transfert{index}@example.fr"
+    msg["To"] = "inbox@example.com"
+    msg["Subject"] = f"TR: contrat signé ({index})"
+    msg.attach(MIMEText(f"Voir pièce jointe ({index}).", "plain", "utf-8"))
+    attachment = MIMEApplication(pdf, "pdf")
+    attachment.add_header("Content-Disposition", "attachment", filename="contrat.pdf")
+    msg.attach(attachment)
+    return msg.as_bytes()
+
+
+def legacy_extract(msg) -> list:
+    """Ancienne extraction : taille du texte encodé, contenu décodé d'un bloc"""
+    result = []
+    for part in msg.walk():
+        if part.get_content_disposition() == "attachment":
+            content = part.get_payload(decode=True)
+            result.append({"size": len(part.get_payload()), "decoded": len(content)})
+    return result
+
+
+def peak_extra(func, *args) -> tuple:
+    """Pic d'allocation (Mo) pendant func, au-delà de ce qui existait avant"""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, round((peak - base) / 2 ** 20, 1), round(elapsed * 1000, 1)
+
+
+def disk_usage(root: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=25)
+    parser.add_argument("--forwards", type=int, default=20)
+    args = parser.parse_args()
+
+    pdf = b"%PDF-1.7\n" + os.urandom(int(args.size_mb * 2 ** 20))
+    raw = make_message(0, pdf)
+    root = tempfile.mkdtemp(prefix="bench-attachments-")
+    try:
+        store = ContentAddressedStore(root)
+        msg = email.message_from_bytes(raw)
+
+        legacy, legacy_mb, legacy_ms = peak_extra(legacy_extract, msg)
+        analyzer = EmailAnalyzer(store)
+        stored, stored_mb, stored_ms = peak_extra(analyzer._extract_attachments, msg)
+
+        for index in range(1, args.forwards):
+            EmailAnalyzer(store).parse_raw_email(make_message(index, pdf))
+        results = {
+            "attachment_bytes": len(pdf),
+            "message_bytes": len(raw),
+            "before": {
+                "recorded_size": legacy[0]["size"],
+                "extra_peak_mb": legacy_mb,
+                "ms": legacy_ms,
+                "disk_bytes_for_forwards": len(pdf) * args.forwards,
+            },
+            "after": {
+                "recorded_size": stored[0]["size"],
+                "extra_peak_mb": stored_mb,
+                "ms": stored_ms,
+                "disk_bytes_for_forwards": disk_usage(root),
+            },
+            "forwards": args.forwards,
+            "store": store.metrics(),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
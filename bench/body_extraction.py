@@ -0,0 +1,149 @@
+"""Extraction du corps : débit et corps vides sur un corpus de newsletters HTML.
+
+Avant : premier text/plain seulement, décodé en UTF-8 — un email HTML seul
+donne un corps vide. Après : parser.body_text.extract_body (charset déclaré,
+choix dans multipart/alternative, HTML -> texte en flux, normalisation).
+
+Sans --corpus, un corpus synthétique reproduit la forme des newsletters
+réelles : tables imbriquées, styles en ligne, pré-en-tête masqué rempli
+d'invisibles, liens de suivi, quoted-printable, charsets variés, et une
+partie des envois en HTML seul. Avec --corpus, les fichiers .eml du
+répertoire (exports de vraies newsletters) sont utilisés tels quels.
+
+    python bench/body_extraction.py --messages 2000
+    python bench/body_extraction.py --corpus ~/newsletters
+"""
+import argparse
+import email
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+
+from parser.body_text import extract_body  # noqa: E402
+
+WORDS = ("offre exclusive nouveauté livraison gratuite découvrez notre sélection été "
+         "promotion jusqu'à réduction boutique commande produits collection semaine "
+         "événement inscription webinaire article lire la suite conseils").split()
+PREHEADER_FILL = "&zwnj;&nbsp;" * 80
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def newsletter_html(rng: random.Random, index: int) -> str:
+    blocks = []
+    for block in range(rng.randint(4, 12)):
+        link = f"https://click.example.com/t/{index}/{block}?utm_source=newsletter&amp;utm_medium=email"
+        blocks.append(f"""
+        <tr><td style="padding:24px 32px;font-family:Arial,sans-serif;font-size:16px;line-height:24px;color:#333333">
+          <table role="presentation" width="100%" cellpadding="0" cellspacing="0"><tr>
+            <td width="40%"><img src="https://cdn.example.com/{index}/{block}.jpg" alt="" width="200"></td>
+            <td style="vertical-align:top"><h2 style="margin:0 0 8px">{sentence(rng, 5)}</h2>
+              <p style="margin:0">{sentence(rng, rng.randint(20, 60))}</p>
+              <a href="{link}" style="background:#0a66c2;color:#fff;padding:10px 18px">Lire la suite&nbsp;&rarr;</a>
+            </td></tr></table>
+        </td></tr>""")
+    return f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>Newsletter {index}</title>
+<style type="text/css">@media only screen and (max-width:600px){{.col{{width:100%!important}}}}</style></head>
+<body style="margin:0;background:#f4f4f4">
+<div style="display:none;max-height:0;overflow:hidden">{sentence(rng, 10)}{PREHEADER_FILL}</div>
+<table role="presentation" width="100%" cellpadding="0" cellspacing="0"><tr><td align="center">
+<table role="presentation" width="600" style="background:#ffffff">{''.join(blocks)}
+<tr><td style="font-size:12px;color:#999">Vous recevez cet email car vous êtes inscrit.
+<a href="https://example.com/unsubscribe?u={index}">Se désabonner</a> &middot; &copy; 2024</td></tr>
+</table></td></tr></table>
+<img src="https://open.example.com/pixel/{index}.gif" width="1" height="1" alt=""></body></html>"""
+
+
+def make_newsletter(rng: random.Random, index: int) -> bytes:
+    html = newsletter_html(rng, index)
+    charset = rng.choice(("utf-8", "utf-8", "iso-8859-1", "windows-1252"))
+    html_part = MIMEText(html, "html", charset)
+    if rng.random() < 0.4:
+        msg = html_part  # HTML seul
+    else:
+        msg = MIMEMultipart("alternative")
+        plain = "Voir cet email dans votre navigateur : https://example.com/view" if rng.random() < 0.5 \
+            else "\n\n".join(sentence(rng, 40) for _ in range(8))
+        msg.attach(MIMEText(plain, "plain", charset))
+        msg.attach(html_part)
+    msg["Subject"] = f"Newsletter n°{index}"
+    msg["From"] = "news@example.com"
+    return msg.as_bytes()
+
+
+def legacy_body(msg) -> str:
+    """Ancienne extraction : premier text/plain, UTF-8"""
+    for part in msg.walk():
+        if part.get_content_type() == "text/plain":
+            return (part.get_payload(decode=True) or b"").decode("utf-8", errors="ignore")
+    return ""
+
+
+def measure(extract, messages: list, repeat: int) -> dict:
+    timings = []
+    bodies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        bodies = [extract(msg) for msg in messages]
+        timings.append(time.perf_counter() - start)
+    texts = [body[0] if isinstance(body, tuple) else body for body in bodies]
+    best = min(timings)
+    return {
+        "messages_per_s": round(len(messages) / best, 1),
+        "ms_per_message": round(best * 1000 / len(messages), 3),
+        "empty_bodies": sum(1 for text in texts if not text.strip()),
+        "median_chars": int(statistics.median(len(text) for text in texts)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--corpus", help="répertoire de fichiers .eml")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.corpus:
+        raws = []
+        for name in sorted(os.listdir(args.corpus)):
+            if name.endswith(".eml"):
+                with open(os.path.join(args.corpus, name), "rb") as f:
+                    raws.append(f.read())
+    else:
+        rng = random.Random(args.seed)
+        raws = [make_newsletter(rng, i) for i in range(args.messages)]
+    # Le parsing MIME est commun aux deux versions : seule l'extraction est mesurée
+    messages = [email.message_from_bytes(raw) for raw in raws]
+
+    before = measure(legacy_body, messages, args.repeat)
+    after = measure(extract_body, messages, args.repeat)
+    total_mb = sum(len(raw) for raw in raws) / 2 ** 20
+    for result in (before, after):
+        result["mb_per_s"] = round(total_mb * result["messages_per_s"] / len(raws), 1)
+    formats = {}
+    for msg in messages:
+        fmt = extract_body(msg)[1] or "vide"
+        formats[fmt] = formats.get(fmt, 0) + 1
+
+    print(json.dumps({
+        "messages": len(raws),
+        "corpus_mb": round(total_mb, 1),
+        "before": before,
+        "after": after,
+        "after_formats": formats,
+    }, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Débit et couverture du classifieur local (parser/classifier.py).
+
+Génère un corpus synthétique proche de notre trafic (factures, confirmations
+de commande, newsletters, support, emails personnels), mesure les emails/s de
+LocalClassifier.classify et la part d'emails classés sans appel au LLM.
+
+    python bench/classifier_throughput.py --messages 20000 --body 3000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+
+from parser.classifier import LocalClassifier  # noqa: E402
+
+TEMPLATES = [
+    ("facture", 0.35, "facturation@energie.fr", "Votre facture n°{i} est disponible",
+     "Bonjour, votre facture du mois est disponible. Montant TTC : {n},00 EUR. Échéance le 15."),
+    ("commande", 0.30, "orders@boutique.fr", "Confirmation de votre commande {i}",
+     "Merci pour votre achat. Numéro de commande : {i}. Suivi de colis disponible sous 48 h."),
+    ("newsletter", 0.15, "newsletter@media.fr", "Les nouveautés de la semaine",
+     "Découvrez nos articles. Pour vous désinscrire, cliquez sur le lien en bas de page."),
+    ("support", 0.05, "client{i}@gmail.com", "Problème de connexion à mon compte",
+     "Bonjour, l'application ne fonctionne plus depuis hier, j'ai un message d'erreur."),
+    ("personnel", 0.15, "ami{i}@gmail.com", "On se voit jeudi ?",
+     "Salut, je passe en ville jeudi, tu es dispo pour un café ? Dis-moi."),
+]
+
+
+def make_corpus(count: int, body_size: int, seed: int = 42):
+    rng = random.Random(seed)
+    weights = [t[1] for t in TEMPLATES]
+    corpus = []
+    for i in range(count):
+        label, _, sender, subject, body = rng.choices(TEMPLATES, weights)[0]
+        filler = " Texte de remplissage sans mot-clé particulier." * (body_size // 48)
+        corpus.append((label, {
+            "from": sender.format(i=i),
+            "subject": subject.format(i=i),
+            "body": body.format(i=i, n=rng.randint(20, 400)) + filler,
+        }))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--body", type=int, default=3000, help="taille approximative du corps")
+    args = parser.parse_args()
+
+    classifier = LocalClassifier()
+    corpus = make_corpus(args.messages, args.body)
+
+    start = time.perf_counter()
+    results = [classifier.classify(email) for _, email in corpus]
+    elapsed = time.perf_counter() - start
+
+    local = [(label, r) for (label, _), r in zip(corpus, results) if r is not None]
+    correct = sum(1 for label, r in local if r["category"] == label)
+
+    print(json.dumps({
+        "messages": args.messages,
+        "emails_per_second": round(args.messages / elapsed),
+        "us_per_email": round(elapsed * 1e6 / args.messages, 1),
+        "classified_locally": round(len(local) / args.messages, 3),
+        "local_precision": round(correct / len(local), 3) if local else None,
+        "llm_calls_avoided": len(local),
+        "min_confidence": classifier.min_confidence,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Comparer deux résultats JSON de benchmark et signaler les régressions.
+
+Les valeurs numériques de même chemin sont comparées. Le sens se déduit du
+nom : `*_per_s` (débit) doit monter ; latences (`*_ms`, `*_seconds`) et
+mémoire (`*_mb`) doivent baisser. Une dégradation au-delà de --threshold %
+est une régression, et le code de sortie vaut alors 1 (utilisable en CI).
+
+    python bench/compare.py bench/results/full_path-A.json bench/results/full_path-B.json
+    python bench/compare.py old.json new.json --threshold 5
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Optional, Tuple
+
+HIGHER_IS_BETTER = ("_per_s",)
+LOWER_IS_BETTER = ("_ms", "_seconds", "_mb", "us_per_call")
+
+
+def flatten(value, path: str = "") -> Iterator[Tuple[str, float]]:
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from flatten(child, f"{path}.{key}" if path else key)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield path, float(value)
+
+
+def direction(path: str) -> Optional[int]:
+    """+1 si plus haut est mieux, -1 si plus bas est mieux, None si neutre (compteurs)"""
+    name = path.rsplit(".", 1)[-1]
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    return None
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> list:
+    old = dict(flatten(before.get("results", before)))
+    rows = []
+    for path, new_value in flatten(after.get("results", after)):
+        sense = direction(path)
+        if sense is None or path not in old or old[path] == 0:
+            continue
+        change = (new_value - old[path]) / abs(old[path]) * 100
+        regression = sense * change < -threshold
+        rows.append((path, old[path], new_value, change, regression))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0, help="écart toléré en %%")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    for label, document in (("avant", before), ("après", after)):
+        environment = document.get("environment", {})
+        print(f"{label}: commit {environment.get('commit')} ({environment.get('date')}, "
+              f"{environment.get('cpu_count')} cœurs)")
+
+    rows = compare(before, after, args.threshold)
+    width = max((len(row[0]) for row in rows), default=10)
+    for path, old, new, change, regression in rows:
+        flag = "  RÉGRESSION" if regression else ""
+        print(f"{path:<{width}}  {old:>12g}  {new:>12g}  {change:+7.1f}%{flag}")
+
+    regressions = sum(1 for row in rows if row[4])
+    print(f"{len(rows)} mesures comparées, {regressions} régressions (seuil {args.threshold:g} %)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Corpus de boîte aux lettres synthétique et reproductible pour les benchmarks.
+
+Mélange pondéré des formes rencontrées en production : textes courts,
+multipart/alternative latin-1 + HTML, newsletters HTML seules, charsets
+variés (Windows-1252, ISO-2022-JP, KOI8-R, en-têtes encodés RFC 2047),
+pièces jointes de 200 Ko et quelques messages de 1 à 5 Mo. La même graine
+donne les mêmes octets : deux exécutions comparent le même corpus.
+
+Autonome (aucun import des services) : utilisable aussi bien dans le
+processus du mail-fetcher que du mail-parser.
+
+    python bench/corpus.py --messages 500 --output /tmp/corpus   # fichiers .eml
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+from datetime import datetime, timedelta, timezone
+from email.header import Header
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime
+from typing import Callable, Dict, List, Tuple
+
+WORDS = ("bonjour merci facture commande livraison paiement contrat réunion projet devis relance "
+         "échéance virement colis remboursement garantie abonnement dossier client semaine "
+         "invoice meeting shipment refund reminder deadline").split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _headers(msg, rng: random.Random, index: int, subject: str):
+    sent = datetime(2024, 1, 1, 8, 0, tzinfo=timezone.utc) + timedelta(minutes=index)
+    msg["From"] = f"Expéditeur {index % 97} <sender{index % 97}@example.com>"
+    msg["To"] = "inbox@example.com"
+    msg["Subject"] = subject
+    msg["Date"] = format_datetime(sent)
+    msg["Message-ID"] = f"<corpus-{index}-{rng.randrange(10 ** 9)}@example.com>"
+
+
+def short_text(rng: random.Random, index: int) -> bytes:
+    """Échange court en text/plain UTF-8"""
+    msg = MIMEText("\n\n".join(_sentence(rng, rng.randint(8, 30)) for _ in range(rng.randint(1, 4))),
+                   "plain", "utf-8")
+    _headers(msg, rng, index, f"Re: {_sentence(rng, 4)}")
+    return msg.as_bytes()
+
+
+def alternative(rng: random.Random, index: int) -> bytes:
+    """multipart/alternative : texte latin-1 et HTML"""
+    paragraphs = [_sentence(rng, rng.randint(20, 50)) for _ in range(rng.randint(2, 8))]
+    msg = MIMEMultipart("alternative")
+    msg.attach(MIMEText("\n\n".join(paragraphs), "plain", "iso-8859-1"))
+    msg.attach(MIMEText("".join(f"<p>{p}</p>" for p in paragraphs), "html", "utf-8"))
+    _headers(msg, rng, index, f"Facture n°{index} — échéance")
+    return msg.as_bytes()
+
+
+def newsletter(rng: random.Random, index: int) -> bytes:
+    """Newsletter HTML seule : tables, styles en ligne, pré-en-tête masqué"""
+    blocks = "".join(
+        f'<tr><td style="padding:24px;font-family:Arial"><h2>{_sentence(rng, 5)}</h2>'
+        f'<p>{_sentence(rng, rng.randint(20, 60))}</p>'
+        f'<a href="https://click.example.com/{index}/{block}?utm_source=newsletter">Lire la suite</a></td></tr>'
+        for block in range(rng.randint(4, 12))
+    )
+    html = (f'<html><head><style>.col{{width:100%}}</style></head><body>'
+            f'<div style="display:none">{_sentence(rng, 10)}{"&zwnj;&nbsp;" * 60}</div>'
+            f'<table width="600">{blocks}</table></body></html>')
+    msg = MIMEText(html, "html", rng.choice(("utf-8", "windows-1252")))
+    _headers(msg, rng, index, f"Newsletter n°{index}")
+    return msg.as_bytes()
+
+
+def foreign_charset(rng: random.Random, index: int) -> bytes:
+    """Charset non latin et sujet encodé RFC 2047"""
+    charset, text, subject = rng.choice((
+        ("iso-2022-jp", "お世話になっております。請求書を添付いたします。", "請求書のご送付"),
+        ("koi8-r", "Здравствуйте, счёт во вложении. Спасибо.", "Счёт за услуги"),
+        ("windows-1252", "Bonjour, le reçu de l’été est joint — merci.", "Reçu de l’été"),
+    ))
+    msg = MIMEText(text * rng.randint(1, 20), "plain", charset)
+    _headers(msg, rng, index, "")
+    msg.replace_header("Subject", Header(f"{subject} #{index}", charset).encode())
+    return msg.as_bytes()
+
+
+def with_attachment(size: int) -> Callable[[random.Random, int], bytes]:
+    """Texte + pièce jointe PDF de `size` octets (contenu aléatoire, donc unique)"""
+    def make(rng: random.Random, index: int) -> bytes:
+        msg = MIMEMultipart("mixed")
+        msg.attach(MIMEText(f"Voir pièce jointe ({index}).\n" + _sentence(rng, 20), "plain", "utf-8"))
+        attachment = MIMEApplication(rng.randbytes(size), "pdf")
+        attachment.add_header("Content-Disposition", "attachment", filename=f"document-{index}.pdf")
+        msg.attach(attachment)
+        _headers(msg, rng, index, f"TR: document signé ({index})")
+        return msg.as_bytes()
+    return make
+
+
+# (nom, proportion, fabrique)
+MIX: List[Tuple[str, float, Callable[[random.Random, int], bytes]]] = [
+    ("short_text", 0.35, short_text),
+    ("alternative", 0.20, alternative),
+    ("newsletter", 0.20, newsletter),
+    ("foreign_charset", 0.08, foreign_charset),
+    ("attachment_200k", 0.14, with_attachment(200 * 1024)),
+    ("attachment_1m", 0.025, with_attachment(1024 * 1024)),
+    ("attachment_5m", 0.005, with_attachment(5 * 1024 * 1024)),
+]
+
+
+def build_corpus(count: int, seed: int = 42) -> List[bytes]:
+    """`count` messages RFC822 tirés de MIX (déterministe pour une graine donnée)"""
+    rng = random.Random(seed)
+    weights = [weight for _, weight, _ in MIX]
+    return [rng.choices(MIX, weights)[0][2](rng, index) for index in range(count)]
+
+
+def describe(corpus: List[bytes]) -> Dict:
+    """Taille totale et distribution des tailles (pour le rapport JSON)"""
+    sizes = sorted(len(raw) for raw in corpus)
+    return {
+        "messages": len(corpus),
+        "bytes": sum(sizes),
+        "median_bytes": int(statistics.median(sizes)) if sizes else 0,
+        "max_bytes": sizes[-1] if sizes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="répertoire où écrire les fichiers .eml")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+        for index, raw in enumerate(corpus):
+            with open(os.path.join(args.output, f"{index:06d}.eml"), "wb") as f:
+                f.write(raw)
+    print(json.dumps(describe(corpus), indent=2))
+
+
+if __name__ == "__main__":
+    main()
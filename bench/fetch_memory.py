@@ -0,0 +1,72 @@
+"""Pic mémoire de la lecture IMAP : liste complète vs lecture en flux.
+
+Compare `fetch_unread_emails` (toute la boîte en mémoire) et
+`iter_unread_emails` (un bloc à la fois) avec tracemalloc, pour plusieurs
+tailles de boîte. En flux, le pic doit rester constant.
+
+    python bench/fetch_memory.py --sizes 100 400 --body 65536
+"""
+import argparse
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mail-fetcher"))
+
+from imap_standin import IMAPStandIn, make_message  # noqa: E402
+
+
+def measure(standin: IMAPStandIn, streaming: bool) -> dict:
+    from imap_reader import IMAPReader
+
+    reader = IMAPReader()
+    reader.connect()
+    count = 0
+
+    tracemalloc.start()
+    if streaming:
+        for email_msgs in reader.iter_unread_emails():
+            count += len(email_msgs)
+    else:
+        count = len(reader.fetch_unread_emails())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    reader.disconnect()
+    return {"messages": count, "peak_mb": round(peak / 1024 / 1024, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 400])
+    parser.add_argument("--body", type=int, default=65536, help="taille du corps en octets")
+    parser.add_argument("--window", type=int, default=2 * 1024 * 1024, help="FETCH_WINDOW_BYTES")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        standin = IMAPStandIn([make_message(i, args.body) for i in range(size)]).start()
+        os.environ.update({
+            "IMAP_HOST": standin.host,
+            "IMAP_PORT": str(standin.port),
+            "IMAP_SSL": "false",
+            "EMAIL_USER": "bench@example.com",
+            "EMAIL_PASSWORD": "bench",
+            "FETCH_SINCE_DAYS": "3650",
+            "FETCH_WINDOW_BYTES": str(args.window),
+        })
+        try:
+            results.append({
+                "inbox_size": size,
+                "materialized": measure(standin, streaming=False),
+                "streaming": measure(standin, streaming=True),
+            })
+        finally:
+            standin.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Chemin complet fetcher -> parser -> PostgreSQL -> analyse IA, sans service externe.
+
+Lance en local :
+- le serveur IMAP de test (imap_standin), rempli avec le corpus synthétique (corpus.py) ;
+- le faux OpenAI (openai_standin), latence et taux d'erreur configurables ;
+- PostgreSQL jetable (pg_standin), ou la base de --database-url ;
+- le mail-parser réel (uvicorn, processus séparé).
+
+Puis exécute un cycle du MailFetcher réel dans ce processus : lecture IMAP,
+envoi au parser, stockage, marquage \\Seen. Il attend ensuite que la file
+d'analyse soit vide. Le rapport JSON (bench/results/full_path-*.json) donne :
+- le débit (emails/s stockés, puis analysés) ;
+- la latence p50/p95/p99 des requêtes au parser et du délai stockage -> analyse ;
+- le temps par étape du cycle ;
+- les moyennes des histogrammes /metrics du parser ;
+- la mémoire de pointe du parser et du cycle de lecture.
+
+    python bench/full_path.py --messages 500
+    python bench/full_path.py --parser-mode batch --ai-latency 2 --ai-error-rate 0.05
+    python bench/full_path.py --database-url postgresql://... --output run.json
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+import httpx
+import psycopg2
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH, "..")
+PARSER_DIR = os.path.join(ROOT, "mail-parser")
+# Seul le mail-fetcher est importé ici (app et models existent dans les deux services)
+sys.path.insert(0, os.path.join(ROOT, "mail-fetcher"))
+sys.path.insert(0, BENCH)
+
+from corpus import build_corpus, describe  # noqa: E402
+from imap_standin import IMAPStandIn  # noqa: E402
+from openai_standin import OpenAIStandIn  # noqa: E402
+from pg_standin import PostgresStandIn  # noqa: E402
+from results import latency_summary, memory_mb, reset_peak_memory, write_results  # noqa: E402
+
+_SAMPLE = re.compile(r'^(\w+)_(sum|count)(\{[^}]*\})? (\S+)$')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_parser(env: Dict[str, str]) -> tuple:
+    """Lancer le mail-parser (uvicorn) et attendre que son pool DB soit ouvert"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=PARSER_DIR, env=env
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"mail-parser arrêté au démarrage (code {process.returncode})")
+        try:
+            health = httpx.get(f"{url}/health", timeout=2.0).json()
+            if health.get("database", {}).get("open"):
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("mail-parser non prêt après 60s")
+
+
+def histogram_means(exposition: str, prefix: str = "mailparser_") -> Dict[str, float]:
+    """Moyenne (ms) de chaque série d'histogramme *_seconds d'une page /metrics"""
+    sums, counts = {}, {}
+    for line in exposition.splitlines():
+        match = _SAMPLE.match(line)
+        if not match or not match.group(1).startswith(prefix) or not match.group(1).endswith("_seconds"):
+            continue
+        series = match.group(1) + (match.group(3) or "")
+        (sums if match.group(2) == "sum" else counts)[series] = float(match.group(4))
+    return {
+        series: round(sums[series] * 1000 / count, 2)
+        for series, count in sorted(counts.items()) if count and series in sums
+    }
+
+
+def wait_for_analyses(client: httpx.Client, timeout: float) -> Dict:
+    """Attendre que la file d'analyse soit vide ; état final de la file"""
+    deadline = time.monotonic() + timeout
+    queue = {}
+    while time.monotonic() < deadline:
+        queue = client.get("/analysis/queue").json()
+        if queue["jobs"]["pending"] + queue["jobs"]["running"] == 0:
+            break
+        time.sleep(0.25)
+    return queue
+
+
+def analysis_lags(database_url: str, account: str) -> List[float]:
+    """Délai (s) entre le stockage de chaque email et son analyse"""
+    with psycopg2.connect(database_url) as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT EXTRACT(EPOCH FROM a.created_at - e.received_at)
+            FROM emails e JOIN analyses a ON a.email_id = e.id
+            WHERE e.account = %s;
+        """, (account,))
+        return [float(row[0]) for row in cur.fetchall()]
+
+
+def run(args, database_url: str, openai: OpenAIStandIn, imap: IMAPStandIn, workdir: str) -> Dict:
+    run_id = uuid.uuid4().hex[:8]
+    # Compte propre à l'exécution : clés d'idempotence distinctes sur une base réutilisée
+    username = f"bench-{run_id}"
+    parser_env = dict(
+        os.environ,
+        MAIL_PARSER_DATABASE_URL=database_url,
+        OPENAI_API_KEY="bench",
+        OPENAI_BASE_URL=openai.base_url,
+        ARCHIVE_DIR=os.path.join(workdir, "archive"),
+        ATTACHMENT_STORE_DIR=os.path.join(workdir, "attachments"),
+        LOG_LEVEL="WARNING",
+    )
+    if args.parse_processes is not None:
+        parser_env["PARSE_PROCESSES"] = str(args.parse_processes)
+    parser_process, parser_url = start_parser(parser_env)
+
+    os.environ.update(
+        IMAP_HOST=imap.host, IMAP_PORT=str(imap.port), IMAP_SSL="false",
+        EMAIL_USER=username, EMAIL_PASSWORD="bench", EMAIL_PROVIDER="bench",
+        MAIL_PARSER_URL=parser_url, SYNC_MODE="checkpoint", FETCH_TRIGGER="poll",
+        SYNC_STATE_PATH=os.path.join(workdir, "sync-state.json"),
+        PARSER_MODE=args.parser_mode, PARSER_BATCH_SIZE=str(args.batch_size),
+        MAX_IN_FLIGHT=str(args.max_in_flight), LOG_LEVEL="WARNING",
+    )
+    from app import MailFetcher
+    from pipeline import StageTimings
+
+    fetcher = MailFetcher()
+    request_seconds: List[float] = []
+    post = fetcher._post
+
+    def timed_post(endpoint, **kwargs):
+        start = time.perf_counter()
+        try:
+            return post(endpoint, **kwargs)
+        finally:
+            request_seconds.append(time.perf_counter() - start)
+
+    fetcher._post = timed_post
+    client = httpx.Client(base_url=parser_url, timeout=30.0)
+    try:
+        if not fetcher.imap_reader.ensure_connected():
+            raise RuntimeError("Connexion au serveur IMAP de test impossible")
+        memory_before = memory_mb()
+        peak_reset = reset_peak_memory()
+
+        start = time.perf_counter()
+        cycle = fetcher._run_cycle(StageTimings())
+        ingest_seconds = time.perf_counter() - start
+        fetch_memory = memory_mb()
+
+        queue = wait_for_analyses(client, args.drain_timeout)
+        total_seconds = time.perf_counter() - start
+        parser_memory = memory_mb(parser_process.pid, children=True)
+        parser_metrics = histogram_means(client.get("/metrics").text)
+    finally:
+        client.close()
+        fetcher.close()
+        parser_process.terminate()
+        parser_process.wait(timeout=30)
+
+    processed = cycle["processed"]
+    return {
+        "parser_mode": args.parser_mode,
+        "emails_stored": processed,
+        "emails_failed": cycle["failed"],
+        "ingest_seconds": round(ingest_seconds, 2),
+        "ingest_emails_per_s": round(processed / ingest_seconds, 1) if ingest_seconds else 0.0,
+        "analyzed_emails_per_s": round(processed / total_seconds, 1) if total_seconds else 0.0,
+        "parser_request_latency": latency_summary(request_seconds),
+        "analysis_lag": latency_summary(analysis_lags(database_url, f"{username}@{imap.host}")),
+        "analysis_queue": queue["jobs"],
+        "openai_requests": openai.stats["requests"],
+        "imap_round_trips": imap.round_trips(),
+        "cycle_stages": fetcher.last_cycle_timings.get("stages", {}),
+        "parser_histogram_means_ms": parser_metrics,
+        "memory": {
+            "parser_peak_mb": parser_memory["peak_mb"],
+            # Pic du processus de benchmark pendant le cycle, au-delà du RSS de départ
+            # (corpus et serveurs de test déjà chargés) ; absent si VmHWM n'a pu être remis à zéro
+            "fetch_cycle_extra_mb": round(fetch_memory["peak_mb"] - memory_before["rss_mb"], 1)
+            if peak_reset else None,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--parser-mode", choices=("single", "batch"), default="single")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--parse-processes", type=int, help="PARSE_PROCESSES du parser (défaut du service)")
+    parser.add_argument("--imap-latency", type=float, default=0.0, help="latence par commande IMAP (s)")
+    parser.add_argument("--ai-latency", type=float, default=0.5, help="latence moyenne du faux OpenAI (s)")
+    parser.add_argument("--ai-jitter", type=float, default=0.1)
+    parser.add_argument("--ai-error-rate", type=float, default=0.0)
+    parser.add_argument("--database-url", help="base existante au lieu d'un PostgreSQL jetable")
+    parser.add_argument("--pg-no-fsync", action="store_true", help="PostgreSQL jetable sans fsync")
+    parser.add_argument("--drain-timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="fichier JSON (défaut : bench/results/full_path-<date>.json)")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    imap = IMAPStandIn(corpus, latency=args.imap_latency).start()
+    openai = OpenAIStandIn(args.ai_latency, args.ai_jitter, args.ai_error_rate).start()
+    postgres = None if args.database_url else PostgresStandIn(fsync=not args.pg_no_fsync).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="bench-full-path-") as workdir:
+            results = run(args, args.database_url or postgres.url, openai, imap, workdir)
+    finally:
+        imap.stop()
+        openai.stop()
+        if postgres:
+            postgres.stop()
+
+    results["corpus"] = describe(corpus)
+    results["settings"] = {k: v for k, v in vars(args).items() if k not in ("database_url", "output")}
+    path = write_results("full_path", results, args.output)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Résultats : {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
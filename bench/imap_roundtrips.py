@@ -0,0 +1,89 @@
+"""Aller-retours IMAP d'un cycle : FETCH/STORE par UID vs par blocs.
+
+Lance le serveur IMAP de test avec une latence par commande puis lit et
+marque toute la boîte avec IMAPReader, d'abord un UID à la fois (ancien
+comportement), puis avec IMAP_FETCH_CHUNK_SIZE et un STORE groupé.
+
+    python bench/imap_roundtrips.py --messages 200 --latency 0.05 --chunk 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mail-fetcher"))
+
+from imap_standin import IMAPStandIn, make_message  # noqa: E402
+
+
+def run_cycle(standin: IMAPStandIn, chunk_size: int, batched_store: bool) -> dict:
+    from imap_reader import IMAPReader
+
+    # Remettre tous les messages en non lus
+    for m in standin.mailbox.messages:
+        m.flags.discard("\\Seen")
+
+    reader = IMAPReader()
+    reader.fetch_chunk_size = chunk_size
+    standin.reset_stats()
+
+    start = time.perf_counter()
+    reader.connect()
+    uids = reader.search_unread_uids()
+    fetched = []
+    for i in range(0, len(uids), chunk_size):
+        fetched.extend(reader.fetch_emails(uids[i:i + chunk_size]))
+    if batched_store:
+        reader.mark_emails_as_seen([m.uid for m in fetched])
+    else:
+        for m in fetched:
+            reader.mark_email_as_seen(m.uid)
+    reader.disconnect()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "chunk_size": chunk_size,
+        "batched_store": batched_store,
+        "messages": len(fetched),
+        "round_trips": standin.round_trips(),
+        "commands": dict(standin.stats),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--size", type=int, default=4096)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--chunk", type=int, default=50)
+    args = parser.parse_args()
+
+    standin = IMAPStandIn(
+        [make_message(i, args.size) for i in range(args.messages)],
+        latency=args.latency
+    ).start()
+
+    os.environ.update({
+        "IMAP_HOST": standin.host,
+        "IMAP_PORT": str(standin.port),
+        "IMAP_SSL": "false",
+        "EMAIL_USER": "bench@example.com",
+        "EMAIL_PASSWORD": "bench",
+        "FETCH_SINCE_DAYS": "3650",
+    })
+
+    try:
+        results = {
+            "before": run_cycle(standin, chunk_size=1, batched_store=False),
+            "after": run_cycle(standin, chunk_size=args.chunk, batched_store=True),
+        }
+    finally:
+        standin.stop()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
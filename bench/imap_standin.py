@@ -0,0 +1,307 @@
+"""Serveur IMAP minimal en mémoire pour les benchmarks du mail-fetcher.
+
+Il implémente juste ce qu'utilise IMAPReader (LOGIN, SELECT, UID SEARCH,
+UID FETCH, UID STORE, NOOP, IDLE, LOGOUT), sans TLS, avec une latence injectée
+par commande pour simuler un lien lointain vers Gmail. Chaque commande est
+comptée : `server.stats` donne le nombre d'aller-retours d'un cycle.
+
+Utilisation :
+    server = IMAPStandIn(messages, latency=0.05).start()
+    # IMAP_HOST=127.0.0.1 IMAP_PORT=server.port IMAP_SSL=false
+    server.stop()
+"""
+import re
+import select
+import socketserver
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import List, Optional
+
+SEARCH_DATE_FORMAT = "%d-%b-%Y"
+
+
+def make_message(index: int, body_size: int = 2048) -> bytes:
+    """Générer un email texte simple d'environ `body_size` octets"""
+    sent = datetime(2024, 1, 1, 8, 0, tzinfo=timezone.utc) + timedelta(minutes=index)
+    body = (f"Ligne {index} du message de test. " * (body_size // 32 + 1))[:body_size]
+    return (
+        f"From: Expediteur {index} <sender{index}@example.com>\r\n"
+        f"To: inbox@example.com\r\n"
+        f"Subject: Message de test #{index}\r\n"
+        f"Date: {format_datetime(sent)}\r\n"
+        f"Message-ID: <bench-{index}@example.com>\r\n"
+        f"MIME-Version: 1.0\r\n"
+        f"Content-Type: text/plain; charset=utf-8\r\n"
+        f"\r\n"
+        f"{body}\r\n"
+    ).encode("utf-8")
+
+
+class StoredMessage:
+    def __init__(self, uid: int, raw: bytes, flags=None, internal_date: Optional[datetime] = None):
+        self.uid = uid
+        self.raw = raw
+        self.flags = set(flags or [])
+        self.internal_date = internal_date or datetime.now()
+
+
+class Mailbox:
+    """Boîte en mémoire partagée par toutes les connexions"""
+
+    def __init__(self, messages: List[bytes], uid_validity: int = 1):
+        self.lock = threading.Lock()
+        self.uid_validity = uid_validity
+        self.messages: List[StoredMessage] = []
+        self.uid_next = 1
+        for raw in messages:
+            self.append(raw)
+
+    def append(self, raw: bytes, flags=None) -> StoredMessage:
+        with self.lock:
+            msg = StoredMessage(self.uid_next, raw, flags)
+            self.messages.append(msg)
+            self.uid_next += 1
+            return msg
+
+    def by_uid_set(self, uid_set: str) -> List[StoredMessage]:
+        """Résoudre un ensemble d'UID IMAP (`1,3,5:7`, `10:*`)"""
+        max_uid = self.uid_next - 1
+        wanted = []
+        for part in uid_set.split(","):
+            if ":" in part:
+                low, high = part.split(":")
+                low = max_uid if low == "*" else int(low)
+                high = max_uid if high == "*" else int(high)
+                low, high = min(low, high), max(low, high)
+                wanted.append((low, high))
+            else:
+                uid = max_uid if part == "*" else int(part)
+                wanted.append((uid, uid))
+        return [m for m in self.messages if any(lo <= m.uid <= hi for lo, hi in wanted)]
+
+
+def _tokenize(text: str) -> List[str]:
+    """Découper une ligne de commande (atomes, chaînes entre guillemets, listes)"""
+    return [t for t in re.findall(r'"(?:[^"\\]|\\.)*"|\([^)]*\)|\S+', text)]
+
+
+def _literal(data: bytes) -> bytes:
+    return b"{" + str(len(data)).encode() + b"}\r\n" + data
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # Réponses en plusieurs lignes : éviter Nagle + ACK retardé en local
+    disable_nagle_algorithm = True
+
+    def send(self, line):
+        if isinstance(line, str):
+            line = line.encode("utf-8")
+        self.wfile.write(line + b"\r\n")
+
+    def handle(self):
+        server: "IMAPStandIn" = self.server.standin
+        mailbox = server.mailbox
+        self.send(f"* OK [CAPABILITY {server.capabilities}] IMAP stand-in ready")
+
+        while True:
+            raw_line = self.rfile.readline()
+            if not raw_line:
+                return
+            line = raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+            if not line:
+                continue
+
+            tag, _, rest = line.partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            is_uid = False
+            if command == "UID":
+                is_uid = True
+                command, _, args = args.partition(" ")
+                command = command.upper()
+
+            server.record(f"UID {command}" if is_uid else command)
+            if server.latency:
+                time.sleep(server.latency)
+
+            if command == "CAPABILITY":
+                self.send(f"* CAPABILITY {server.capabilities}")
+                self.send(f"{tag} OK CAPABILITY completed")
+            elif command == "LOGIN":
+                self.send(f"{tag} OK LOGIN completed")
+            elif command in ("SELECT", "EXAMINE"):
+                with mailbox.lock:
+                    self.send(f"* {len(mailbox.messages)} EXISTS")
+                    self.send("* 0 RECENT")
+                    self.send("* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)")
+                    self.send(f"* OK [UIDVALIDITY {mailbox.uid_validity}] UIDs valid")
+                    self.send(f"* OK [UIDNEXT {mailbox.uid_next}] Predicted next UID")
+                self.send(f"{tag} OK [READ-WRITE] {command} completed")
+            elif command == "NOOP":
+                self.send(f"{tag} OK NOOP completed")
+            elif command == "IDLE" and server.idle:
+                self._idle(mailbox)
+                self.send(f"{tag} OK IDLE terminated")
+            elif command == "LOGOUT":
+                self.send("* BYE IMAP stand-in closing")
+                self.send(f"{tag} OK LOGOUT completed")
+                return
+            elif command == "SEARCH" and is_uid:
+                uids = self._search(mailbox, _tokenize(args))
+                self.send("* SEARCH" + "".join(f" {u}" for u in uids))
+                self.send(f"{tag} OK SEARCH completed")
+            elif command == "FETCH" and is_uid:
+                uid_set, _, items = args.partition(" ")
+                self._fetch(mailbox, uid_set, items.strip("()").upper())
+                self.send(f"{tag} OK FETCH completed")
+            elif command == "STORE" and is_uid:
+                uid_set, mode, flags = args.split(" ", 2)
+                self._store(mailbox, uid_set, mode.upper(), flags.strip("()").split())
+                self.send(f"{tag} OK STORE completed")
+            else:
+                self.send(f"{tag} BAD Commande non supportée: {command}")
+
+    def _idle(self, mailbox: Mailbox):
+        """Signaler les nouveaux messages (EXISTS) jusqu'à réception de DONE"""
+        self.send("+ idling")
+        with mailbox.lock:
+            known = len(mailbox.messages)
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable:
+                self.rfile.readline()  # DONE
+                return
+            with mailbox.lock:
+                count = len(mailbox.messages)
+            if count != known:
+                known = count
+                self.send(f"* {count} EXISTS")
+
+    def _search(self, mailbox: Mailbox, tokens: List[str]) -> List[int]:
+        with mailbox.lock:
+            candidates = list(mailbox.messages)
+        i = 0
+        while i < len(tokens):
+            key = tokens[i].upper()
+            if key == "UNSEEN":
+                candidates = [m for m in candidates if "\\Seen" not in m.flags]
+            elif key == "SEEN":
+                candidates = [m for m in candidates if "\\Seen" in m.flags]
+            elif key == "SINCE":
+                i += 1
+                since = datetime.strptime(tokens[i].strip('"'), SEARCH_DATE_FORMAT)
+                candidates = [m for m in candidates if m.internal_date >= since]
+            elif key == "UID":
+                i += 1
+                allowed = {m.uid for m in mailbox.by_uid_set(tokens[i])}
+                candidates = [m for m in candidates if m.uid in allowed]
+            i += 1
+        return [m.uid for m in candidates]
+
+    def _fetch(self, mailbox: Mailbox, uid_set: str, items: str):
+        with mailbox.lock:
+            messages = mailbox.by_uid_set(uid_set)
+            for m in messages:
+                seq = mailbox.messages.index(m) + 1
+                parts = [f"UID {m.uid}".encode()]
+                if "FLAGS" in items.split():
+                    parts.append(f"FLAGS ({' '.join(sorted(m.flags))})".encode())
+                if "RFC822.SIZE" in items:
+                    parts.append(f"RFC822.SIZE {len(m.raw)}".encode())
+                if "INTERNALDATE" in items:
+                    parts.append(f'INTERNALDATE "{m.internal_date.strftime("%d-%b-%Y %H:%M:%S")} +0000"'.encode())
+                if "BODY[]" in items or "BODY.PEEK[]" in items:
+                    parts.append(b"BODY[] " + _literal(m.raw))
+                    if "BODY.PEEK[]" not in items:
+                        m.flags.add("\\Seen")
+                self.wfile.write(f"* {seq} FETCH (".encode() + b" ".join(parts) + b")\r\n")
+
+    def _store(self, mailbox: Mailbox, uid_set: str, mode: str, flags: List[str]):
+        silent = mode.endswith(".SILENT")
+        with mailbox.lock:
+            for m in mailbox.by_uid_set(uid_set):
+                if mode.startswith("+"):
+                    m.flags.update(flags)
+                elif mode.startswith("-"):
+                    m.flags.difference_update(flags)
+                else:
+                    m.flags = set(flags)
+                if not silent:
+                    seq = mailbox.messages.index(m) + 1
+                    self.send(f"* {seq} FETCH (UID {m.uid} FLAGS ({' '.join(sorted(m.flags))}))")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class IMAPStandIn:
+    """Serveur IMAP local (thread en arrière-plan) avec compteurs de commandes"""
+
+    def __init__(self, messages: List[bytes], latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, idle: bool = True):
+        self.mailbox = Mailbox(messages)
+        self.latency = latency
+        self.idle = idle
+        self.capabilities = "IMAP4rev1 UIDPLUS" + (" IDLE" if idle else "")
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.standin = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        return self._server.server_address[0]
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def record(self, command: str):
+        with self._stats_lock:
+            self.stats[command] += 1
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats.clear()
+
+    def round_trips(self) -> int:
+        with self._stats_lock:
+            return sum(self.stats.values())
+
+    def start(self) -> "IMAPStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serveur IMAP de test en mémoire")
+    parser.add_argument("--port", type=int, default=1143)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--size", type=int, default=2048, help="taille du corps en octets")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence par commande (s)")
+    args = parser.parse_args()
+
+    standin = IMAPStandIn(
+        [make_message(i, args.size) for i in range(args.messages)],
+        latency=args.latency,
+        port=args.port
+    ).start()
+    print(f"IMAP stand-in sur {standin.host}:{standin.port} ({args.messages} messages)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        standin.stop()
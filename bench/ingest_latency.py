@@ -0,0 +1,83 @@
+"""Latence d'ingestion de /parse/raw avec l'analyse IA en file.
+
+Envoie N emails à un mail-parser en marche puis attend que la file
+d'analyse soit vide. La latence d'ingestion ne doit pas dépendre de la
+latence du LLM : lancer le parser avec le faux serveur OpenAI, par exemple
+
+    python bench/openai_standin.py --latency 3 --error-rate 0.05
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://<hôte>:8089/v1 (mail-parser)
+    python bench/ingest_latency.py --url http://localhost:8000 --messages 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from imap_standin import make_message  # noqa: E402
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--drain-timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    run_id = uuid.uuid4().hex[:8]
+    client = httpx.Client(base_url=args.url, timeout=60.0)
+
+    def send(index: int) -> float:
+        start = time.perf_counter()
+        response = client.post(
+            "/parse/raw",
+            content=make_message(index),
+            params={"provider": "bench", "external_id": f"bench-{run_id}-{index}"},
+            headers={"Content-Type": "message/rfc822"},
+        )
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = list(executor.map(send, range(args.messages)))
+    ingest_seconds = time.perf_counter() - start
+
+    # Attendre que les workers aient vidé la file
+    drain_start = time.perf_counter()
+    queue = {}
+    while time.perf_counter() - drain_start < args.drain_timeout:
+        queue = client.get("/analysis/queue").json()
+        if queue["jobs"]["pending"] + queue["jobs"]["running"] == 0:
+            break
+        time.sleep(0.5)
+
+    print(json.dumps({
+        "messages": args.messages,
+        "ingest_seconds": round(ingest_seconds, 2),
+        "ingest_latency_ms": {
+            "p50": round(statistics.median(latencies) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+        },
+        "analysis_drain_seconds": round(time.perf_counter() - drain_start, 2),
+        "queue": queue,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Micro-benchmarks des chemins chauds : parsing MIME, en-têtes, écriture en base.
+
+- EmailAnalyzer.parse_raw_email sur le corpus synthétique (corpus.py) :
+  latence par message p50/p95/p99, messages/s et Mo/s ;
+- clean_header_value (mail-fetcher) par forme d'en-tête : ASCII, RFC 2047
+  Q et B, ISO-2022-JP, en-tête long replié ;
+- chemin d'écriture du parser : app._store_email (une transaction par email)
+  et app._store_batch (une transaction par lot), sur PostgreSQL jetable
+  (pg_standin) ou --database-url. Sans PostgreSQL disponible, cette partie
+  est marquée « skipped ».
+
+    python bench/micro.py
+    python bench/micro.py --messages 1000 --db-emails 2000 --output micro.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+BENCH = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCH, "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-fetcher"))
+# mail-parser en tête pour app (le module utils n'existe que côté fetcher)
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+sys.path.insert(0, BENCH)
+
+from corpus import build_corpus, describe  # noqa: E402
+from parser.email_analyzer import EmailAnalyzer  # noqa: E402
+from pg_standin import PostgresStandIn, find_bin_dir  # noqa: E402
+from results import latency_summary, write_results  # noqa: E402
+from utils import clean_header_value  # noqa: E402
+
+HEADERS = {
+    "ascii": "Facture 2024-001 pour la commande 4521",
+    "rfc2047_q": "=?utf-8?Q?Facture_n=C2=B0123_=E2=80=94_=C3=A9ch=C3=A9ance?=",
+    "rfc2047_b": "=?utf-8?B?UmXDp3UgZGUgbOKAmcOpdMOpIOKAlCBtZXJjaSBiZWF1Y291cA==?=",
+    "iso_2022_jp": "=?iso-2022-jp?b?GyRCQEE1YT1xJE4kNEF3SVUbKEI=?=",
+    "folded_long": " ".join(f"=?utf-8?Q?mot_n=C2=B0{i}?=" for i in range(12)),
+}
+
+
+def bench_parse(corpus: List[bytes], repeat: int) -> Dict:
+    analyzer = EmailAnalyzer()
+    timings: List[float] = []
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run = []
+        for raw in corpus:
+            message_start = time.perf_counter()
+            analyzer.parse_raw_email(raw)
+            run.append(time.perf_counter() - message_start)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best, timings = elapsed, run
+    total_mb = sum(len(raw) for raw in corpus) / 2 ** 20
+    return dict(
+        latency_summary(timings),
+        messages_per_s=round(len(corpus) / best, 1),
+        mb_per_s=round(total_mb / best, 1),
+    )
+
+
+def bench_headers(iterations: int) -> Dict:
+    results = {}
+    for name, value in HEADERS.items():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            clean_header_value(value)
+        results[name] = {"us_per_call": round((time.perf_counter() - start) * 1e6 / iterations, 2)}
+    return results
+
+
+def bench_db_write(corpus: List[bytes], count: int, batch_size: int, database_url: str) -> Dict:
+    """Écriture en base : une transaction par email, puis par lots"""
+    os.environ["MAIL_PARSER_DATABASE_URL"] = database_url
+    # Sans clé OpenAI : pas de mise en file d'analyse, seule l'écriture est mesurée
+    os.environ.pop("OPENAI_API_KEY", None)
+    import app
+
+    app.db.open()
+    try:
+        app.init_database()
+        analyzer = EmailAnalyzer()
+        parsed = [analyzer.parse_raw_email(raw) for raw in corpus]
+        run_id = uuid.uuid4().hex[:8]
+
+        single = []
+        request = app.ParseEmailRequest(provider="bench-micro", account=f"single-{run_id}")
+        start = time.perf_counter()
+        for index in range(count):
+            write_start = time.perf_counter()
+            app._store_email(request, str(index), parsed[index % len(parsed)])
+            single.append(time.perf_counter() - write_start)
+        single_seconds = time.perf_counter() - start
+
+        batches = []
+        request = app.ParseEmailRequest(provider="bench-micro", account=f"batch-{run_id}")
+        start = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            prepared = [(index, request, parsed[index % len(parsed)], str(index))
+                        for index in range(offset, min(count, offset + batch_size))]
+            write_start = time.perf_counter()
+            with app.db.connection() as conn:
+                with conn.cursor(cursor_factory=app.RealDictCursor) as cur:
+                    app._store_batch(cur, prepared)
+                conn.commit()
+            batches.append(time.perf_counter() - write_start)
+        batch_seconds = time.perf_counter() - start
+    finally:
+        app.db.close()
+
+    return {
+        "emails": count,
+        "single": dict(latency_summary(single), emails_per_s=round(count / single_seconds, 1)),
+        "batch": dict(latency_summary(batches), batch_size=batch_size,
+                      emails_per_s=round(count / batch_seconds, 1)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--header-iterations", type=int, default=20000)
+    parser.add_argument("--db-emails", type=int, default=1000)
+    parser.add_argument("--db-batch-size", type=int, default=50)
+    parser.add_argument("--database-url", help="base existante au lieu d'un PostgreSQL jetable")
+    parser.add_argument("--skip-db", action="store_true")
+    parser.add_argument("--output", help="fichier JSON (défaut : bench/results/micro-<date>.json)")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.seed)
+    results = {
+        "corpus": describe(corpus),
+        "parse_raw_email": bench_parse(corpus, args.repeat),
+        "clean_header_value": bench_headers(args.header_iterations),
+    }
+
+    postgres: Optional[PostgresStandIn] = None
+    if args.skip_db:
+        results["db_write"] = {"skipped": "--skip-db"}
+    elif not args.database_url and find_bin_dir() is None:
+        results["db_write"] = {"skipped": "PostgreSQL introuvable (PG_BIN ou --database-url)"}
+    else:
+        try:
+            if not args.database_url:
+                postgres = PostgresStandIn().start()
+            results["db_write"] = bench_db_write(
+                corpus, args.db_emails, args.db_batch_size, args.database_url or postgres.url
+            )
+        finally:
+            if postgres:
+                postgres.stop()
+
+    path = write_results("micro", results, args.output)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Résultats : {path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Faux serveur OpenAI (chat.completions) pour tester l'analyse IA hors ligne.
+
+Répond à POST /v1/chat/completions avec une analyse JSON déterministe
+déduite du sujet, après une latence simulée (moyenne + jitter, plus
+`per_item` secondes par email d'une requête groupée et `per_1k_tokens`
+secondes par millier de tokens de prompt). Un taux d'erreurs 500 peut être
+injecté pour exercer les nouvelles tentatives.
+
+Utilisation :
+    server = OpenAIStandIn(latency=1.5, error_rate=0.05).start()
+    # OPENAI_API_KEY=test OPENAI_BASE_URL=server.base_url
+    server.stop()
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+CATEGORIES = [
+    (("facture", "invoice", "bill"), "facture", "neutre"),
+    (("commande", "order"), "commande", "positif"),
+    (("support", "help", "problème"), "support", "negatif"),
+    (("urgent", "important"), "urgent", "neutre"),
+]
+
+
+def fake_analysis(prompt: str) -> dict:
+    """Analyse déterministe à partir du sujet présent dans le prompt"""
+    match = re.search(r"Subject: (.*)", prompt)
+    return analyze_subject(match.group(1).strip() if match else "")
+
+
+def fake_batch_analysis(prompt: str) -> Optional[dict]:
+    """Réponse à un prompt groupé (liste JSON après « Emails (JSON): »)"""
+    marker = prompt.find("Emails (JSON):")
+    if marker < 0:
+        return None
+    emails = json.loads(prompt[marker + len("Emails (JSON):"):])
+    return {"results": [dict(analyze_subject(e.get("subject", "")), id=e["id"]) for e in emails]}
+
+
+def analyze_subject(subject: str) -> dict:
+    """Catégorie et sentiment déduits de mots-clés du sujet"""
+    category, sentiment = "general", "neutre"
+    for words, cat, sent in CATEGORIES:
+        if any(word in subject.lower() for word in words):
+            category, sentiment = cat, sent
+            break
+    return {
+        "sentiment": sentiment,
+        "category": category,
+        "summary": f"Résumé simulé : {subject[:80]}",
+        "score": 0.9,
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server: "OpenAIStandIn" = self.server.standin
+        length = int(self.headers.get("Content-Length", "0"))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._reply(404, {"error": {"message": f"Route inconnue: {self.path}"}})
+            return
+
+        server.record("requests")
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        batch = fake_batch_analysis(prompt)
+        items = len(batch["results"]) if batch else 1
+        server.record("items", items)
+        server.record("prompt_tokens", len(prompt) // 4)
+        time.sleep(
+            max(0.0, random.gauss(server.latency, server.jitter))
+            + server.per_item * items
+            + server.per_1k_tokens * len(prompt) / 4000
+        )
+
+        if random.random() < server.error_rate:
+            server.record("errors")
+            self._reply(500, {"error": {"message": "Erreur simulée", "type": "server_error"}})
+            return
+
+        content = json.dumps(batch or fake_analysis(prompt), ensure_ascii=False)
+        self._reply(200, {
+            "id": f"chatcmpl-standin-{server.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4,
+            },
+        })
+
+
+class OpenAIStandIn:
+    """Serveur HTTP local (thread en arrière-plan) compatible client openai"""
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.2, error_rate: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, per_item: float = 0.0,
+                 per_1k_tokens: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.per_item = per_item
+        self.per_1k_tokens = per_1k_tokens
+        self.error_rate = error_rate
+        self.stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record(self, key: str, count: int = 1):
+        with self._stats_lock:
+            self.stats[key] += count
+
+    def start(self) -> "OpenAIStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Faux serveur OpenAI")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--latency", type=float, default=1.0, help="latence moyenne (s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="écart type de la latence (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="proportion de réponses 500")
+    parser.add_argument("--per-item", type=float, default=0.0, help="latence ajoutée par email d'un lot (s)")
+    parser.add_argument("--per-1k-tokens", type=float, default=0.0, help="latence par millier de tokens de prompt (s)")
+    args = parser.parse_args()
+
+    standin = OpenAIStandIn(args.latency, args.jitter, args.error_rate, args.host, args.port,
+                            args.per_item, args.per_1k_tokens).start()
+    print(f"Faux OpenAI sur {standin.base_url} (latence {args.latency}s)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        standin.stop()
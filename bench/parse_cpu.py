@@ -0,0 +1,101 @@
+"""Temps CPU par message : chaîne texte re-parsée vs octets parsés une fois.
+
+Avant : le fetcher décode le message, le parse, re-parse le corps
+(`extract_text_body`), reconstruit un texte (`format_raw_email`) que
+mail-parser parse une troisième fois. Après : le fetcher ne lit que les
+en-têtes et mail-parser parse les octets d'origine avec `message_from_bytes`.
+
+    python bench/parse_cpu.py --messages 500 --attachment 65536
+"""
+import argparse
+import email
+import json
+import os
+import sys
+import time
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.parser import BytesHeaderParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-fetcher"))
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+
+from imap_standin import make_message  # noqa: E402
+from parser.email_analyzer import EmailAnalyzer  # noqa: E402
+from utils import clean_header_value, extract_text_body, format_raw_email, header_block  # noqa: E402
+
+
+def make_multipart(index: int, attachment_size: int) -> bytes:
+    """Email latin-1 avec alternative HTML et pièce jointe"""
+    msg = MIMEMultipart("mixed")
+    msg["From"] = f"Élodie {index} <elodie{index}@example.fr>"
+    msg["To"] = "inbox@example.com"
+    msg["Subject"] = f"Facture n°{index} — échéance"
+    msg["Date"] = "Mon, 01 Jan 2024 08:00:00 +0000"
+    alternative = MIMEMultipart("alternative")
+    alternative.attach(MIMEText("Bonjour, voici la facture de l'été.\n" * 40, "plain", "iso-8859-1"))
+    alternative.attach(MIMEText("<p>Bonjour, voici la facture de l'été.</p>" * 40, "html", "utf-8"))
+    msg.attach(alternative)
+    attachment = MIMEApplication(os.urandom(attachment_size), Name=f"facture-{index}.pdf")
+    attachment["Content-Disposition"] = f'attachment; filename="facture-{index}.pdf"'
+    msg.attach(attachment)
+    return msg.as_bytes()
+
+
+def before(raw_bytes: bytes) -> dict:
+    # mail-fetcher : décodage + parse complet + re-parse du corps
+    raw_message = raw_bytes.decode("utf-8", errors="ignore")
+    msg = email.message_from_string(raw_message)
+    headers = "\n".join(f"{k}: {v}" for k, v in msg.items())
+    clean_header_value(msg.get("Subject", ""))
+    text = format_raw_email(headers, extract_text_body(raw_message))
+    # mail-parser : troisième parse
+    return EmailAnalyzer().parse_raw_email(text)
+
+
+def after(raw_bytes: bytes) -> dict:
+    # mail-fetcher : en-têtes seulement
+    msg = BytesHeaderParser().parsebytes(header_block(raw_bytes))
+    clean_header_value(msg.get("Subject", ""))
+    # mail-parser : un seul parse des octets d'origine
+    return EmailAnalyzer().parse_raw_email(raw_bytes)
+
+
+def measure(func, corpus) -> dict:
+    start = time.process_time()
+    for raw in corpus:
+        func(raw)
+    cpu = time.process_time() - start
+    return {"cpu_seconds": round(cpu, 3), "cpu_us_per_message": round(cpu * 1e6 / len(corpus), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--body", type=int, default=4096, help="taille du corps texte en octets")
+    parser.add_argument("--attachment", type=int, default=65536, help="taille de la pièce jointe")
+    args = parser.parse_args()
+
+    corpora = {
+        "text_plain": [make_message(i, args.body) for i in range(args.messages)],
+        "multipart_latin1": [make_multipart(i, args.attachment) for i in range(args.messages)],
+    }
+
+    results = {}
+    for name, corpus in corpora.items():
+        sample = corpus[0]
+        results[name] = {
+            "before": measure(before, corpus),
+            "after": measure(after, corpus),
+            "subject_before": before(sample)["subject"],
+            "subject_after": after(sample)["subject"],
+            "body_after": after(sample)["body"][:40],
+        }
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
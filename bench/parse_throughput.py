@@ -0,0 +1,96 @@
+"""Débit de parsing sous charge : threads (GIL) vs pool de processus.
+
+Simule --concurrency requêtes /parse simultanées (threads, comme le pool DB
+du service) sur un mélange de messages : petits textes, multiparts avec
+alternative HTML, pièces jointes de 200 Ko et quelques messages de 5 Mo.
+Mesure le débit et la latence p50/p95 avec le parsing dans les threads
+(PARSE_PROCESSES=0) puis avec 1, 2, 4... processus jusqu'au nombre de cœurs.
+
+    python bench/parse_throughput.py --messages 400 --concurrency 16
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from attachment_store import make_message  # noqa: E402
+from parse_cpu import make_multipart  # noqa: E402
+from parse_pool import ParsePool  # noqa: E402
+
+# (proportion, fabrique) : mélange de tailles réaliste
+MIX = [
+    (0.50, lambda i: make_multipart(i, 0)),
+    (0.35, lambda i: make_multipart(i, 200 * 1024)),
+    (0.13, lambda i: make_message(i, os.urandom(1024 * 1024))),
+    (0.02, lambda i: make_message(i, os.urandom(5 * 1024 * 1024))),
+]
+
+
+def build_messages(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    weights = [weight for weight, _ in MIX]
+    return [rng.choices(MIX, weights)[0][1](i) for i in range(count)]
+
+
+def run(processes: int, messages: list, concurrency: int) -> dict:
+    os.environ["PARSE_PROCESSES"] = str(processes)
+    pool = ParsePool()
+    pool.start()
+    latencies = []
+
+    def one(raw: bytes):
+        start = time.perf_counter()
+        pool.parse(raw)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one, messages))
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.stop()
+
+    latencies.sort()
+    return {
+        "processes": processes,
+        "messages_per_s": round(len(messages) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages, args.seed)
+    steps = [0] + sorted({min(2 ** k, args.max_processes) for k in range(8) if 2 ** k <= 2 * args.max_processes})
+    runs = [run(processes, messages, args.concurrency) for processes in steps]
+
+    baseline = runs[0]["messages_per_s"]
+    for result in runs:
+        result["speedup"] = round(result["messages_per_s"] / baseline, 2)
+    print(json.dumps({
+        "cpu_count": os.cpu_count(),
+        "messages": args.messages,
+        "bytes": sum(len(m) for m in messages),
+        "concurrency": args.concurrency,
+        "runs": runs,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Instance PostgreSQL jetable pour les benchmarks (initdb dans un répertoire temporaire).
+
+Le schéma du mail-parser repose sur PostgreSQL lui-même (partitions,
+tsvector, ON CONFLICT, advisory locks) : pas de simulation possible, on
+lance donc un vrai serveur local, sur un port libre, supprimé à l'arrêt.
+Les binaires sont cherchés dans le PATH, puis dans /usr/lib/postgresql/*/bin
+et /usr/local/pgsql/bin (ou PG_BIN).
+
+Utilisation :
+    server = PostgresStandIn().start()
+    # MAIL_PARSER_DATABASE_URL=server.url
+    server.stop()
+"""
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from typing import Optional
+
+
+def find_bin_dir() -> Optional[str]:
+    """Répertoire contenant initdb et pg_ctl (None si PostgreSQL est absent)"""
+    candidates = [os.getenv("PG_BIN", "")]
+    initdb = shutil.which("initdb")
+    if initdb:
+        candidates.append(os.path.dirname(initdb))
+    candidates += sorted(glob.glob("/usr/lib/postgresql/*/bin"), reverse=True)
+    candidates.append("/usr/local/pgsql/bin")
+    for directory in candidates:
+        if directory and os.path.exists(os.path.join(directory, "initdb")):
+            return directory
+    return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class PostgresStandIn:
+    """Serveur PostgreSQL local (authentification trust, base `bench`)"""
+
+    def __init__(self, port: int = 0, fsync: bool = True, bin_dir: Optional[str] = None):
+        self.bin_dir = bin_dir or find_bin_dir()
+        if self.bin_dir is None:
+            raise RuntimeError("PostgreSQL introuvable (initdb) : installer le serveur ou définir PG_BIN")
+        self.port = port or _free_port()
+        # fsync=off : plus rapide, mais masque le coût des COMMIT mesuré en production
+        self.fsync = fsync
+        self.root: Optional[str] = None
+
+    @property
+    def url(self) -> str:
+        return f"postgresql://bench@127.0.0.1:{self.port}/bench"
+
+    def _run(self, *args: str):
+        subprocess.run([os.path.join(self.bin_dir, args[0]), *args[1:]], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def start(self) -> "PostgresStandIn":
+        self.root = tempfile.mkdtemp(prefix="bench-pg-")
+        data = os.path.join(self.root, "data")
+        self._run("initdb", "-D", data, "-U", "bench", "-A", "trust", "-E", "UTF8", "--no-locale")
+        options = f"-p {self.port} -k {self.root} -c listen_addresses=127.0.0.1 -c max_connections=100"
+        if not self.fsync:
+            options += " -c fsync=off -c synchronous_commit=off -c full_page_writes=off"
+        self._run("pg_ctl", "-D", data, "-o", options, "-l", os.path.join(self.root, "postgres.log"),
+                  "-w", "start")
+        self._run("createdb", "-h", "127.0.0.1", "-p", str(self.port), "-U", "bench", "bench")
+        return self
+
+    def stop(self):
+        if self.root is None:
+            return
+        try:
+            self._run("pg_ctl", "-D", os.path.join(self.root, "data"), "-m", "fast", "-w", "stop")
+        finally:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Instance PostgreSQL jetable")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--no-fsync", action="store_true", help="désactiver fsync (plus rapide, moins réaliste)")
+    args = parser.parse_args()
+
+    standin = PostgresStandIn(args.port, fsync=not args.no_fsync).start()
+    print(f"PostgreSQL jetable : MAIL_PARSER_DATABASE_URL={standin.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        standin.stop()
@@ -0,0 +1,95 @@
+"""Taille des prompts et latence d'analyse avant/après le budget de tokens.
+
+Analyse quelques emails types (fil de réponses citées, newsletter issue d'un
+HTML volumineux, email court) avec AIAgent contre le faux serveur OpenAI
+dont la latence croît avec la taille du prompt. « Avant » : corps complet,
+sans nettoyage ; « après » : nettoyage + OPENAI_BODY_TOKEN_BUDGET.
+
+    python bench/prompt_budget.py --budget 1000 --per-1k-tokens 0.3
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+
+from openai_standin import OpenAIStandIn  # noqa: E402
+
+
+def long_thread(depth: int = 12) -> str:
+    body = "Bonjour,\n\nJe confirme la livraison pour jeudi. Merci de valider la facture jointe.\n\n--\nJean Dupont\nService achats\n"
+    quoted = ""
+    for i in range(depth):
+        reply = f"Réponse {i} : précisions sur le planning et le budget du projet. " * 6
+        quoted = f"\nLe {i + 1} mars 2024 à 10:0{i % 10}, Contact {i} <c{i}@example.com> a écrit :\n" + \
+            "\n".join("> " + line for line in (reply + quoted).splitlines())
+    return body + quoted
+
+
+def html_newsletter() -> str:
+    item = "Découvrez notre sélection de la semaine : articles, offres et événements.   \n\n\n"
+    return item * 400 + "Pour vous désinscrire, cliquez ici."
+
+
+SAMPLES = {
+    "fil_cite": {"from": "jean@example.com", "to": "achats@example.com", "subject": "RE: RE: Livraison", "body": long_thread()},
+    "newsletter_html": {"from": "news@media.fr", "to": "inbox@example.com", "subject": "La lettre", "body": html_newsletter()},
+    "court": {"from": "ami@example.com", "to": "inbox@example.com", "subject": "Jeudi ?", "body": "On se voit jeudi ?"},
+}
+
+
+def run(agent, standin, repeat: int) -> dict:
+    results = {}
+    for name, email in SAMPLES.items():
+        standin.stats.clear()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            agent.analyze_email(email, fallback=False)
+        results[name] = {
+            "prompt_tokens": standin.stats["prompt_tokens"] // repeat,
+            "latency_ms": round((time.perf_counter() - start) * 1000 / repeat, 1),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--per-1k-tokens", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    standin = OpenAIStandIn(latency=args.latency, jitter=0.0, per_1k_tokens=args.per_1k_tokens).start()
+    os.environ.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": standin.base_url})
+
+    from parser.ai_agent import AIAgent
+    from parser.prompt_budget import prepare_body
+    agent = AIAgent()
+
+    agent.body_token_budget = args.budget
+    try:
+        # Avant : corps interpolé tel quel
+        prepare = agent._prepare_body
+        agent._prepare_body = lambda parsed_email, max_tokens: parsed_email['body']
+        before = run(agent, standin, repeat=args.repeat)
+        agent._prepare_body = prepare
+        after = run(agent, standin, repeat=args.repeat)
+    finally:
+        standin.stop()
+
+    print(json.dumps({
+        name: {
+            "before": before[name],
+            "after": after[name],
+            "cut": prepare_body(email["body"], args.budget)[1],
+        }
+        for name, email in SAMPLES.items()
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
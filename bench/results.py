@@ -0,0 +1,100 @@
+"""Outils communs des benchmarks : percentiles, mémoire, écriture des résultats JSON.
+
+Chaque résultat est écrit avec son contexte (commit, Python, nombre de
+cœurs, date) dans bench/results/<nom>-<date>.json pour être comparé à une
+exécution précédente avec bench/compare.py.
+"""
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Union
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(ordered: list, pct: float) -> float:
+    """Percentile (plus proche rang) d'une liste déjà triée"""
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(seconds: Iterable[float]) -> Dict:
+    """p50 / p95 / p99 / max en millisecondes"""
+    ordered = sorted(seconds)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def _status_kb(pid: Union[int, str], field: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _children(pid: Union[int, str]) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return f.read().split()
+    except OSError:
+        return []
+
+
+def memory_mb(pid: Union[int, str] = "self", children: bool = False) -> Dict:
+    """RSS courant et pic (VmHWM) du processus, fils directs compris si demandé (Linux)"""
+    pids = [pid] + (_children(os.getpid() if pid == "self" else pid) if children else [])
+    return {
+        "rss_mb": round(sum(_status_kb(p, "VmRSS") for p in pids) / 1024, 1),
+        "peak_mb": round(sum(_status_kb(p, "VmHWM") for p in pids) / 1024, 1),
+    }
+
+
+def reset_peak_memory(pid: Union[int, str] = "self") -> bool:
+    """Remettre VmHWM au RSS courant (Linux >= 4.0) pour mesurer une seule phase"""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(RESULTS_DIR)).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit or None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def write_results(name: str, results: Dict, output: Optional[str] = None) -> str:
+    """Écrire {"benchmark", "environment", "results"} en JSON et retourner le chemin"""
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{name}-{stamp}.json")
+    document = {"benchmark": name, "environment": environment(), "results": results}
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return output
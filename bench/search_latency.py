@@ -0,0 +1,141 @@
+"""Latence de la recherche plein texte (GET /search) sur une base peuplée.
+
+Insère --rows emails synthétiques (provider 'bench-search', générés côté
+PostgreSQL : la colonne search_vector est calculée à l'insertion comme en
+production), lance ANALYZE puis mesure les requêtes de repository.search_query
+pour des termes rares, moyens et fréquents, triées par pertinence et par date.
+Le vocabulaire suit une loi de puissance : quelques mots dans la plupart des
+emails, beaucoup de mots rares.
+
+    MAIL_PARSER_DATABASE_URL=postgresql://... python bench/search_latency.py --rows 1000000
+    python bench/search_latency.py --cleanup     # supprimer les emails de test
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "mail-parser"))
+
+import repository  # noqa: E402
+
+PROVIDER = "bench-search"
+# Du plus fréquent au plus rare (l'indice est tiré avec random()^3)
+VOCABULARY = [
+    "bonjour", "merci", "message", "cordialement", "demande", "dossier", "client", "semaine",
+    "commande", "facture", "livraison", "paiement", "rendez-vous", "contrat", "réunion", "projet",
+    "remboursement", "garantie", "abonnement", "devis", "relance", "échéance", "virement", "colis",
+    "invoice", "meeting", "shipment", "refund", "warranty", "quotation", "reminder", "deadline",
+    "hypothèque", "copropriété", "syndic", "expertise", "sinistre", "avenant", "huissier", "bail",
+]
+QUERIES = {
+    "fréquent": "bonjour",
+    "moyen": "remboursement",
+    "rare": "huissier",
+    "expression": '"avenant bail"',
+    "anglais": "refund",
+    "combiné": "facture -relance",
+}
+
+
+def seed(cur, rows: int):
+    """Insérer les emails synthétiques par tranches de 50 000"""
+    cur.execute("SELECT COUNT(*) AS n FROM emails WHERE provider = %s;", (PROVIDER,))
+    existing = cur.fetchone()["n"]
+    start = time.perf_counter()
+    for offset in range(existing, rows, 50000):
+        cur.execute("""
+            INSERT INTO emails (provider, external_id, from_addr, to_addr, subject, raw_body,
+                                mailbox, received_at, processed)
+            SELECT %(provider)s, 'search-' || g, 'sender' || (g %% 5000) || '@example.com',
+                   'inbox@example.com',
+                   (SELECT string_agg((%(words)s::text[])[1 + floor(random() ^ 3 * %(size)s)::int], ' ')
+                    FROM generate_series(1, 6) WHERE g > 0),
+                   (SELECT string_agg((%(words)s::text[])[1 + floor(random() ^ 3 * %(size)s)::int], ' ')
+                    FROM generate_series(1, 120) WHERE g > 0),
+                   'INBOX', NOW() - g * INTERVAL '30 seconds', TRUE
+            FROM generate_series(%(start)s, %(stop)s) g;
+        """, {"provider": PROVIDER, "words": VOCABULARY, "size": len(VOCABULARY),
+              "start": offset + 1, "stop": min(rows, offset + 50000)})
+        cur.connection.commit()
+        print(f"  {min(rows, offset + 50000)}/{rows} emails", file=sys.stderr)
+    cur.execute("ANALYZE emails;")
+    cur.connection.commit()
+    return time.perf_counter() - start
+
+
+def measure(cur, text: str, sort: str, repeat: int, limit: int) -> dict:
+    sql, params = repository.search_query(text, {"provider": PROVIDER}, None, limit, sort)
+    timings = []
+    rows = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    # Page suivante (pagination par clé)
+    next_ms = None
+    if len(rows) == limit:
+        after = (rows[-1]["sort_key"], rows[-1]["id"])
+        sql, params = repository.search_query(text, {"provider": PROVIDER}, after, limit, sort)
+        start = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        next_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    cur.execute("SELECT COUNT(*) AS n FROM emails, websearch_to_tsquery('french', %s) || "
+                "websearch_to_tsquery('english', %s) q WHERE provider = %s AND search_vector @@ q;",
+                (text, text, PROVIDER))
+    timings.sort()
+    return {
+        "matches": cur.fetchone()["n"],
+        "p50_ms": round(statistics.median(timings), 1),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1),
+        "next_page_ms": next_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=os.getenv("MAIL_PARSER_DATABASE_URL"))
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--cleanup", action="store_true", help="supprimer les emails de test et quitter")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("MAIL_PARSER_DATABASE_URL ou --database-url requis")
+
+    conn = psycopg2.connect(args.database_url)
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            if args.cleanup:
+                cur.execute("DELETE FROM emails WHERE provider = %s;", (PROVIDER,))
+                conn.commit()
+                print(f"{cur.rowcount} emails de test supprimés")
+                return
+
+            seed_seconds = seed(cur, args.rows)
+            results = {"rows": args.rows, "seed_seconds": round(seed_seconds, 1), "queries": {}}
+            for label, text in QUERIES.items():
+                results["queries"][label] = {
+                    "q": text,
+                    **{sort: measure(cur, text, sort, args.repeat, args.limit)
+                       for sort in repository.SEARCH_SORTS},
+                }
+            conn.rollback()
+    finally:
+        conn.close()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -68,6 +68,11 @@ class ApiClient {
     if (params.category) queryParams.append('category', params.category)
     if (params.sentiment) queryParams.append('sentiment', params.sentiment)
     if (params.processed !== undefined) queryParams.append('processed', params.processed.toString())
+    if (params.provider) queryParams.append('provider', params.provider)
+    if (params.mailbox) queryParams.append('mailbox', params.mailbox)
+    if (params.since) queryParams.append('since', params.since)
+    if (params.until) queryParams.append('until', params.until)
+    if (params.cursor) queryParams.append('cursor', params.cursor)
 
     const response = await this.client.get(`/api/emails?${queryParams.toString()}`)
     return response.data
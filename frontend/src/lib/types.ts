@@ -44,6 +44,10 @@ export interface EmailStats {
   total_emails: number
   analyzed_emails: number
   processed_emails: number
+  by_provider?: Record<string, number>
+  by_category?: Record<string, number>
+  by_sentiment?: Record<string, number>
+  ingest_per_hour?: { hour: string; emails: number }[]
 }
 
 export interface HealthStatus {
@@ -70,10 +74,11 @@ export interface ApiResponse<T> {
 
 export interface PaginatedResponse<T> {
   data: T[]
-  total: number
-  page: number
+  total?: number
+  page?: number
   limit: number
   hasMore: boolean
+  next_cursor?: string | null
 }
 
 export interface EmailListParams {
@@ -84,6 +89,11 @@ export interface EmailListParams {
   category?: string
   sentiment?: string
   processed?: boolean
+  provider?: string
+  mailbox?: string
+  since?: string
+  until?: string
+  cursor?: string
 }
 
 export interface ParseEmailRequest {
@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from models import AccountConfig
+
+logger = logging.getLogger("mail-fetcher.accounts")
+
+
+def load_accounts(path: Optional[str] = None) -> List[AccountConfig]:
+    """Lire la liste des comptes depuis ACCOUNTS_CONFIG (vide si non défini)"""
+    path = path or os.getenv("ACCOUNTS_CONFIG")
+    if not path:
+        return []
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    accounts = [AccountConfig(**entry) for entry in data["accounts"]]
+    for account in accounts:
+        if not os.getenv(account.password_env):
+            logger.warning(f"Compte {account.name}: variable {account.password_env} non définie")
+
+    logger.info(f"{len(accounts)} comptes chargés depuis {path}")
+    return accounts
+
+
+class AccountMetrics:
+    """Débit et retard d'un compte"""
+
+    def __init__(self):
+        self.processed_total = 0
+        self.failed_total = 0
+        self.turns_total = 0
+        self.errors_total = 0
+        self.busy_seconds = 0.0
+        self.backlog: Dict[str, int] = {}
+        self.last_success_at: Optional[float] = None
+
+    def snapshot(self) -> dict:
+        lag = time.time() - self.last_success_at if self.last_success_at else None
+        return {
+            "processed_total": self.processed_total,
+            "failed_total": self.failed_total,
+            "turns_total": self.turns_total,
+            "errors_total": self.errors_total,
+            "emails_per_second": round(self.processed_total / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "backlog": sum(self.backlog.values()),
+            "backlog_by_mailbox": dict(self.backlog),
+            "last_success_at": (
+                datetime.fromtimestamp(self.last_success_at).isoformat() if self.last_success_at else None
+            ),
+            "lag_seconds": round(lag, 1) if lag is not None else None,
+        }
+
+
+class AccountScheduler:
+    """Répartit les dossiers de tous les comptes sur un pool borné de sessions IMAP.
+
+    Chaque tour traite au plus `fair_share` messages d'un dossier puis le
+    remet en fin de file : une grosse boîte ne bloque pas les autres. Un
+    compte n'a jamais plus de `max_sessions` sessions ouvertes en même temps.
+    """
+
+    def __init__(self, accounts: List[AccountConfig], run_job: Callable[[AccountConfig, str, int], dict],
+                 max_sessions: int, fair_share: int):
+        self.accounts = accounts
+        self.run_job = run_job
+        self.max_sessions = max(1, max_sessions)
+        self.fair_share = fair_share
+        self.jobs = [(account, mailbox) for account in accounts for mailbox in account.mailboxes]
+        self.metrics: Dict[str, AccountMetrics] = {a.name: AccountMetrics() for a in accounts}
+        self._lock = threading.Lock()
+
+    def _run_turn(self, account: AccountConfig, mailbox: str) -> dict:
+        start = time.perf_counter()
+        try:
+            result = self.run_job(account, mailbox, self.fair_share)
+        except Exception as e:
+            logger.error(f"Compte {account.name}/{mailbox}: {e}")
+            result = None
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            metrics = self.metrics[account.name]
+            metrics.turns_total += 1
+            metrics.busy_seconds += elapsed
+            if result is None:
+                metrics.errors_total += 1
+                return {"processed": 0, "failed": 0, "remaining": 0}
+
+            metrics.processed_total += result["processed"]
+            metrics.failed_total += result["failed"]
+            metrics.backlog[mailbox] = result["remaining"]
+            metrics.last_success_at = time.time()
+        return result
+
+    def run_round(self):
+        """Traiter tous les dossiers jusqu'à épuisement de leur backlog"""
+        queue = deque(self.jobs)
+        active: Counter = Counter()
+        in_flight = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_sessions, thread_name_prefix="imap") as executor:
+            while queue or in_flight:
+                # Démarrer les dossiers éligibles, dans l'ordre de la file
+                for _ in range(len(queue)):
+                    if len(in_flight) >= self.max_sessions:
+                        break
+                    account, mailbox = queue.popleft()
+                    if active[account.name] >= account.max_sessions:
+                        queue.append((account, mailbox))
+                        continue
+                    active[account.name] += 1
+                    future = executor.submit(self._run_turn, account, mailbox)
+                    in_flight[future] = (account, mailbox)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    account, mailbox = in_flight.pop(future)
+                    active[account.name] -= 1
+                    if future.result()["remaining"] > 0:
+                        # Reste du backlog : retour en fin de file
+                        queue.append((account, mailbox))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: metrics.snapshot() for name, metrics in self.metrics.items()}
@@ -2,12 +2,21 @@ import os
 import logging
 import time
 from datetime import datetime
+import threading
+from typing import Dict, List, Optional
+import base64
+import gzip
 import httpx
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from prometheus_client import Counter, Gauge, Histogram
 
+from accounts import AccountScheduler, load_accounts
 from imap_reader import IMAPReader
-from models import EmailData, ParseResult
+from models import EmailData, ParseResult, BatchParseResult
+from pipeline import SendPipeline, StageTimings
+from status_server import start_status_server
+from sync_state import SyncStateStore, advance_checkpoint
 from utils import format_raw_email
 
 # Configuration des logs
@@ -18,108 +27,516 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mail-fetcher")
 
+# Métriques Prometheus (servies par le serveur de statut sur /metrics)
+PARSER_REQUEST_SECONDS = Histogram(
+    "mailfetcher_parser_request_duration_seconds", "Durée des requêtes HTTP vers mail-parser",
+    ["endpoint", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+)
+CYCLE_SECONDS = Histogram(
+    "mailfetcher_cycle_duration_seconds", "Durée d'un cycle (recherche, lecture, envoi, marquage)",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+)
+LAST_CYCLE_SECONDS = Gauge("mailfetcher_last_cycle_duration_seconds", "Durée du dernier cycle")
+EMAILS_FETCHED = Counter("mailfetcher_emails_fetched_total", "Emails lus sur IMAP", ["account"])
+# stored | duplicate (déjà stocké) | failed
+EMAILS_SENT = Counter("mailfetcher_emails_sent_total", "Emails envoyés au parser par résultat", ["result"])
+MAILBOX_BACKLOG = Gauge(
+    "mailfetcher_mailbox_backlog", "UID restant à traiter après le dernier tour", ["account", "mailbox"]
+)
+IMAP_SESSIONS_OPEN = Gauge("mailfetcher_imap_sessions_open", "Sessions IMAP ouvertes")
+SYNC_PENDING = Gauge(
+    "mailfetcher_sync_pending_uids", "UID en échec en attente d'un nouvel essai", ["account", "mailbox"]
+)
+
 class MailFetcher:
     """Service de récupération et envoi d'emails au parser"""
 
     def __init__(self):
         self.mail_parser_url = os.getenv("MAIL_PARSER_URL", "http://mail-parser:8000")
         self.poll_interval = int(os.getenv("POLL_INTERVAL_SECONDS", "300"))
+        # 'single' : un POST /parse par email | 'batch' : POST /parse/batch par lot
+        self.parser_mode = os.getenv("PARSER_MODE", "single").lower()
+        self.parser_batch_size = int(os.getenv("PARSER_BATCH_SIZE", "50"))
+        # raw : octets RFC822 d'origine (parsés une seule fois par mail-parser)
+        # text : ancienne reconstruction en-têtes + corps texte
+        self.parser_upload = os.getenv("PARSER_UPLOAD", "raw").lower()
+        self.parser_upload_gzip = os.getenv("PARSER_UPLOAD_GZIP", "false").lower() == "true"
+        # Nombre maximal de requêtes simultanées vers le parser
+        self.max_in_flight = int(os.getenv("MAX_IN_FLIGHT", "8"))
+        # 'checkpoint' : reprise par UIDVALIDITY/UID | 'unseen' : SEARCH UNSEEN SINCE
+        self.sync_mode = os.getenv("SYNC_MODE", "checkpoint").lower()
+        # UID en échec retentés sans limite, délai doublé à chaque échec jusqu'au plafond
+        self.sync_retry_backoff = float(os.getenv("SYNC_RETRY_BACKOFF_SECONDS", "60"))
+        self.sync_retry_max_backoff = float(os.getenv("SYNC_RETRY_MAX_BACKOFF_SECONDS", "3600"))
+        self.sync_state = SyncStateStore()
+        # 'idle' : session IMAP ouverte, réveil sur EXISTS | 'poll' : cycle toutes les N secondes
+        self.fetch_trigger = os.getenv("FETCH_TRIGGER", "idle").lower()
+        # Relancer IDLE avant le délai serveur (29 min RFC 2177, moins chez certains)
+        self.idle_renew_seconds = int(os.getenv("IDLE_RENEW_SECONDS", "540"))
         self.imap_reader = IMAPReader()
+        # Sessions IMAP persistantes par compte (mode multi-comptes)
+        self._sessions_lock = threading.Lock()
+        self._idle_sessions: Dict[str, List[IMAPReader]] = {}
+        self._all_sessions: List[IMAPReader] = []
+
+        # Multi-comptes : dossiers de ACCOUNTS_CONFIG sur un pool partagé de sessions
+        self.accounts = load_accounts()
+        self.account_scheduler = None
+        if self.accounts:
+            self.account_scheduler = AccountScheduler(
+                self.accounts,
+                self._process_mailbox,
+                max_sessions=int(os.getenv("IMAP_MAX_SESSIONS", "4")),
+                fair_share=int(os.getenv("FAIR_SHARE_MESSAGES", "200"))
+            )
+        self.status_port = int(os.getenv("STATUS_PORT", "8001"))
+
+        # Client HTTP unique (keep-alive) partagé par tous les envois
+        # (pool=None : attendre une connexion libre plutôt qu'échouer)
+        self.http_client = httpx.Client(
+            timeout=httpx.Timeout(30.0, pool=None),
+            limits=httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight
+            )
+        )
+        self.last_cycle_timings: dict = {}
+        IMAP_SESSIONS_OPEN.set_function(lambda: self._session_metrics()["open"])
 
     def process_emails(self):
-        """Traiter les emails non lus"""
+        """Traiter les nouveaux emails (session IMAP conservée entre les cycles)"""
         logger.info("Début du cycle de traitement des emails")
+        if self.account_scheduler:
+            self.account_scheduler.run_round()
+            return
 
-        # Connexion IMAP
-        if not self.imap_reader.connect():
-            logger.warning("Impossible de se connecter à IMAP - saut du cycle")
+        timings = StageTimings()
+
+        # Réutiliser la session (NOOP) ou se reconnecter
+        with timings.measure("connect"):
+            connected = self.imap_reader.ensure_connected()
+        if not connected:
+            logger.warning(
+                f"IMAP indisponible - saut du cycle (nouvel essai dans {self.imap_reader.retry_delay():.0f}s)"
+            )
             return
 
         try:
-            # Récupérer les emails non lus
-            emails = self.imap_reader.fetch_unread_emails()
+            self._run_cycle(timings)
+        except Exception as e:
+            logger.error(f"Erreur cycle: {e}")
+            # Session dans un état incertain : reconnexion au prochain cycle
+            self.imap_reader.disconnect()
 
-            if not emails:
-                logger.info("Aucun nouvel email à traiter")
-                return
+    def _acquire_reader(self, account) -> IMAPReader:
+        """Prendre une session libre du compte (ou en créer une)"""
+        with self._sessions_lock:
+            idle = self._idle_sessions.setdefault(account.name, [])
+            if idle:
+                return idle.pop()
+            reader = IMAPReader(account)
+            self._all_sessions.append(reader)
+            return reader
+
+    def _release_reader(self, account, reader: IMAPReader):
+        with self._sessions_lock:
+            self._idle_sessions[account.name].append(reader)
+
+    def _process_mailbox(self, account, mailbox: str, max_messages: int) -> dict:
+        """Un tour sur un dossier d'un compte (exécuté dans le pool de sessions).
+
+        Les sessions d'un compte sont gardées ouvertes entre les tours et
+        passent d'un dossier à l'autre par SELECT, sans nouveau LOGIN.
+        """
+        reader = self._acquire_reader(account)
+        try:
+            timings = StageTimings()
+            with timings.measure("connect"):
+                connected = reader.ensure_connected(mailbox)
+            if not connected:
+                raise ConnectionError(
+                    f"IMAP indisponible ({account.name}), nouvel essai dans {reader.retry_delay():.0f}s"
+                )
+
+            try:
+                return self._run_cycle(timings, reader, max_messages)
+            except Exception:
+                reader.disconnect()
+                raise
+        finally:
+            self._release_reader(account, reader)
+
+    def close(self):
+        """Fermer les sessions IMAP et le client HTTP"""
+        for reader in [self.imap_reader] + self._all_sessions:
+            reader.disconnect()
+        self.http_client.close()
+
+    def _run_cycle(self, timings: StageTimings, reader: Optional[IMAPReader] = None,
+                   max_messages: Optional[int] = None) -> dict:
+        """Un cycle sur la session ouverte (lecture IMAP → envoi → marquage en pipeline).
+
+        Avec `max_messages` (mode checkpoint uniquement), seuls les N premiers
+        UID sont traités ; le reste est signalé dans `remaining`.
+        """
+        reader = reader or self.imap_reader
+        result = {"processed": 0, "failed": 0, "remaining": 0}
+
+        # Rechercher les emails à traiter
+        checkpoint = None
+        with timings.measure("search"):
+            if self.sync_mode == "checkpoint":
+                checkpoint = self.sync_state.load(reader.account, reader.mailbox)
+                uids = reader.search_sync_uids(checkpoint)
+            else:
+                uids = reader.search_unread_uids()
+
+        if uids is None:
+            raise RuntimeError("Recherche IMAP en échec")
 
-            logger.info(f"Traitement de {len(emails)} emails")
+        backlog = MAILBOX_BACKLOG.labels(reader.account, reader.mailbox)
+        if not uids:
+            logger.info(f"Aucun nouvel email à traiter ({reader.mailbox})")
+            self._save_checkpoint(reader, checkpoint, [], [])
+            backlog.set(0)
+            return result
+
+        if max_messages and self.sync_mode == "checkpoint" and len(uids) > max_messages:
+            result["remaining"] = len(uids) - max_messages
+            uids = uids[:max_messages]
+
+        logger.info(f"Traitement de {len(uids)} emails (max {self.max_in_flight} en vol)")
+
+        seen_uids = []
+
+        def on_done(unit, succeeded_uids):
+            for email_msg in unit:
+                if email_msg.uid in succeeded_uids:
+                    seen_uids.append(email_msg.uid)
+                    logger.info(f"Email traité: {email_msg.subject}")
+                else:
+                    logger.warning(f"Échec traitement: {email_msg.subject}")
 
-            # Traiter chaque email
-            processed_count = 0
-            for email_msg in emails:
-                try:
-                    if self._send_to_parser(email_msg):
-                        # Marquer comme lu si traitement réussi
-                        self.imap_reader.mark_email_as_seen(email_msg.uid)
-                        processed_count += 1
-                        logger.info(f"Email traité: {email_msg.subject}")
-                    else:
-                        logger.warning(f"Échec traitement: {email_msg.subject}")
+        pipeline = SendPipeline(self._send_unit, on_done, self.max_in_flight, timings)
+        unit_size = self.parser_batch_size if self.parser_mode == "batch" else 1
+        unit = []
 
-                except Exception as e:
-                    logger.error(f"Erreur traitement email UID {email_msg.uid}: {e}")
-                    continue
+        # Lecture en flux : au plus un bloc FETCH en mémoire + les envois en vol
+        batches = reader.iter_unread_emails(uids)
+        try:
+            while True:
+                fetch_start = time.perf_counter()
+                email_msgs = next(batches, None)
+                if email_msgs is None:
+                    break
+                timings.add("fetch", time.perf_counter() - fetch_start, len(email_msgs))
+                EMAILS_FETCHED.labels(reader.account).inc(len(email_msgs))
 
-            logger.info(f"Cycle terminé: {processed_count}/{len(emails)} emails traités")
+                for email_msg in email_msgs:
+                    unit.append(email_msg)
+                    if len(unit) >= unit_size:
+                        pipeline.submit(unit)
+                        unit = []
 
+            if unit:
+                pipeline.submit(unit)
         finally:
-            # Déconnexion IMAP
-            self.imap_reader.disconnect()
+            pipeline.close()
 
-    def _send_to_parser(self, email_msg) -> bool:
-        """Envoyer un email au service mail-parser"""
+        # Un seul UID STORE \Seen pour tous les emails stockés du cycle
+        with timings.measure("mark_seen", count=len(seen_uids)):
+            reader.mark_emails_as_seen(seen_uids)
+
+        self._save_checkpoint(reader, checkpoint, uids, seen_uids)
+
+        self.last_cycle_timings = timings.summary()
+        CYCLE_SECONDS.observe(self.last_cycle_timings["wall_seconds"])
+        LAST_CYCLE_SECONDS.set(self.last_cycle_timings["wall_seconds"])
+        backlog.set(result["remaining"])
+        logger.info(f"Cycle terminé ({reader.mailbox}): {len(seen_uids)}/{len(uids)} emails traités")
+        if reader.oversized_uids:
+            logger.warning(f"{len(reader.oversized_uids)} emails trop volumineux reportés")
+        logger.info(f"Temps par étape: {self.last_cycle_timings}")
+
+        result["processed"] = len(seen_uids)
+        result["failed"] = len(uids) - len(seen_uids)
+        return result
+
+    def run_idle(self):
+        """Boucle IDLE : une session ouverte, un cycle à chaque EXISTS.
+
+        À chaque relance d'IDLE sans nouveau message, un cycle est aussi
+        lancé si des UID en échec sont à retenter, et au moins toutes les
+        POLL_INTERVAL_SECONDS.
+
+        Ne rend la main que si le serveur ne supporte pas IDLE (l'appelant
+        se replie alors sur le polling, en gardant la session).
+        """
+        while True:
+            timings = StageTimings()
+            with timings.measure("connect"):
+                connected = self.imap_reader.ensure_connected()
+            if not connected:
+                delay = max(self.imap_reader.retry_delay(), 1.0)
+                logger.warning(f"Connexion IMAP impossible - nouvel essai dans {delay:.0f}s")
+                time.sleep(delay)
+                continue
+
+            if not self.imap_reader.supports_idle():
+                logger.warning("IDLE non supporté par le serveur - repli sur le polling")
+                return
+
+            try:
+                # Rattraper ce qui est arrivé pendant la déconnexion
+                self._run_cycle(timings)
+
+                logger.info(f"Mode IDLE actif sur {self.imap_reader.mailbox}")
+                last_cycle = time.monotonic()
+                while True:
+                    # Relance d'IDLE au plus tard toutes les POLL_INTERVAL_SECONDS
+                    timeout = min(self.idle_renew_seconds, self.poll_interval)
+                    if self.imap_reader.wait_for_new_mail(timeout=timeout):
+                        logger.info("Nouveaux emails signalés (IDLE)")
+                    elif self._retries_due(self.imap_reader):
+                        logger.info("Emails en échec à retenter (IDLE)")
+                    elif time.monotonic() - last_cycle < self.poll_interval:
+                        continue
+                    self._run_cycle(StageTimings())
+                    last_cycle = time.monotonic()
+
+            except Exception as e:
+                logger.error(f"Session IDLE interrompue: {e}")
+                self.imap_reader.disconnect()
+                self.imap_reader.schedule_retry()
+
+    def _retries_due(self, reader: IMAPReader) -> bool:
+        """Le dossier de `reader` a-t-il des UID en échec dont le délai est écoulé ?"""
+        if self.sync_mode != "checkpoint":
+            return False
+        checkpoint = self.sync_state.load(reader.account, reader.mailbox)
+        return checkpoint is not None and bool(checkpoint.due_uids())
+
+    def _save_checkpoint(self, reader: IMAPReader, checkpoint, planned_uids, succeeded_uids):
+        """Avancer et persister le point de reprise du dossier de `reader`"""
+        if self.sync_mode != "checkpoint" or reader.uid_validity is None:
+            return
+
+        try:
+            checkpoint = advance_checkpoint(
+                checkpoint,
+                account=reader.account,
+                mailbox=reader.mailbox,
+                uid_validity=reader.uid_validity,
+                uid_next=reader.uid_next,
+                planned_uids=planned_uids,
+                succeeded_uids=succeeded_uids,
+                backoff_seconds=self.sync_retry_backoff,
+                max_backoff_seconds=self.sync_retry_max_backoff
+            )
+            self.sync_state.save(checkpoint)
+            SYNC_PENDING.labels(reader.account, reader.mailbox).set(len(checkpoint.pending_uids))
+        except Exception as e:
+            logger.error(f"Erreur sauvegarde point de reprise: {e}")
+
+    def _send_unit(self, unit) -> set:
+        """Envoyer un lot (ou un email seul) et retourner les UID stockés"""
+        if self.parser_mode == "batch":
+            succeeded = self._send_batch_to_parser(unit)
+        else:
+            email_msg = unit[0]
+            succeeded = {email_msg.uid} if self._send_to_parser(email_msg) else set()
+        EMAILS_SENT.labels("failed").inc(len(unit) - len(succeeded))
+        return succeeded
+
+    def _post(self, endpoint: str, **kwargs) -> httpx.Response:
+        """POST vers mail-parser, durée observée par endpoint et code HTTP"""
+        start = time.perf_counter()
+        status = "error"
         try:
-            # Préparer les données pour l'API
-            raw_email = format_raw_email(email_msg.raw_headers, email_msg.raw_body)
+            response = self.http_client.post(f"{self.mail_parser_url}{endpoint}", **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            PARSER_REQUEST_SECONDS.labels(endpoint, status).observe(time.perf_counter() - start)
+
+    def _encode_upload(self, raw_message: bytes) -> bytes:
+        """Compresser le message si PARSER_UPLOAD_GZIP est activé"""
+        if self.parser_upload_gzip:
+            return gzip.compress(raw_message, compresslevel=1)
+        return raw_message
+
+    @staticmethod
+    def _external_id(email_msg) -> str:
+        """Identifiant stable du message : UID qualifié par UIDVALIDITY"""
+        if email_msg.uid_validity is None:
+            return str(email_msg.uid)
+        return f"{email_msg.uid_validity}:{email_msg.uid}"
 
-            email_data = EmailData(
-                raw_email=raw_email,
+    def _build_email_data(self, email_msg) -> EmailData:
+        """Préparer les données d'un email pour l'API"""
+        if self.parser_upload == "raw":
+            return EmailData(
+                raw_email_b64=base64.b64encode(self._encode_upload(email_msg.raw_message)).decode("ascii"),
+                encoding="gzip" if self.parser_upload_gzip else None,
                 provider=email_msg.provider,
-                external_id=str(email_msg.uid),
+                account=email_msg.account,
+                external_id=self._external_id(email_msg),
                 mailbox=email_msg.mailbox
             )
 
-            # Envoyer au mail-parser
-            with httpx.Client(timeout=30.0) as client:
-                response = client.post(
-                    f"{self.mail_parser_url}/parse",
+        raw_email = format_raw_email(email_msg.raw_headers, email_msg.raw_body)
+
+        return EmailData(
+            raw_email=raw_email,
+            provider=email_msg.provider,
+            account=email_msg.account,
+            external_id=self._external_id(email_msg),
+            mailbox=email_msg.mailbox
+        )
+
+    def _send_batch_to_parser(self, email_msgs) -> set:
+        """Envoyer un lot d'emails à /parse/batch, retourne les UID stockés"""
+        try:
+            payload = {"items": [self._build_email_data(m).model_dump(exclude_none=True) for m in email_msgs]}
+
+            response = self._post(
+                "/parse/batch",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+                timeout=120.0
+            )
+
+            if response.status_code != 200:
+                logger.error(f"Erreur API parser (lot): {response.status_code} - {response.text}")
+                return set()
+
+            result = BatchParseResult(**response.json())
+            EMAILS_SENT.labels("stored").inc(result.succeeded - result.duplicates)
+            EMAILS_SENT.labels("duplicate").inc(result.duplicates)
+            succeeded = set()
+            for item in result.results:
+                # 'duplicate' : déjà stocké lors d'un cycle précédent
+                if item.status in ("success", "duplicate"):
+                    succeeded.add(email_msgs[item.index].uid)
+                else:
+                    logger.warning(f"Email UID {email_msgs[item.index].uid} rejeté: {item.error}")
+
+            logger.debug(
+                f"Lot envoyé: {result.succeeded}/{result.total} stockés ({result.duplicates} déjà présents)"
+            )
+            return succeeded
+
+        except Exception as e:
+            logger.error(f"Erreur envoi lot au parser: {e}")
+            return set()
+
+    def _send_to_parser(self, email_msg) -> bool:
+        """Envoyer un email au service mail-parser"""
+        try:
+            if self.parser_upload == "raw":
+                # Message d'origine tel quel, sans base64 ni JSON
+                headers = {"Content-Type": "message/rfc822"}
+                if self.parser_upload_gzip:
+                    headers["Content-Encoding"] = "gzip"
+                response = self._post(
+                    "/parse/raw",
+                    content=self._encode_upload(email_msg.raw_message),
+                    params={
+                        "provider": email_msg.provider,
+                        "account": email_msg.account,
+                        "external_id": self._external_id(email_msg),
+                        "mailbox": email_msg.mailbox
+                    },
+                    headers=headers
+                )
+            else:
+                # Préparer les données pour l'API
+                email_data = self._build_email_data(email_msg)
+
+                # Envoyer au mail-parser
+                response = self._post(
+                    "/parse",
                     json=email_data.model_dump(),
                     headers={"Content-Type": "application/json"}
                 )
 
-                if response.status_code == 200:
-                    result = ParseResult(**response.json())
-                    logger.debug(f"Parser response: ID={result.id}, status={result.status}")
-                    return True
-                else:
-                    logger.error(f"Erreur API parser: {response.status_code} - {response.text}")
-                    return False
+            if response.status_code == 200:
+                result = ParseResult(**response.json())
+                logger.debug(f"Parser response: ID={result.id}, status={result.status}")
+                EMAILS_SENT.labels("duplicate" if result.status == "duplicate" else "stored").inc()
+                return True
+            else:
+                logger.error(f"Erreur API parser: {response.status_code} - {response.text}")
+                return False
 
         except Exception as e:
             logger.error(f"Erreur envoi au parser: {e}")
             return False
 
+    def _session_metrics(self) -> dict:
+        """Poignées de main IMAP (TLS + LOGIN + SELECT) : nombre et durée"""
+        with self._sessions_lock:
+            readers = [self.imap_reader] + list(self._all_sessions)
+        per_reader = [r.session_metrics() for r in readers]
+        handshakes = sum(m["handshakes"] for m in per_reader)
+        handshake_seconds = sum(m["handshake_seconds"] for m in per_reader)
+        return {
+            "open": sum(1 for m in per_reader if m["connected"]),
+            "handshakes": handshakes,
+            "handshake_seconds": round(handshake_seconds, 3),
+            "avg_handshake_ms": round(handshake_seconds * 1000 / handshakes, 1) if handshakes else 0.0,
+            "liveness_failures": sum(m["liveness_failures"] for m in per_reader),
+        }
+
+    def get_status(self) -> dict:
+        """État exposé sur /status"""
+        return {
+            "fetch_trigger": self.fetch_trigger,
+            "sync_mode": self.sync_mode,
+            "last_cycle_timings": self.last_cycle_timings,
+            "imap_sessions": self._session_metrics(),
+            "accounts": self.account_scheduler.snapshot() if self.account_scheduler else {},
+            # UID en échec par dossier (retentés avec backoff, jamais abandonnés)
+            "sync": self.sync_state.summary() if self.sync_mode == "checkpoint" else {},
+        }
+
     def run(self):
         """Démarrer le scheduler"""
-        logger.info(f"Démarrage Mail Fetcher - cycle toutes les {self.poll_interval}s")
+        logger.info(f"Démarrage Mail Fetcher - mode {self.fetch_trigger}, cycle toutes les {self.poll_interval}s")
 
         # Vérifier la configuration
-        if not os.getenv("EMAIL_USER") or not os.getenv("EMAIL_PASSWORD"):
+        if self.account_scheduler:
+            logger.info(f"Mode multi-comptes: {len(self.account_scheduler.jobs)} dossiers")
+            if self.fetch_trigger == "idle":
+                # IDLE garde une session par dossier : incompatible avec le pool partagé
+                logger.info("IDLE désactivé en mode multi-comptes - polling")
+                self.fetch_trigger = "poll"
+        elif not os.getenv("EMAIL_USER") or not os.getenv("EMAIL_PASSWORD"):
             logger.error("EMAIL_USER et EMAIL_PASSWORD requis")
             return
 
+        if self.status_port:
+            start_status_server(self.status_port, self.get_status)
+
         # Tester la connexion au parser
         try:
-            with httpx.Client(timeout=10.0) as client:
-                response = client.get(f"{self.mail_parser_url}/health")
-                if response.status_code == 200:
-                    logger.info("Mail parser accessible")
-                else:
-                    logger.warning(f"Mail parser inaccessible: {response.status_code}")
+            response = self.http_client.get(f"{self.mail_parser_url}/health", timeout=10.0)
+            if response.status_code == 200:
+                logger.info("Mail parser accessible")
+            else:
+                logger.warning(f"Mail parser inaccessible: {response.status_code}")
         except Exception as e:
             logger.warning(f"Mail parser non accessible: {e}")
 
+        if self.fetch_trigger == "idle":
+            try:
+                self.run_idle()
+            except KeyboardInterrupt:
+                logger.info("Arrêt du mode IDLE")
+                self.close()
+                return
+
         # Premier traitement immédiat
         logger.info("Traitement initial...")
         self.process_emails()
@@ -140,6 +557,8 @@ class MailFetcher:
         except KeyboardInterrupt:
             logger.info("Arrêt du scheduler")
             scheduler.shutdown()
+        finally:
+            self.close()
 
 if __name__ == "__main__":
     fetcher = MailFetcher()
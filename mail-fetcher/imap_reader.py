@@ -1,58 +1,176 @@
 import os
 import logging
+import random
+import time
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 import imaplib
 from imapclient import IMAPClient
+from prometheus_client import Counter
 import email
+from email.parser import BytesHeaderParser
 from email.utils import parsedate_to_datetime
 
-from models import EmailMessage
-from utils import parse_email_date, clean_header_value, extract_text_body
+from models import AccountConfig, EmailMessage, SyncCheckpoint
+from utils import parse_email_date, clean_header_value, extract_text_body, header_block
 
 logger = logging.getLogger("mail-fetcher.imap_reader")
 
+IMAP_HANDSHAKES = Counter("mailfetcher_imap_handshakes_total", "Connexions IMAP (TLS + LOGIN + SELECT)")
+
 class IMAPReader:
     """Lecteur IMAP pour récupérer les emails"""
 
-    def __init__(self):
-        self.host = os.getenv("IMAP_HOST", "imap.gmail.com")
-        self.port = int(os.getenv("IMAP_PORT", "993"))
-        self.use_ssl = os.getenv("IMAP_SSL", "true").lower() == "true"
-        self.username = os.getenv("EMAIL_USER")
-        self.password = os.getenv("EMAIL_PASSWORD")
-        self.provider = os.getenv("EMAIL_PROVIDER", "gmail")
-        self.mailbox = os.getenv("MAILBOX", "INBOX")
+    def __init__(self, account: Optional[AccountConfig] = None, mailbox: Optional[str] = None):
+        if account:
+            # Compte issu de ACCOUNTS_CONFIG
+            self.host = account.host
+            self.port = account.port
+            self.use_ssl = account.ssl
+            self.username = account.username
+            self.password = os.getenv(account.password_env)
+            self.provider = account.provider
+        else:
+            self.host = os.getenv("IMAP_HOST", "imap.gmail.com")
+            self.port = int(os.getenv("IMAP_PORT", "993"))
+            self.use_ssl = os.getenv("IMAP_SSL", "true").lower() == "true"
+            self.username = os.getenv("EMAIL_USER")
+            self.password = os.getenv("EMAIL_PASSWORD")
+            self.provider = os.getenv("EMAIL_PROVIDER", "gmail")
+        self.mailbox = mailbox or os.getenv("MAILBOX", "INBOX")
         self.fetch_since_days = int(os.getenv("FETCH_SINCE_DAYS", "3"))
         self.mark_as_seen = os.getenv("MARK_AS_SEEN", "true").lower() == "true"
+        # Nombre d'UID par commande FETCH / STORE
+        self.fetch_chunk_size = int(os.getenv("IMAP_FETCH_CHUNK_SIZE", "25"))
+        self.store_chunk_size = int(os.getenv("IMAP_STORE_CHUNK_SIZE", "500"))
+        # Octets bruts maximum par bloc FETCH (mémoire bornée quelle que soit la boîte)
+        self.fetch_window_bytes = int(os.getenv("FETCH_WINDOW_BYTES", str(20 * 1024 * 1024)))
+        # Messages plus gros ignorés (laissés non lus) pour ne pas exploser la mémoire
+        self.max_message_bytes = int(os.getenv("MAX_MESSAGE_BYTES", str(25 * 1024 * 1024)))
+        self.oversized_uids: List[int] = []
+        # En mode raw, seuls les en-têtes sont parsés ici : le parser lit les octets d'origine
+        self.extract_text = os.getenv("PARSER_UPLOAD", "raw").lower() == "text"
+
+        # Reconnexion : backoff exponentiel avec jitter
+        self.backoff_base = float(os.getenv("IMAP_BACKOFF_BASE_SECONDS", "2"))
+        self.backoff_max = float(os.getenv("IMAP_BACKOFF_MAX_SECONDS", "300"))
+        # Délai réseau : une session morte ne doit pas bloquer NOOP indéfiniment
+        self.timeout = float(os.getenv("IMAP_TIMEOUT_SECONDS", "60"))
+        self.consecutive_failures = 0
+        self.next_attempt_at = 0.0
+
+        # Métriques de session
+        self.handshakes = 0
+        self.handshake_seconds = 0.0
+        self.liveness_failures = 0
 
         self.client: Optional[IMAPClient] = None
+        # Dossier sélectionné et réponse du SELECT (UIDVALIDITY, UIDNEXT...)
+        self.selected_mailbox: Optional[str] = None
+        self.folder_status: Dict[bytes, object] = {}
 
     def connect(self) -> bool:
-        """Connexion au serveur IMAP"""
+        """Connexion au serveur IMAP (TLS, LOGIN, SELECT)"""
         try:
             if not self.username or not self.password:
                 logger.error("EMAIL_USER et EMAIL_PASSWORD requis")
                 return False
 
             logger.info(f"Connexion IMAP à {self.host}:{self.port} (SSL={self.use_ssl})")
+            start = time.perf_counter()
 
             self.client = IMAPClient(
                 host=self.host,
                 port=self.port,
-                ssl=self.use_ssl
+                ssl=self.use_ssl,
+                timeout=self.timeout
             )
 
             self.client.login(self.username, self.password)
-            self.client.select_folder(self.mailbox)
+
+            self.selected_mailbox = None
+            self.select(self.mailbox)
+
+            self.handshakes += 1
+            IMAP_HANDSHAKES.inc()
+            self.handshake_seconds += time.perf_counter() - start
+            self.consecutive_failures = 0
+            self.next_attempt_at = 0.0
 
             logger.info(f"Connecté à la boîte {self.mailbox}")
             return True
 
         except Exception as e:
             logger.error(f"Erreur connexion IMAP: {e}")
+            self.disconnect()
+            self.schedule_retry()
+            return False
+
+    def schedule_retry(self):
+        """Prochaine tentative après un délai exponentiel avec jitter"""
+        self.consecutive_failures += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive_failures - 1))
+        delay = random.uniform(delay / 2, delay)
+        self.next_attempt_at = time.monotonic() + delay
+        logger.warning(f"Nouvelle tentative IMAP dans {delay:.1f}s (échec n°{self.consecutive_failures})")
+
+    def retry_delay(self) -> float:
+        """Secondes avant la prochaine tentative de connexion autorisée"""
+        return max(0.0, self.next_attempt_at - time.monotonic())
+
+    def select(self, mailbox: str):
+        """Sélectionner un dossier (sans aller-retour s'il l'est déjà)"""
+        if self.selected_mailbox == mailbox:
+            # Session réutilisée : UIDNEXT lu au SELECT peut être périmé
+            self.folder_status.pop(b'UIDNEXT', None)
+            return
+
+        self.folder_status = self.client.select_folder(mailbox)
+        self.selected_mailbox = mailbox
+        self.mailbox = mailbox
+
+    def is_alive(self) -> bool:
+        """Vérifier la session avec NOOP"""
+        if not self.client:
+            return False
+        try:
+            self.client.noop()
+            return True
+        except Exception as e:
+            logger.info(f"Session IMAP inactive ({e})")
+            self.liveness_failures += 1
+            return False
+
+    def ensure_connected(self, mailbox: Optional[str] = None) -> bool:
+        """Réutiliser la session ouverte si elle répond, sinon se reconnecter.
+
+        Pendant le backoff, retourne False sans tenter de connexion.
+        """
+        mailbox = mailbox or self.mailbox
+
+        if self.is_alive():
+            try:
+                self.select(mailbox)
+                return True
+            except Exception as e:
+                logger.warning(f"Erreur SELECT {mailbox}: {e}")
+
+        self.disconnect()
+        if self.retry_delay() > 0:
             return False
 
+        self.mailbox = mailbox
+        return self.connect()
+
+    def session_metrics(self) -> dict:
+        return {
+            "connected": self.client is not None,
+            "handshakes": self.handshakes,
+            "handshake_seconds": round(self.handshake_seconds, 3),
+            "liveness_failures": self.liveness_failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
     def disconnect(self):
         """Déconnexion IMAP"""
         if self.client:
@@ -62,9 +180,10 @@ class IMAPReader:
             except:
                 pass
             self.client = None
+            self.selected_mailbox = None
 
-    def fetch_unread_emails(self) -> List[EmailMessage]:
-        """Récupérer les emails non lus depuis N jours"""
+    def search_unread_uids(self) -> List[int]:
+        """Rechercher les UID des emails non lus depuis N jours"""
         if not self.client:
             logger.error("Pas de connexion IMAP active")
             return []
@@ -78,41 +197,198 @@ class IMAPReader:
             messages = self.client.search(criteria)
 
             logger.info(f"Trouvé {len(messages)} emails non lus depuis {self.fetch_since_days} jours")
+            return list(messages)
+
+        except Exception as e:
+            logger.error(f"Erreur recherche emails: {e}")
+            return []
+
+    @property
+    def account(self) -> str:
+        """Identifiant du compte pour les points de reprise"""
+        return f"{self.username}@{self.host}"
+
+    @property
+    def uid_validity(self) -> Optional[int]:
+        value = self.folder_status.get(b'UIDVALIDITY')
+        return int(value) if value is not None else None
+
+    @property
+    def uid_next(self) -> Optional[int]:
+        value = self.folder_status.get(b'UIDNEXT')
+        return int(value) if value is not None else None
+
+    def search_sync_uids(self, checkpoint: Optional[SyncCheckpoint]) -> Optional[List[int]]:
+        """UID à traiter depuis le point de reprise (nouveaux + en échec dont le délai est écoulé).
+
+        Sans point de reprise valide (premier passage ou UIDVALIDITY changé),
+        tous les messages des FETCH_SINCE_DAYS derniers jours sont pris,
+        lus ou non. Ensuite seul `UID n+1:*` est demandé, et rien du tout si
+        UIDNEXT montre qu'aucun message n'est arrivé. Retourne None en cas
+        d'erreur (le point de reprise ne doit alors pas avancer).
+        """
+        if not self.client:
+            logger.error("Pas de connexion IMAP active")
+            return None
+
+        try:
+            if checkpoint is None or checkpoint.uid_validity != self.uid_validity:
+                if checkpoint is not None:
+                    logger.warning(f"UIDVALIDITY changé pour {self.mailbox} - resynchronisation")
+
+                since_date = datetime.now() - timedelta(days=self.fetch_since_days)
+                messages = self.client.search(['SINCE', since_date.strftime('%d-%b-%Y')])
+                logger.info(f"Synchronisation initiale: {len(messages)} emails depuis {self.fetch_since_days} jours")
+                return sorted(messages)
 
-            emails = []
-            for uid in messages:
-                try:
-                    email_msg = self._fetch_email_data(uid)
-                    if email_msg:
-                        emails.append(email_msg)
-                except Exception as e:
-                    logger.warning(f"Erreur traitement email UID {uid}: {e}")
-                    continue
+            new_uids = []
+            if self.uid_next is None or self.uid_next > checkpoint.last_uid + 1:
+                # `n:*` renvoie toujours le dernier message, même si son UID < n
+                messages = self.client.search(['UID', f'{checkpoint.last_uid + 1}:*'])
+                new_uids = [uid for uid in messages if uid > checkpoint.last_uid]
 
-            return emails
+            due_uids = checkpoint.due_uids()
+            logger.info(
+                f"Trouvé {len(new_uids)} nouveaux emails après UID {checkpoint.last_uid}"
+                f" ({len(due_uids)}/{len(checkpoint.pending_uids)} en échec à retenter)"
+            )
+            return sorted(set(new_uids) | set(due_uids))
 
         except Exception as e:
-            logger.error(f"Erreur récupération emails: {e}")
+            logger.error(f"Erreur recherche emails: {e}")
+            return None
+
+    def supports_idle(self) -> bool:
+        """Le serveur annonce-t-il IDLE (RFC 2177) ?"""
+        try:
+            return bool(self.client) and self.client.has_capability('IDLE')
+        except Exception:
+            return False
+
+    def wait_for_new_mail(self, timeout: float) -> bool:
+        """Attendre en IDLE l'arrivée d'un message (EXISTS) jusqu'à `timeout` s.
+
+        Retourne True si de nouveaux messages sont signalés. UIDNEXT lu au
+        SELECT n'est alors plus à jour : il est oublié pour forcer la
+        recherche `UID n+1:*` du cycle suivant.
+        """
+        self.client.idle()
+        try:
+            responses = self.client.idle_check(timeout=timeout)
+        finally:
+            done_responses = self.client.idle_done()[1]
+
+        new_mail = any(
+            len(response) >= 2 and response[1] == b'EXISTS'
+            for response in list(responses) + list(done_responses)
+        )
+        if new_mail:
+            self.folder_status.pop(b'UIDNEXT', None)
+            logger.debug("IDLE: nouveaux messages signalés")
+        return new_mail
+
+    def fetch_unread_emails(self) -> List[EmailMessage]:
+        """Récupérer les emails non lus depuis N jours"""
+        emails = []
+        for email_msgs in self.iter_unread_emails():
+            emails.extend(email_msgs)
+
+        return emails
+
+    def fetch_sizes(self, uids: List[int]) -> Dict[int, int]:
+        """Taille RFC822 de chaque message (sans télécharger les corps)"""
+        sizes = {}
+        for start in range(0, len(uids), self.store_chunk_size):
+            chunk = uids[start:start + self.store_chunk_size]
+            try:
+                response = self.client.fetch(chunk, ['RFC822.SIZE'])
+                for uid, data in response.items():
+                    sizes[uid] = data.get(b'RFC822.SIZE', 0)
+            except Exception as e:
+                logger.warning(f"Erreur lecture tailles UID {chunk[0]}..{chunk[-1]}: {e}")
+        return sizes
+
+    def iter_unread_emails(self, uids: Optional[List[int]] = None) -> Iterator[List[EmailMessage]]:
+        """Lire les emails par blocs, sans matérialiser toute la boîte.
+
+        Un bloc contient au plus IMAP_FETCH_CHUNK_SIZE messages et
+        FETCH_WINDOW_BYTES octets bruts. Les messages de plus de
+        MAX_MESSAGE_BYTES sont reportés (non téléchargés, laissés non lus)
+        et listés dans `oversized_uids`.
+        """
+        if uids is None:
+            uids = self.search_unread_uids()
+        self.oversized_uids = []
+        if not uids:
+            return
+
+        sizes = self.fetch_sizes(uids)
+        chunk: List[int] = []
+        chunk_bytes = 0
+
+        for uid in uids:
+            size = sizes.get(uid, 0)
+            if size > self.max_message_bytes:
+                logger.warning(f"Email UID {uid} trop volumineux ({size} octets) - reporté")
+                self.oversized_uids.append(uid)
+                continue
+
+            if chunk and (len(chunk) >= self.fetch_chunk_size
+                          or chunk_bytes + size > self.fetch_window_bytes):
+                yield self.fetch_emails(chunk)
+                chunk, chunk_bytes = [], 0
+
+            chunk.append(uid)
+            chunk_bytes += size
+
+        if chunk:
+            yield self.fetch_emails(chunk)
+
+    def fetch_emails(self, uids: List[int]) -> List[EmailMessage]:
+        """Récupérer plusieurs emails en une seule commande UID FETCH"""
+        if not uids:
             return []
 
-    def _fetch_email_data(self, uid: int) -> Optional[EmailMessage]:
-        """Récupérer les données d'un email spécifique"""
         try:
-            # Récupérer headers et body
-            response = self.client.fetch([uid], ['ENVELOPE', 'BODY[]'])
-            data = response[uid]
+            # BODY.PEEK[] ne positionne pas \Seen : le marquage reste explicite
+            response = self.client.fetch(uids, ['BODY.PEEK[]'])
+        except Exception as e:
+            logger.error(f"Erreur fetch UID {uids[0]}..{uids[-1]}: {e}")
+            return []
+
+        emails = []
+        for uid in uids:
+            data = response.get(uid)
+            if not data or b'BODY[]' not in data:
+                logger.warning(f"Email UID {uid} absent de la réponse FETCH")
+                continue
 
-            # Parser le message complet
-            raw_message = data[b'BODY[]'].decode('utf-8', errors='ignore')
-            msg = email.message_from_string(raw_message)
+            email_msg = self._build_email_message(uid, data[b'BODY[]'])
+            if email_msg:
+                emails.append(email_msg)
 
-            # Extraire les métadonnées
-            envelope = data[b'ENVELOPE']
+        return emails
 
-            # Construire les en-têtes bruts
+    def fetch_email(self, uid: int) -> Optional[EmailMessage]:
+        """Récupérer les données d'un email spécifique"""
+        emails = self.fetch_emails([uid])
+        return emails[0] if emails else None
+
+    def _build_email_message(self, uid: int, raw_bytes: bytes) -> Optional[EmailMessage]:
+        """Construire un EmailMessage à partir du message RFC822 brut"""
+        try:
             raw_headers = []
-            for header_name, header_value in msg.items():
-                raw_headers.append(f"{header_name}: {header_value}")
+            raw_body = ""
+            if self.extract_text:
+                # Ancien format : reconstruction texte (en-têtes + corps text/plain)
+                raw_message = raw_bytes.decode('utf-8', errors='ignore')
+                msg = email.message_from_string(raw_message)
+                for header_name, header_value in msg.items():
+                    raw_headers.append(f"{header_name}: {header_value}")
+                raw_body = extract_text_body(raw_message)
+            else:
+                # En-têtes seulement, pour les logs et le filtrage
+                msg = BytesHeaderParser().parsebytes(header_block(raw_bytes))
 
             email_data = EmailMessage(
                 uid=uid,
@@ -121,10 +397,13 @@ class IMAPReader:
                 cc_addr=clean_header_value(msg.get('Cc', '')),
                 subject=clean_header_value(msg.get('Subject', '')),
                 date=parse_email_date(msg.get('Date')),
+                raw_message=raw_bytes,
                 raw_headers="\n".join(raw_headers),
-                raw_body=extract_text_body(raw_message),
+                raw_body=raw_body,
                 provider=self.provider,
-                mailbox=self.mailbox
+                account=self.account,
+                mailbox=self.mailbox,
+                uid_validity=self.uid_validity
             )
 
             logger.debug(f"Email UID {uid} traité: {email_data.subject}")
@@ -134,15 +413,23 @@ class IMAPReader:
             logger.error(f"Erreur fetch email UID {uid}: {e}")
             return None
 
-    def mark_email_as_seen(self, uid: int) -> bool:
-        """Marquer un email comme lu"""
-        if not self.mark_as_seen or not self.client:
+    def mark_emails_as_seen(self, uids: List[int]) -> bool:
+        """Marquer plusieurs emails comme lus avec un UID STORE groupé"""
+        if not self.mark_as_seen or not self.client or not uids:
             return True
 
-        try:
-            self.client.add_flags([uid], [b'\\Seen'])
-            logger.debug(f"Email UID {uid} marqué comme lu")
-            return True
-        except Exception as e:
-            logger.warning(f"Erreur marquage email UID {uid}: {e}")
-            return False
\ No newline at end of file
+        ok = True
+        for start in range(0, len(uids), self.store_chunk_size):
+            chunk = uids[start:start + self.store_chunk_size]
+            try:
+                self.client.add_flags(chunk, [b'\\Seen'])
+                logger.debug(f"{len(chunk)} emails marqués comme lus")
+            except Exception as e:
+                logger.warning(f"Erreur marquage UID {chunk[0]}..{chunk[-1]}: {e}")
+                ok = False
+
+        return ok
+
+    def mark_email_as_seen(self, uid: int) -> bool:
+        """Marquer un email comme lu"""
+        return self.mark_emails_as_seen([uid])
@@ -1,11 +1,16 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, field_validator
+from typing import Dict, List, Optional
 from datetime import datetime
 
 class EmailData(BaseModel):
     """Structure d'un email pour l'API mail-parser"""
-    raw_email: str
+    raw_email: str = ""
+    # Octets RFC822 d'origine en base64 (PARSER_UPLOAD=raw)
+    raw_email_b64: Optional[str] = None
+    encoding: Optional[str] = None  # None | 'gzip'
     provider: str
+    account: str = ""
+    # Clé d'idempotence côté parser : "<UIDVALIDITY>:<UID>"
     external_id: str
     mailbox: str = "INBOX"
 
@@ -21,6 +26,22 @@ class ParseResult(BaseModel):
     processed: bool
     status: str
 
+class BatchItemResult(BaseModel):
+    """Résultat d'un élément de /parse/batch"""
+    index: int
+    external_id: Optional[str] = None
+    status: str
+    result: Optional[ParseResult] = None
+    error: Optional[str] = None
+
+class BatchParseResult(BaseModel):
+    """Résultat d'un lot envoyé à /parse/batch"""
+    total: int
+    succeeded: int
+    failed: int
+    duplicates: int = 0
+    results: List[BatchItemResult]
+
 class EmailMessage(BaseModel):
     """Métadonnées d'un email IMAP"""
     uid: int
@@ -29,7 +50,55 @@ class EmailMessage(BaseModel):
     cc_addr: str = ""
     subject: str
     date: datetime
-    raw_headers: str
-    raw_body: str
+    # Message RFC822 tel que reçu du serveur, transmis sans re-parsing
+    raw_message: bytes = b""
+    # Reconstruction texte (PARSER_UPLOAD=text uniquement)
+    raw_headers: str = ""
+    raw_body: str = ""
     provider: str
-    mailbox: str
\ No newline at end of file
+    account: str = ""
+    mailbox: str
+    # UIDVALIDITY du dossier au moment du FETCH (l'UID seul n'est pas unique)
+    uid_validity: Optional[int] = None
+
+class AccountConfig(BaseModel):
+    """Compte IMAP déclaré dans le fichier ACCOUNTS_CONFIG"""
+    name: str
+    provider: str = "imap"
+    host: str
+    port: int = 993
+    ssl: bool = True
+    username: str
+    # Nom de la variable d'environnement contenant le mot de passe
+    password_env: str
+    mailboxes: List[str] = ["INBOX"]
+    # Sessions IMAP simultanées maximum pour ce compte
+    max_sessions: int = 1
+
+class PendingUid(BaseModel):
+    """UID en échec, retenté avec un délai croissant (jamais abandonné)"""
+    attempts: int = 0
+    retry_at: Optional[datetime] = None
+
+class SyncCheckpoint(BaseModel):
+    """Point de reprise de synchronisation d'un dossier IMAP"""
+    account: str
+    mailbox: str
+    uid_validity: int
+    last_uid: int = 0
+    # UID en échec -> tentatives et prochain essai
+    pending_uids: Dict[int, PendingUid] = {}
+    updated_at: Optional[datetime] = None
+
+    @field_validator("pending_uids", mode="before")
+    @classmethod
+    def _legacy_pending(cls, value):
+        # Ancien format de fichier : UID -> nombre de tentatives
+        if isinstance(value, dict):
+            return {uid: {"attempts": v} if isinstance(v, int) else v for uid, v in value.items()}
+        return value
+
+    def due_uids(self, now: Optional[datetime] = None) -> List[int]:
+        """UID en échec dont le délai avant nouvel essai est écoulé"""
+        now = now or datetime.now()
+        return [uid for uid, p in self.pending_uids.items() if p.retry_at is None or p.retry_at <= now]
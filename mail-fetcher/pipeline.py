@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+from prometheus_client import Gauge, Histogram
+
+logger = logging.getLogger("mail-fetcher.pipeline")
+
+# Chaque mesure d'étape alimente aussi l'histogramme (connect, search, fetch,
+# send, backpressure, mark_seen)
+STAGE_SECONDS = Histogram(
+    "mailfetcher_stage_duration_seconds", "Durée d'une opération par étape du cycle", ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+SENDS_IN_FLIGHT = Gauge("mailfetcher_sends_in_flight", "Envois vers le parser en cours")
+
+
+class StageTimings:
+    """Temps cumulé et nombre d'opérations par étape d'un cycle"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, float] = defaultdict(float)
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float, count: int = 1):
+        STAGE_SECONDS.labels(stage).observe(seconds)
+        with self._lock:
+            self._totals[stage] += seconds
+            self._counts[stage] += count
+
+    @contextmanager
+    def measure(self, stage: str, count: int = 1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, count)
+
+    def summary(self) -> dict:
+        """Résumé : secondes cumulées, opérations et ms/opération par étape"""
+        with self._lock:
+            stages = {
+                stage: {
+                    "seconds": round(total, 3),
+                    "count": self._counts[stage],
+                    "avg_ms": round(total * 1000 / self._counts[stage], 1) if self._counts[stage] else 0.0,
+                }
+                for stage, total in self._totals.items()
+            }
+        return {"wall_seconds": round(time.perf_counter() - self._started, 3), "stages": stages}
+
+
+class SendPipeline:
+    """Envoi concurrent vers le parser avec un nombre borné d'envois en vol.
+
+    `submit` bloque tant que `max_in_flight` envois sont en cours : la lecture
+    IMAP ralentit d'elle-même quand le parser ralentit. `on_done` est toujours
+    appelé dans le thread appelant (IMAPClient n'est pas thread-safe).
+    """
+
+    def __init__(self, send_func: Callable[[List], set], on_done: Callable[[List, set], None],
+                 max_in_flight: int, timings: StageTimings):
+        self.send_func = send_func
+        self.on_done = on_done
+        self.max_in_flight = max(1, max_in_flight)
+        self.timings = timings
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_in_flight,
+            thread_name_prefix="send"
+        )
+        self._in_flight = {}
+
+    def _timed_send(self, unit: List) -> set:
+        SENDS_IN_FLIGHT.inc()
+        try:
+            with self.timings.measure("send", count=len(unit)):
+                return self.send_func(unit)
+        finally:
+            SENDS_IN_FLIGHT.dec()
+
+    def _complete(self, done):
+        for future in done:
+            unit = self._in_flight.pop(future)
+            try:
+                succeeded = future.result()
+            except Exception as e:
+                logger.error(f"Erreur envoi au parser: {e}")
+                succeeded = set()
+            self.on_done(unit, succeeded)
+
+    def submit(self, unit: List):
+        """Ajouter un lot d'emails, en attendant une place libre si besoin"""
+        self.poll()
+        if len(self._in_flight) >= self.max_in_flight:
+            with self.timings.measure("backpressure"):
+                done, _ = wait(self._in_flight, return_when=FIRST_COMPLETED)
+            self._complete(done)
+
+        future = self._executor.submit(self._timed_send, unit)
+        self._in_flight[future] = unit
+
+    def poll(self):
+        """Traiter les envois terminés sans bloquer"""
+        done = [f for f in self._in_flight if f.done()]
+        if done:
+            self._complete(done)
+
+    def drain(self):
+        """Attendre la fin de tous les envois en cours"""
+        while self._in_flight:
+            done, _ = wait(self._in_flight, return_when=FIRST_COMPLETED)
+            self._complete(done)
+
+    def close(self):
+        self.drain()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,47 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+logger = logging.getLogger("mail-fetcher.status")
+
+
+def start_status_server(port: int, get_status: Callable[[], dict]) -> ThreadingHTTPServer:
+    """Serveur HTTP embarqué (thread) : /health et /status en JSON, /metrics (Prometheus)"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, payload: dict, status: int = 200):
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_bytes(self, body: bytes, content_type: str):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json({"ok": True})
+            elif self.path == "/status":
+                self._send_json(get_status())
+            elif self.path == "/metrics":
+                self._send_bytes(generate_latest(), CONTENT_TYPE_LATEST)
+            else:
+                self._send_json({"detail": "Not Found"}, status=404)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="status").start()
+    logger.info(f"Serveur de statut sur le port {port}")
+    return server
@@ -0,0 +1,122 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from models import PendingUid, SyncCheckpoint
+
+logger = logging.getLogger("mail-fetcher.sync_state")
+
+
+class SyncStateStore:
+    """Points de reprise par (compte, dossier), persistés dans un fichier JSON"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("SYNC_STATE_PATH", "/data/sync-state.json")
+        self._lock = threading.Lock()
+
+    def _read_all(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Fichier de reprise illisible {self.path}: {e}")
+            return {}
+
+    @staticmethod
+    def _key(account: str, mailbox: str) -> str:
+        return f"{account}/{mailbox}"
+
+    def load(self, account: str, mailbox: str) -> Optional[SyncCheckpoint]:
+        """Lire le point de reprise d'un dossier (None si jamais synchronisé)"""
+        with self._lock:
+            data = self._read_all().get(self._key(account, mailbox))
+        return SyncCheckpoint(**data) if data else None
+
+    def save(self, checkpoint: SyncCheckpoint):
+        """Écrire le point de reprise (écriture atomique via fichier temporaire)"""
+        with self._lock:
+            state = self._read_all()
+            state[self._key(checkpoint.account, checkpoint.mailbox)] = checkpoint.model_dump(mode="json")
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def summary(self) -> dict:
+        """UID en échec par dossier, pour /status"""
+        with self._lock:
+            state = self._read_all()
+        summary = {}
+        for key, data in state.items():
+            checkpoint = SyncCheckpoint(**data)
+            pending = checkpoint.pending_uids.values()
+            summary[key] = {
+                "last_uid": checkpoint.last_uid,
+                "pending": len(checkpoint.pending_uids),
+                "max_attempts": max((p.attempts for p in pending), default=0),
+                "next_retry_at": min((p.retry_at for p in pending if p.retry_at), default=None),
+                "updated_at": checkpoint.updated_at,
+            }
+        return summary
+
+
+def retry_delay(attempts: int, backoff_seconds: float, max_backoff_seconds: float) -> float:
+    """Délai avant le prochain essai d'un UID en échec (doublé à chaque tentative)"""
+    return min(max_backoff_seconds, backoff_seconds * 2 ** max(0, attempts - 1))
+
+
+def advance_checkpoint(checkpoint: Optional[SyncCheckpoint], account: str, mailbox: str,
+                       uid_validity: int, uid_next: Optional[int],
+                       planned_uids: Iterable[int], succeeded_uids: Iterable[int],
+                       backoff_seconds: float, max_backoff_seconds: float,
+                       now: Optional[datetime] = None) -> SyncCheckpoint:
+    """Calculer le nouveau point de reprise après un cycle.
+
+    `last_uid` avance jusqu'au plus grand UID traité ; les UID en échec sont
+    gardés dans `pending_uids` sans limite de tentatives, avec un délai
+    exponentiel plafonné à `max_backoff_seconds` (une panne du parser ne
+    doit pas faire perdre d'email). Une synchronisation initiale sans aucun
+    message dans la fenêtre FETCH_SINCE_DAYS part de UIDNEXT - 1.
+    """
+    planned_uids = list(planned_uids)
+    now = now or datetime.now()
+
+    if checkpoint is None or checkpoint.uid_validity != uid_validity:
+        checkpoint = SyncCheckpoint(
+            account=account,
+            mailbox=mailbox,
+            uid_validity=uid_validity,
+            last_uid=(uid_next - 1) if uid_next and not planned_uids else 0
+        )
+
+    succeeded = set(succeeded_uids)
+    pending = dict(checkpoint.pending_uids)
+
+    for uid in planned_uids:
+        if uid in succeeded:
+            pending.pop(uid, None)
+            continue
+
+        attempts = pending[uid].attempts + 1 if uid in pending else 1
+        delay = retry_delay(attempts, backoff_seconds, max_backoff_seconds)
+        pending[uid] = PendingUid(attempts=attempts, retry_at=now + timedelta(seconds=delay))
+        log = logger.error if delay >= max_backoff_seconds else logger.warning
+        log(f"Email UID {uid} en échec ({attempts} tentatives, {mailbox}) - nouvel essai dans {delay:.0f}s")
+
+    return SyncCheckpoint(
+        account=account,
+        mailbox=mailbox,
+        uid_validity=uid_validity,
+        last_uid=max([checkpoint.last_uid] + planned_uids),
+        pending_uids=pending,
+        updated_at=now
+    )
@@ -1,6 +1,8 @@
 import email
+import re
 from email.utils import parsedate_to_datetime
 from datetime import datetime
+from html.parser import HTMLParser
 import logging
 
 logger = logging.getLogger("mail-fetcher.utils")
@@ -16,18 +18,66 @@ def parse_email_date(date_str: str) -> datetime:
         logger.warning(f"Date invalide: {date_str}, erreur: {e}")
         return datetime.now()
 
+class _HTMLText(HTMLParser):
+    """Texte visible d'un HTML (hors script/style), blocs sur des lignes séparées"""
+
+    BLOCKS = {'br', 'p', 'div', 'tr', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'table'}
+    SKIP = {'script', 'style', 'head', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag in self.BLOCKS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip = max(0, self._skip - 1)
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+def _decode_part(part) -> str:
+    """Décoder une partie texte avec son charset déclaré (UTF-8 puis cp1252 en repli)"""
+    payload = part.get_payload(decode=True) or b''
+    for charset in (part.get_content_charset(), 'utf-8', 'cp1252'):
+        if not charset:
+            continue
+        try:
+            return payload.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return payload.decode('utf-8', errors='replace')
+
 def extract_text_body(raw_message: str) -> str:
-    """Extraire le corps texte d'un email"""
+    """Extraire le corps texte d'un email (text/plain, sinon HTML converti).
+
+    mail-parser refait une extraction complète (alternatives, normalisation) ;
+    ce texte ne sert qu'à l'ancien mode d'envoi PARSER_UPLOAD=text.
+    """
     try:
         msg = email.message_from_string(raw_message)
-
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/plain":
-                    return part.get_payload(decode=True).decode('utf-8', errors='ignore')
+        html = None
+        for part in msg.walk():
+            if part.is_multipart() or part.get_content_disposition() == 'attachment':
+                continue
+            content_type = part.get_content_type()
+            if content_type == "text/plain":
+                return _decode_part(part)
+            if content_type == "text/html" and html is None:
+                html = _decode_part(part)
+        if html is None:
             return ""
-        else:
-            return msg.get_payload(decode=True).decode('utf-8', errors='ignore')
+        converter = _HTMLText()
+        converter.feed(html)
+        converter.close()
+        return re.sub(r'\n\s*\n+', '\n\n', re.sub(r'[ \t\xa0]+', ' ', ''.join(converter.parts))).strip()
     except Exception as e:
         logger.warning(f"Erreur extraction body: {e}")
         return ""
@@ -55,4 +105,12 @@ def clean_header_value(value: str) -> str:
 
 def format_raw_email(headers: str, body: str) -> str:
     """Reformater un email pour l'API mail-parser"""
-    return f"{headers}\n\n{body}"
\ No newline at end of file
+    return f"{headers}\n\n{body}"
+
+
+def header_block(raw_bytes: bytes) -> bytes:
+    """Bloc d'en-têtes d'un message RFC822 (jusqu'à la première ligne vide)"""
+    ends = [i for i in (raw_bytes.find(b"\r\n\r\n"), raw_bytes.find(b"\n\n")) if i >= 0]
+    if not ends:
+        return raw_bytes
+    return raw_bytes[:min(ends) + 1]
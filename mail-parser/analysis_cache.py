@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parseaddr
+from typing import Dict, Optional
+
+from psycopg2.extras import Json, RealDictCursor
+
+from database import Database
+
+logger = logging.getLogger("mail-parser.analysis_cache")
+
+_REPLY_PREFIX = re.compile(r'^\s*((re|fw|fwd|tr|aw|wg)\s*(\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+_URL = re.compile(r'https?://([^/\s?#>"]+)[^\s>"]*', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(parsed_email: Dict) -> str:
+    """Empreinte du contenu normalisé (expéditeur, sujet, corps nettoyé).
+
+    Les préfixes Re:/Fwd:, les lignes citées, les paramètres de suivi des
+    liens et les espaces ne comptent pas : deux envois d'une même newsletter
+    ou d'une même notification ont la même empreinte.
+    """
+    sender = parseaddr(parsed_email.get('from') or '')[1].lower()
+    subject = _REPLY_PREFIX.sub('', parsed_email.get('subject') or '').lower()
+
+    body_lines = [
+        line for line in (parsed_email.get('body') or '').splitlines()
+        if not line.lstrip().startswith('>')
+    ]
+    body = _URL.sub(lambda m: m.group(1).lower(), "\n".join(body_lines))
+
+    normalized = "\x1f".join(_WHITESPACE.sub(' ', part).strip() for part in (sender, subject, body.lower()))
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """Cache des analyses IA à deux niveaux : LRU en mémoire puis table PostgreSQL.
+
+    Chaque entrée garde la durée de l'appel LLM d'origine pour mesurer le
+    temps économisé par les hits. Les entrées expirent après
+    ANALYSIS_CACHE_TTL_SECONDS (purge périodique de la table).
+    """
+
+    def __init__(self, database: Database):
+        self.db = database
+        self.enabled = os.getenv("ANALYSIS_CACHE", "true").lower() == "true"
+        self.max_entries = int(os.getenv("ANALYSIS_CACHE_SIZE", "1000"))
+        self.ttl = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+        self.purge_interval = float(os.getenv("ANALYSIS_CACHE_PURGE_SECONDS", "3600"))
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def _remember(self, key: str, result: dict, latency: float, stored_at: float):
+        with self._lock:
+            self._entries[key] = (result, latency, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _from_memory(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[2] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get(self, key: str) -> Optional[dict]:
+        """Analyse en cache pour cette empreinte (None si absente ou expirée)"""
+        if not self.enabled:
+            return None
+
+        entry = self._from_memory(key)
+        if entry is not None:
+            with self._lock:
+                self.memory_hits += 1
+                self.saved_seconds += entry[1]
+            return dict(entry[0])
+
+        with self.db.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("""
+                    UPDATE analysis_cache
+                    SET hits = hits + 1, last_hit_at = NOW()
+                    WHERE fingerprint = %s
+                      AND created_at > NOW() - make_interval(secs => %s)
+                    RETURNING result, latency_ms, EXTRACT(EPOCH FROM created_at) AS stored_at;
+                """, (key, self.ttl))
+                row = cur.fetchone()
+            conn.commit()
+
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        result = row['result'] if isinstance(row['result'], dict) else json.loads(row['result'])
+        latency = (row['latency_ms'] or 0) / 1000
+        self._remember(key, result, latency, float(row['stored_at']))
+        with self._lock:
+            self.db_hits += 1
+            self.saved_seconds += latency
+        return dict(result)
+
+    def put(self, key: str, result: dict, latency: float):
+        """Enregistrer une analyse fraîche (mémoire + table)"""
+        if not self.enabled:
+            return
+
+        self._remember(key, dict(result), latency, time.time())
+        with self.db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO analysis_cache (fingerprint, result, latency_ms)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (fingerprint) DO UPDATE
+                    SET result = EXCLUDED.result, latency_ms = EXCLUDED.latency_ms,
+                        created_at = NOW(), hits = 0;
+                """, (key, Json(result), int(latency * 1000)))
+            conn.commit()
+
+    def purge_expired(self, force: bool = False) -> int:
+        """Supprimer les entrées expirées de la table (au plus une fois par intervalle)"""
+        now = time.time()
+        if not self.enabled or (not force and now - self._last_purge < self.purge_interval):
+            return 0
+        self._last_purge = now
+
+        with self.db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    DELETE FROM analysis_cache
+                    WHERE created_at < NOW() - make_interval(secs => %s);
+                """, (self.ttl,))
+                deleted = cur.rowcount
+            conn.commit()
+
+        if deleted:
+            logger.info(f"Cache d'analyses: {deleted} entrées expirées supprimées")
+        return deleted
+
+    def metrics(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries_in_memory": len(self._entries),
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 1),
+            }
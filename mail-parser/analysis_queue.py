@@ -0,0 +1,255 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+
+from prometheus_client import Histogram
+from psycopg2.extras import RealDictCursor
+
+from analysis_cache import AnalysisCache, fingerprint
+from database import Database, DatabaseUnavailable
+from parser.ai_agent import AIAgent
+import repository
+
+logger = logging.getLogger("mail-parser.analysis_queue")
+
+# Appels LLM (un email ou un lot), échecs compris
+AI_SECONDS = Histogram(
+    "mailparser_ai_analysis_duration_seconds", "Durée d'un appel d'analyse IA", ["mode"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+)
+
+
+class AnalysisWorkerPool:
+    """Workers d'analyse IA alimentés par la table analysis_jobs.
+
+    /parse valide l'email et crée le job dans la même transaction ; les
+    workers réservent les jobs avec FOR UPDATE SKIP LOCKED, appellent le LLM
+    sans connexion DB ouverte, puis enregistrent le résultat. Un job en échec
+    est replanifié avec un backoff exponentiel jusqu'à ANALYSIS_MAX_ATTEMPTS,
+    puis passe en 'dead'. Les emails que le classifieur local reconnaît avec
+    assez de confiance, et les contenus déjà analysés (même empreinte, servis
+    par AnalysisCache), ne passent pas par le LLM.
+
+    Les jobs sont réservés par lots : un lot part dès ANALYSIS_BATCH_SIZE
+    jobs ou après ANALYSIS_BATCH_WAIT_SECONDS, et ses emails sont analysés
+    en un seul appel (AIAgent.analyze_emails).
+    """
+
+    def __init__(self, database: Database):
+        self.db = database
+        self.concurrency = int(os.getenv("ANALYSIS_WORKERS", "4"))
+        self.poll_interval = float(os.getenv("ANALYSIS_POLL_SECONDS", "2"))
+        self.max_attempts = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "5"))
+        self.retry_base = float(os.getenv("ANALYSIS_RETRY_BASE_SECONDS", "10"))
+        self.retry_max = float(os.getenv("ANALYSIS_RETRY_MAX_SECONDS", "600"))
+        # Job 'running' sans nouvelles depuis ce délai : worker considéré mort
+        self.lock_timeout = float(os.getenv("ANALYSIS_LOCK_TIMEOUT_SECONDS", "300"))
+        # Micro-lots : nombre d'emails par appel LLM et attente maximale pour compléter un lot
+        self.batch_size = max(1, int(os.getenv("ANALYSIS_BATCH_SIZE", "10")))
+        self.batch_wait = float(os.getenv("ANALYSIS_BATCH_WAIT_SECONDS", "0.5"))
+
+        # Un seul agent (et client OpenAI) par processus, partagé par les workers
+        self.agent: Optional[AIAgent] = None
+        self.cache = AnalysisCache(database)
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self.completed_total = 0
+        self.retried_total = 0
+        self.dead_total = 0
+        self.llm_calls_total = 0
+        self.local_total = 0
+        self.llm_items_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Analyse IA active uniquement avec une clé OpenAI"""
+        return bool(os.getenv("OPENAI_API_KEY"))
+
+    def start(self):
+        """Démarrer les workers (sans effet si l'analyse est désactivée)"""
+        if not self.enabled:
+            logger.info("Pas de clé OpenAI - file d'analyse IA désactivée")
+            return
+
+        self.agent = AIAgent()
+        self._stop.clear()
+        for i in range(max(1, self.concurrency)):
+            thread = threading.Thread(target=self._worker, name=f"analysis-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"File d'analyse IA démarrée ({len(self._threads)} workers)")
+
+    def stop(self, timeout: float = 10.0):
+        """Arrêter les workers (les jobs en cours se terminent)"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def notify(self):
+        """Signaler de nouveaux jobs (évite d'attendre le prochain poll)"""
+        self._wakeup.set()
+
+    def retry_delay(self, attempts: int) -> float:
+        """Backoff exponentiel avec jitter"""
+        delay = min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _claim(self, limit: int) -> List[dict]:
+        with self.db.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                jobs = repository.claim_analysis_jobs(cur, limit, self.lock_timeout)
+            conn.commit()
+        return jobs
+
+    def collect_batch(self) -> List[dict]:
+        """Réserver un lot : complet (batch_size) ou à l'échéance (batch_wait)"""
+        jobs = self._claim(self.batch_size)
+        if not jobs:
+            return []
+
+        deadline = time.monotonic() + self.batch_wait
+        while len(jobs) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._stop.wait(min(remaining, 0.1))
+            jobs.extend(self._claim(self.batch_size - len(jobs)))
+        return jobs
+
+    def _finish(self, outcomes: List[tuple]):
+        """Enregistrer les résultats d'un lot (job, analyse, erreur) en une transaction"""
+        with self.db.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                for job, analysis, error in outcomes:
+                    if error is None:
+                        if analysis is not None:
+                            repository.insert_analysis(cur, job['email_id'], analysis)
+                        repository.complete_analysis_job(cur, job['id'])
+                    elif job['attempts'] >= self.max_attempts:
+                        repository.fail_analysis_job(cur, job['id'], error, None)
+                    else:
+                        repository.fail_analysis_job(cur, job['id'], error, self.retry_delay(job['attempts']))
+            conn.commit()
+
+        with self._lock:
+            for job, _, error in outcomes:
+                if error is None:
+                    self.completed_total += 1
+                elif job['attempts'] >= self.max_attempts:
+                    self.dead_total += 1
+                    logger.error(f"Job analyse {job['id']} (email {job['email_id']}) abandonné: {error}")
+                else:
+                    self.retried_total += 1
+                    logger.warning(f"Job analyse {job['id']} tentative {job['attempts']} échouée: {error}")
+
+    def _analyze(self, jobs: List[dict]) -> Dict[int, dict]:
+        """Appel LLM pour les jobs donnés : un email seul ou un lot"""
+        with self._lock:
+            self.llm_calls_total += 1
+            self.llm_items_total += len(jobs)
+        if len(jobs) == 1:
+            with AI_SECONDS.labels("single").time():
+                return {jobs[0]['id']: self.agent.analyze_email(jobs[0]['email'], fallback=False)}
+        with AI_SECONDS.labels("batch").time():
+            return self.agent.analyze_emails({job['id']: job['email'] for job in jobs}, fallback=False)
+
+    def process_batch(self) -> bool:
+        """Traiter un lot de jobs ; False si la file est vide"""
+        jobs = self.collect_batch()
+        if not jobs:
+            return False
+
+        outcomes = []
+        pending = []
+        for job in jobs:
+            if 'email' not in job:
+                # Email supprimé entre-temps
+                outcomes.append((job, None, None))
+                continue
+            local = self.agent.classifier.classify(job['email'])
+            if local is not None:
+                outcomes.append((job, local, None))
+                with self._lock:
+                    self.local_total += 1
+                continue
+            job['fingerprint'] = fingerprint(job['email'])
+            cached = self.cache.get(job['fingerprint'])
+            if cached is not None:
+                outcomes.append((job, cached, None))
+            else:
+                pending.append(job)
+
+        fresh = []
+        if pending:
+            try:
+                start = time.perf_counter()
+                results = self._analyze(pending)
+                latency = (time.perf_counter() - start) / len(pending)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                outcomes.extend((job, None, error) for job in pending)
+            else:
+                for job in pending:
+                    analysis = results.get(job['id'])
+                    if not isinstance(analysis, dict):
+                        outcomes.append((job, None, f"Réponse IA invalide: {analysis!r}"))
+                        continue
+                    outcomes.append((job, analysis, None))
+                    if analysis.get('analysis_type') != 'mock':
+                        fresh.append((job['fingerprint'], analysis))
+
+        self._finish(outcomes)
+
+        for key, analysis in fresh:
+            try:
+                self.cache.put(key, analysis, latency)
+            except Exception as e:
+                logger.warning(f"Cache d'analyses: écriture impossible ({e})")
+
+        logger.info(
+            f"Lot d'analyses: {len(jobs)} jobs, {len(jobs) - len(pending)} sans appel LLM, "
+            f"{sum(1 for _, _, error in outcomes if error)} en échec"
+        )
+        return True
+
+    def _worker(self):
+        while not self._stop.is_set():
+            try:
+                if self.process_batch():
+                    continue
+            except DatabaseUnavailable as e:
+                logger.warning(f"File d'analyse: pool DB saturé ({e})")
+            except Exception as e:
+                logger.error(f"File d'analyse: erreur worker: {e}")
+
+            # File vide (ou erreur) : purge du cache puis attente d'un nouveau job
+            try:
+                self.cache.purge_expired()
+            except Exception as e:
+                logger.warning(f"Cache d'analyses: purge impossible ({e})")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "workers": len(self._threads),
+                "completed_total": self.completed_total,
+                "retried_total": self.retried_total,
+                "dead_total": self.dead_total,
+                "local_total": self.local_total,
+                "llm_calls_total": self.llm_calls_total,
+                "emails_per_llm_call": (
+                    round(self.llm_items_total / self.llm_calls_total, 2) if self.llm_calls_total else 0.0
+                ),
+                "cache": self.cache.metrics(),
+                "prompt_body": self.agent.metrics() if self.agent else None,
+            }
@@ -1,16 +1,32 @@
+import asyncio
+import base64
+import functools
+import gzip
+import hashlib
 import logging
 import os
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional, Union
 import json
+from urllib.parse import quote
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
 from pydantic import BaseModel
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
-from parser.email_analyzer import EmailAnalyzer
-from parser.ai_agent import AIAgent
+from analysis_queue import AnalysisWorkerPool
+from database import db, DatabaseUnavailable
+from stats_cache import StatsCache
+from archive_store import ContentAddressedStore
+from parse_pool import ParsePool
+from maintenance import StorageMaintenance
+import partitions
+import repository
 
 # Configuration des logs
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -19,10 +35,144 @@ logger = logging.getLogger("mail-parser")
 
 app = FastAPI(title="MCP-Hub Mail Parser", version="1.0.0")
 
+# Taille maximale d'un lot /parse/batch
+MAX_BATCH_SIZE = int(os.getenv("PARSE_MAX_BATCH_SIZE", "500"))
+
+# Taille maximale d'une page GET /emails
+MAX_PAGE_SIZE = int(os.getenv("EMAILS_MAX_PAGE_SIZE", "200"))
+
+# Workers d'analyse IA (file analysis_jobs)
+analysis_workers = AnalysisWorkerPool(db)
+
+# Pièces jointes décodées, dédupliquées par SHA-256 (désactivé si ATTACHMENT_STORE_DIR est vide)
+ATTACHMENT_STORE_DIR = os.getenv("ATTACHMENT_STORE_DIR", "")
+attachment_store = ContentAddressedStore(ATTACHMENT_STORE_DIR) if ATTACHMENT_STORE_DIR else None
+
+# Parsing MIME hors GIL (PARSE_PROCESSES processus, 0 = dans les threads)
+parse_pool = ParsePool(attachment_store)
+
+# Partitions mensuelles, rétention et archivage des corps bruts
+storage_maintenance = StorageMaintenance(db, attachment_store)
+
+# /stats : compteurs incrémentaux, cache court partagé entre requêtes
+stats_cache = StatsCache(db)
+
+# Métriques Prometheus (GET /metrics)
+EMAILS_INGESTED = Counter("mailparser_emails_ingested_total", "Emails stockés", ["provider"])
+EMAILS_DEDUPLICATED = Counter(
+    "mailparser_emails_deduplicated_total", "Emails déjà stockés (même clé), non retraités", ["provider"]
+)
+EMAILS_FAILED = Counter("mailparser_emails_failed_total", "Emails en échec par étape", ["stage"])
+HTTP_SECONDS = Histogram(
+    "mailparser_http_request_duration_seconds", "Durée des requêtes HTTP", ["method", "handler", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+ANALYSIS_BACKLOG = Gauge("mailparser_analysis_backlog", "Jobs d'analyse par statut", ["status"])
+
+DB_POOL_CONNECTIONS = Gauge("mailparser_db_pool_connections", "Connexions du pool DB", ["state"])
+DB_POOL_CONNECTIONS.labels("in_use").set_function(lambda: db.usage()[0])
+DB_POOL_CONNECTIONS.labels("max").set_function(lambda: db.max_size)
+Gauge("mailparser_parse_processes", "Processus de parsing actifs").set_function(
+    lambda: parse_pool.metrics()["processes"]
+)
+Gauge("mailparser_maintenance_last_run_seconds", "Durée du dernier passage de maintenance").set_function(
+    lambda: storage_maintenance.last_run.get("seconds", 0)
+)
+
+class ComponentCounters:
+    """Compteurs tenus par les composants (attributs), lus au scrape"""
+
+    @staticmethod
+    def _counter(name: str, documentation: str, values: Dict[str, float], label: Optional[str] = None):
+        family = CounterMetricFamily(name, documentation, labels=[label] if label else None)
+        for key, value in values.items():
+            family.add_metric([key] if label else [], value)
+        return family
+
+    def collect(self):
+        yield self._counter(
+            "mailparser_db_acquire_timeouts", "Attentes de connexion expirées (503)", {"": db.usage()[1]}
+        )
+        yield self._counter(
+            "mailparser_parse_pool_restarts", "Pools de parsing recréés après la mort d'un processus",
+            {"": parse_pool.restarts}
+        )
+        yield self._counter("mailparser_analyses", "Analyses IA terminées par issue", {
+            "completed": analysis_workers.completed_total,
+            "retried": analysis_workers.retried_total,
+            "dead": analysis_workers.dead_total,
+            "local": analysis_workers.local_total,
+        }, "outcome")
+        yield self._counter("mailparser_llm_calls", "Appels au LLM", {"": analysis_workers.llm_calls_total})
+        yield self._counter("mailparser_analysis_cache_lookups", "Recherches dans le cache d'analyses", {
+            "memory_hit": analysis_workers.cache.memory_hits,
+            "db_hit": analysis_workers.cache.db_hits,
+            "miss": analysis_workers.cache.misses,
+        }, "result")
+        if attachment_store is not None:
+            yield self._counter("mailparser_attachment_blobs", "Pièces jointes stockées", {
+                "written": attachment_store.blobs_written,
+                "deduplicated": attachment_store.blobs_deduplicated,
+            }, "result")
+
+REGISTRY.register(ComponentCounters())
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Nom du handler plutôt que le chemin : pas une série par id d'email
+        endpoint = request.scope.get("endpoint")
+        HTTP_SECONDS.labels(
+            request.method, getattr(endpoint, "__name__", "inconnu"), status
+        ).observe(time.perf_counter() - start)
+
+def handle_errors(context: str):
+    """Erreurs d'un endpoint en réponses HTTP : base indisponible -> 503, autre -> 500.
+
+    `context` préfixe le message de log et peut citer les paramètres du
+    endpoint ("Erreur lecture email {email_id}"). Les HTTPException levées
+    par le endpoint (400, 404...) passent telles quelles.
+    """
+    def decorator(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            except HTTPException:
+                raise
+            except DatabaseUnavailable as e:
+                logger.error(f"Pool DB saturé: {e}")
+                raise HTTPException(status_code=503, detail=str(e))
+            except Exception as e:
+                logger.error(f"{context.format(**kwargs)}: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
+        return wrapper
+    return decorator
+
+def _count_result(provider: str, status: str, stage: str = "parse"):
+    if status == "success":
+        EMAILS_INGESTED.labels(provider).inc()
+    elif status == "duplicate":
+        EMAILS_DEDUPLICATED.labels(provider).inc()
+    else:
+        EMAILS_FAILED.labels(stage).inc()
+
 # Modèles Pydantic
 class ParseEmailRequest(BaseModel):
-    raw_email: str
+    raw_email: str = ""
+    # Octets RFC822 d'origine en base64 (prioritaires sur raw_email)
+    raw_email_b64: Optional[str] = None
+    encoding: Optional[str] = None  # None | 'gzip' (appliqué avant le base64)
     provider: str = "manual"  # 'gmail' | 'outlook' | 'imap' | 'manual'
+    account: str = ""  # compte source (plusieurs comptes par fournisseur)
+    # Identifiant chez le fournisseur (IMAP : "<UIDVALIDITY>:<UID>") ; à défaut
+    # le Message-ID puis l'empreinte du message servent de clé d'idempotence
     external_id: Optional[str] = None
     mailbox: str = "INBOX"
 
@@ -35,53 +185,153 @@ class ParseEmailResponse(BaseModel):
     sentiment: Optional[str] = None
     summary: Optional[str] = None
     processed: bool
-    status: str
+    status: str  # 'success' | 'duplicate' (email déjà stocké, rien n'est refait)
+    analysis_status: Optional[str] = None  # 'queued' si une analyse IA est en file
 
-# Connexion PostgreSQL
-def get_db_connection():
-    """Connexion à PostgreSQL"""
-    try:
-        database_url = os.getenv("MAIL_PARSER_DATABASE_URL")
-        if not database_url:
-            raise ValueError("MAIL_PARSER_DATABASE_URL non définie")
+class ParseBatchRequest(BaseModel):
+    items: List[ParseEmailRequest]
 
-        conn = psycopg2.connect(database_url)
-        return conn
-    except Exception as e:
-        logger.error(f"Erreur connexion DB: {e}")
-        raise HTTPException(status_code=500, detail="Erreur base de données")
+class ParseBatchItemResult(BaseModel):
+    index: int
+    external_id: Optional[str] = None
+    status: str  # 'success' | 'duplicate' | 'error'
+    result: Optional[ParseEmailResponse] = None
+    error: Optional[str] = None
+
+class ParseBatchResponse(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    duplicates: int = 0
+    results: List[ParseBatchItemResult]
+
+class EmailAnalysisResponse(BaseModel):
+    id: int
+    email_id: int
+    summary: Optional[str] = None
+    category: Optional[str] = None
+    sentiment: Optional[str] = None
+    score: Optional[float] = None
+    created_at: Optional[datetime] = None
+
+class EmailAttachmentResponse(BaseModel):
+    id: int
+    email_id: int
+    filename: Optional[str] = None
+    mime_type: Optional[str] = None
+    size_bytes: Optional[int] = None
+    storage_uri: Optional[str] = None
+    content_sha256: Optional[str] = None
+
+class EmailResponse(BaseModel):
+    id: int
+    provider: str
+    account: str = ""
+    external_id: Optional[str] = None
+    message_id: Optional[str] = None
+    from_addr: Optional[str] = None
+    to_addr: Optional[str] = None
+    cc_addr: Optional[str] = None
+    subject: Optional[str] = None
+    sent_at: Optional[datetime] = None
+    received_at: Optional[datetime] = None
+    mailbox: Optional[str] = None
+    processed: Optional[bool] = None
+    processed_at: Optional[datetime] = None
+    error: Optional[str] = None
+    analysis: Optional[EmailAnalysisResponse] = None
+
+class EmailDetailResponse(EmailResponse):
+    raw_headers: Optional[str] = None
+    raw_body: Optional[str] = None
+    archived: bool = False
+    attachments: List[EmailAttachmentResponse] = []
+
+class EmailListResponse(BaseModel):
+    data: List[EmailResponse]
+    limit: int
+    hasMore: bool
+    next_cursor: Optional[str] = None  # à repasser en ?cursor= pour la page suivante
+
+class SearchResult(EmailResponse):
+    rank: float
+    subject_highlight: Optional[str] = None  # termes trouvés entre <mark></mark>
+    snippet: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    sort: str
+    data: List[SearchResult]
+    limit: int
+    hasMore: bool
+    next_cursor: Optional[str] = None
 
 def init_database():
     """Créer les tables selon votre schéma"""
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cur:
-            # Table emails avec votre schéma exact
+        with db.connection() as conn, conn.cursor() as cur:
+            # Plusieurs processus peuvent démarrer ensemble (uvicorn --workers) :
+            # l'initialisation est sérialisée, chaque étape est idempotente
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext('mail-parser-init'));")
+
+            # Table emails partitionnée par mois sur received_at (voir partitions.py)
+            cur.execute("CREATE SEQUENCE IF NOT EXISTS emails_id_seq;")
+            cur.execute(partitions.EMAILS_TABLE_DDL)
+
+            # Migrations d'une table emails antérieure (sans effet sur la table partitionnée).
+            # Clé d'idempotence (provider, account, mailbox, external_id) : un UID IMAP
+            # n'est unique que dans une boîte d'un compte, pas globalement
+            cur.execute("ALTER TABLE emails ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT '';")
+            cur.execute("ALTER TABLE emails ADD COLUMN IF NOT EXISTS message_id TEXT;")
+            cur.execute("ALTER TABLE emails ADD COLUMN IF NOT EXISTS archive_uri TEXT;")
+            cur.execute("ALTER TABLE emails DROP CONSTRAINT IF EXISTS emails_external_id_key;")
+
+            # received_at sert de clé de pagination : pas de NULL (migration unique)
             cur.execute("""
-                CREATE TABLE IF NOT EXISTS emails (
-                  id            BIGSERIAL PRIMARY KEY,
+                SELECT is_nullable = 'YES' FROM information_schema.columns
+                WHERE table_name = 'emails' AND column_name = 'received_at';
+            """)
+            if cur.fetchone()[0]:
+                cur.execute("UPDATE emails SET received_at = COALESCE(sent_at, NOW()) WHERE received_at IS NULL;")
+                cur.execute("ALTER TABLE emails ALTER COLUMN received_at SET NOT NULL;")
+
+            # Recherche plein texte : sujet (poids A) au-dessus du corps (poids B),
+            # en français et en anglais. Colonne générée : tenue à jour à l'insertion
+            # sans code côté ingestion (l'ajout réécrit la table une seule fois).
+            cur.execute("""
+                ALTER TABLE emails ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                  setweight(to_tsvector('french', COALESCE(subject, '')), 'A') ||
+                  setweight(to_tsvector('english', COALESCE(subject, '')), 'A') ||
+                  setweight(to_tsvector('french', LEFT(COALESCE(raw_body, ''), 100000)), 'B') ||
+                  setweight(to_tsvector('english', LEFT(COALESCE(raw_body, ''), 100000)), 'B')
+                ) STORED;
+            """)
+
+            # Unicité de la clé d'idempotence : un index unique sur une table
+            # partitionnée doit inclure received_at, d'où une table de clés à part
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS email_keys (
                   provider      TEXT NOT NULL,
-                  external_id   TEXT UNIQUE,
-                  from_addr     TEXT,
-                  to_addr       TEXT,
-                  cc_addr       TEXT,
-                  subject       TEXT,
-                  sent_at       TIMESTAMPTZ,
-                  received_at   TIMESTAMPTZ DEFAULT NOW(),
-                  raw_headers   TEXT,
-                  raw_body      TEXT,
-                  mailbox       TEXT DEFAULT 'INBOX',
-                  processed     BOOLEAN DEFAULT FALSE,
-                  processed_at  TIMESTAMPTZ,
-                  error         TEXT
+                  account       TEXT NOT NULL,
+                  mailbox       TEXT NOT NULL,
+                  external_id   TEXT NOT NULL,
+                  email_id      BIGINT NOT NULL,
+                  received_at   TIMESTAMPTZ NOT NULL,
+                  PRIMARY KEY (provider, account, mailbox, external_id)
                 );
             """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_email_keys_email_id ON email_keys(email_id);")
+
+            partitions.migrate_legacy_emails(cur)
+            cur.execute("ALTER SEQUENCE emails_id_seq OWNED BY emails.id;")
+            partitions.ensure_partitions(cur, storage_maintenance.months_ahead)
 
             # Table analyses
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS analyses (
                   id            BIGSERIAL PRIMARY KEY,
-                  email_id      BIGINT NOT NULL REFERENCES emails(id) ON DELETE CASCADE,
+                  email_id      BIGINT NOT NULL,
                   summary       TEXT,
                   category      TEXT,
                   sentiment     TEXT,
@@ -94,160 +344,860 @@ def init_database():
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS attachments (
                   id            BIGSERIAL PRIMARY KEY,
-                  email_id      BIGINT NOT NULL REFERENCES emails(id) ON DELETE CASCADE,
+                  email_id      BIGINT NOT NULL,
                   filename      TEXT,
                   mime_type     TEXT,
-                  size_bytes    BIGINT,
-                  storage_uri   TEXT
+                  size_bytes    BIGINT,         -- taille décodée
+                  storage_uri   TEXT,
+                  content_sha256 TEXT           -- clé du stockage adressé par contenu
                 );
             """)
+            cur.execute("ALTER TABLE attachments ADD COLUMN IF NOT EXISTS content_sha256 TEXT;")
+
+            # File des analyses IA (traitée par AnalysisWorkerPool)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_jobs (
+                  id            BIGSERIAL PRIMARY KEY,
+                  email_id      BIGINT NOT NULL UNIQUE,
+                  status        TEXT NOT NULL DEFAULT 'pending',  -- pending | running | done | dead
+                  attempts      INTEGER NOT NULL DEFAULT 0,
+                  run_after     TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                  locked_at     TIMESTAMPTZ,
+                  last_error    TEXT,
+                  created_at    TIMESTAMPTZ DEFAULT NOW(),
+                  updated_at    TIMESTAMPTZ DEFAULT NOW()
+                );
+            """)
+
+            # Cache des analyses IA par empreinte de contenu
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                  fingerprint   TEXT PRIMARY KEY,
+                  result        JSONB NOT NULL,
+                  latency_ms    INTEGER,
+                  hits          INTEGER NOT NULL DEFAULT 0,
+                  created_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                  last_hit_at   TIMESTAMPTZ
+                );
+            """)
+
+            # Compteurs de /stats tenus par triggers (pas de COUNT(*) sur les tables).
+            # Les triggers (par instruction) ajoutent des deltas sans contention ;
+            # repository.compact_stats les reporte dans stats_totals / stats_hourly.
+            cur.execute("SELECT to_regclass('stats_totals') IS NULL AS missing;")
+            stats_missing = cur.fetchone()[0]
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stats_deltas (
+                  id            BIGSERIAL PRIMARY KEY,
+                  hour          TIMESTAMPTZ NOT NULL,
+                  dimension     TEXT NOT NULL,  -- provider | processed | category | sentiment
+                  key           TEXT NOT NULL,
+                  delta         BIGINT NOT NULL
+                );
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stats_hourly (
+                  hour          TIMESTAMPTZ NOT NULL,
+                  dimension     TEXT NOT NULL,
+                  key           TEXT NOT NULL,
+                  value         BIGINT NOT NULL,
+                  PRIMARY KEY (hour, dimension, key)
+                );
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS stats_totals (
+                  dimension     TEXT NOT NULL,
+                  key           TEXT NOT NULL,
+                  value         BIGINT NOT NULL,
+                  PRIMARY KEY (dimension, key)
+                );
+            """)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION stats_track_emails() RETURNS trigger
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                  IF TG_OP = 'INSERT' THEN
+                    INSERT INTO stats_deltas (hour, dimension, key, delta)
+                    SELECT date_trunc('hour', COALESCE(received_at, NOW())), 'provider', provider, COUNT(*)
+                    FROM new_rows GROUP BY 1, 3
+                    UNION ALL
+                    SELECT date_trunc('hour', COALESCE(received_at, NOW())), 'processed', '', COUNT(*)
+                    FROM new_rows WHERE processed GROUP BY 1;
+                  ELSIF TG_OP = 'UPDATE' THEN
+                    INSERT INTO stats_deltas (hour, dimension, key, delta)
+                    SELECT date_trunc('hour', COALESCE(n.received_at, NOW())), 'processed', '',
+                           SUM(CASE WHEN COALESCE(n.processed, FALSE) THEN 1 ELSE -1 END)
+                    FROM new_rows n JOIN old_rows o USING (id)
+                    WHERE COALESCE(n.processed, FALSE) <> COALESCE(o.processed, FALSE)
+                    GROUP BY 1;
+                  ELSE
+                    INSERT INTO stats_deltas (hour, dimension, key, delta)
+                    SELECT date_trunc('hour', COALESCE(received_at, NOW())), 'provider', provider, -COUNT(*)
+                    FROM old_rows GROUP BY 1, 3
+                    UNION ALL
+                    SELECT date_trunc('hour', COALESCE(received_at, NOW())), 'processed', '', -COUNT(*)
+                    FROM old_rows WHERE processed GROUP BY 1;
+                  END IF;
+                  RETURN NULL;
+                END $$;
+            """)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION stats_track_analyses() RETURNS trigger
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                  IF TG_OP = 'INSERT' THEN
+                    INSERT INTO stats_deltas (hour, dimension, key, delta)
+                    SELECT date_trunc('hour', COALESCE(created_at, NOW())), d.dimension, d.key, COUNT(*)
+                    FROM new_rows,
+                         LATERAL (VALUES ('category', COALESCE(category, 'inconnu')),
+                                         ('sentiment', COALESCE(sentiment, 'inconnu'))) d(dimension, key)
+                    GROUP BY 1, 2, 3;
+                  ELSE
+                    INSERT INTO stats_deltas (hour, dimension, key, delta)
+                    SELECT date_trunc('hour', COALESCE(created_at, NOW())), d.dimension, d.key, -COUNT(*)
+                    FROM old_rows,
+                         LATERAL (VALUES ('category', COALESCE(category, 'inconnu')),
+                                         ('sentiment', COALESCE(sentiment, 'inconnu'))) d(dimension, key)
+                    GROUP BY 1, 2, 3;
+                  END IF;
+                  RETURN NULL;
+                END $$;
+            """)
+            # Suppression en cascade des lignes liées à un email (pas de clé
+            # étrangère possible vers la table partitionnée)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION emails_delete_dependents() RETURNS trigger
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                  DELETE FROM analyses WHERE email_id IN (SELECT id FROM old_rows);
+                  DELETE FROM attachments WHERE email_id IN (SELECT id FROM old_rows);
+                  DELETE FROM analysis_jobs WHERE email_id IN (SELECT id FROM old_rows);
+                  DELETE FROM email_keys WHERE email_id IN (SELECT id FROM old_rows);
+                  RETURN NULL;
+                END $$;
+            """)
+            # Triggers par instruction (recréés sur la table partitionnée après conversion)
+            for name, table, op, transition, function in (
+                ('trg_emails_stats_insert', 'emails', 'INSERT', 'NEW TABLE AS new_rows', 'stats_track_emails'),
+                ('trg_emails_stats_update', 'emails', 'UPDATE',
+                 'OLD TABLE AS old_rows NEW TABLE AS new_rows', 'stats_track_emails'),
+                ('trg_emails_stats_delete', 'emails', 'DELETE', 'OLD TABLE AS old_rows', 'stats_track_emails'),
+                ('trg_emails_delete_dependents', 'emails', 'DELETE', 'OLD TABLE AS old_rows',
+                 'emails_delete_dependents'),
+                ('trg_analyses_stats_insert', 'analyses', 'INSERT', 'NEW TABLE AS new_rows', 'stats_track_analyses'),
+                ('trg_analyses_stats_delete', 'analyses', 'DELETE', 'OLD TABLE AS old_rows', 'stats_track_analyses'),
+            ):
+                cur.execute(
+                    "SELECT 1 FROM pg_trigger WHERE tgname = %s AND tgrelid = %s::regclass;", (name, table)
+                )
+                if cur.fetchone() is None:
+                    cur.execute(f"""
+                        CREATE TRIGGER {name}
+                        AFTER {op} ON {table}
+                        REFERENCING {transition}
+                        FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+                    """)
+
+            if stats_missing:
+                # Première installation : reprise de l'existant (un seul scan complet,
+                # dans la même transaction que la création des triggers)
+                cur.execute("""
+                    INSERT INTO stats_deltas (hour, dimension, key, delta)
+                    SELECT date_trunc('hour', COALESCE(received_at, NOW())), 'provider', provider, COUNT(*)
+                    FROM emails GROUP BY 1, 3
+                    UNION ALL
+                    SELECT date_trunc('hour', COALESCE(received_at, NOW())), 'processed', '', COUNT(*)
+                    FROM emails WHERE processed GROUP BY 1
+                    UNION ALL
+                    SELECT date_trunc('hour', COALESCE(created_at, NOW())), d.dimension, d.key, COUNT(*)
+                    FROM analyses,
+                         LATERAL (VALUES ('category', COALESCE(category, 'inconnu')),
+                                         ('sentiment', COALESCE(sentiment, 'inconnu'))) d(dimension, key)
+                    GROUP BY 1, 2, 3;
+                """)
+                repository.compact_stats(cur)
+                logger.info("Compteurs de statistiques initialisés")
 
             # Index utiles
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_emails_provider_extid ON emails(provider, external_id);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_emails_processed ON emails(processed);")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_analyses_email_id ON analyses(email_id);")
+            cur.execute("DROP INDEX IF EXISTS idx_emails_provider_extid;")  # remplacé par email_keys
+            # GET /emails : tri (received_at, id) décroissant, seul ou après un filtre d'égalité
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_emails_received ON emails(received_at DESC, id DESC);")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_emails_provider_received
+                ON emails(provider, received_at DESC, id DESC);
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_emails_mailbox_received
+                ON emails(mailbox, received_at DESC, id DESC);
+            """)
+            # Partiel : les non traités sont rares, un index booléen complet ne sert pas
+            cur.execute("DROP INDEX IF EXISTS idx_emails_processed;")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_emails_unprocessed
+                ON emails(received_at DESC, id DESC) WHERE NOT processed;
+            """)
+            # Dernière analyse par email (remplace idx_analyses_email_id, même préfixe)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_analyses_email_latest
+                ON analyses(email_id, created_at DESC, id DESC);
+            """)
+            cur.execute("DROP INDEX IF EXISTS idx_analyses_email_id;")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_analyses_category ON analyses(category, email_id);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_analyses_sentiment ON analyses(sentiment, email_id);")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_attachments_email_id ON attachments(email_id);")
+            # Références restantes d'un contenu (ramasse-miettes du stockage)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_attachments_sha256
+                ON attachments(content_sha256) WHERE content_sha256 IS NOT NULL;
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_emails_search ON emails USING GIN (search_vector);")
+            # Corps encore en ligne : vide sur les vieilles partitions une fois archivées
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_emails_unarchived
+                ON emails(received_at) WHERE archive_uri IS NULL;
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_analysis_jobs_ready
+                ON analysis_jobs(run_after, id) WHERE status IN ('pending', 'running');
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_analysis_cache_created ON analysis_cache(created_at);")
 
             conn.commit()
             logger.info("Base de données initialisée avec votre schéma")
     except Exception as e:
+        # Schéma absent ou migration annulée : arrêter le démarrage plutôt que
+        # servir des 500 sur chaque requête
         logger.error(f"Erreur init DB: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        raise
 
 @app.on_event("startup")
 async def startup_event():
     """Initialisation au démarrage"""
     logger.info("Démarrage Mail Parser service...")
-    init_database()
+    db.open()
+    await db.run(init_database)
+    await asyncio.to_thread(parse_pool.start)
+    analysis_workers.start()
+    storage_maintenance.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Libération des ressources"""
+    await asyncio.to_thread(analysis_workers.stop)
+    await asyncio.to_thread(storage_maintenance.stop)
+    await asyncio.to_thread(parse_pool.stop)
+    db.close()
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"ok": True}
+    # Hors du pool de threads DB pour rester disponible quand il est saturé
+    database = await asyncio.to_thread(db.health)
+    health = {"ok": True, "database": database, "parsing": parse_pool.metrics()}
+    if attachment_store is not None:
+        health["attachments"] = attachment_store.metrics()
+    return health
+
+def _build_response(email_id: int, parsed_data: dict) -> ParseEmailResponse:
+    return ParseEmailResponse(
+        id=email_id,
+        from_addr=parsed_data['from'],
+        to_addr=parsed_data['to'],
+        subject=parsed_data['subject'],
+        processed=True,
+        status="success",
+        analysis_status="queued" if analysis_workers.enabled else None
+    )
+
+def _existing_response(row: dict) -> ParseEmailResponse:
+    """Réponse pour un email déjà stocké (avec sa dernière analyse)"""
+    return ParseEmailResponse(
+        id=row['id'],
+        from_addr=row['from_addr'] or '',
+        to_addr=row['to_addr'] or '',
+        subject=row['subject'] or '',
+        category=row['category'],
+        sentiment=row['sentiment'],
+        summary=row['summary'],
+        processed=True,
+        status="duplicate"
+    )
+
+def _external_id(item: ParseEmailRequest, raw_message: Union[str, bytes], parsed_data: dict) -> str:
+    """Clé de l'email : identifiant fournisseur, sinon Message-ID, sinon empreinte"""
+    if item.external_id:
+        return item.external_id
+    if parsed_data.get('message_id'):
+        return f"mid:{parsed_data['message_id']}"
+    if isinstance(raw_message, str):
+        raw_message = raw_message.encode('utf-8', 'surrogateescape')
+    return f"sha256:{hashlib.sha256(raw_message).hexdigest()}"
+
+def _email_key(item: ParseEmailRequest, external_id: str) -> tuple:
+    return (item.provider, item.account, item.mailbox, external_id)
+
+def _find_existing(keys: List[tuple]) -> Dict[tuple, dict]:
+    """Emails déjà stockés pour ces clés (lecture seule)"""
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            existing = repository.find_emails(cur, keys)
+        conn.rollback()
+    return existing
+
+def _decode_upload(data: bytes, encoding: Optional[str]) -> bytes:
+    """Décompresser un message envoyé en gzip"""
+    if not encoding or encoding == "identity":
+        return data
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Encodage non supporté: {encoding}")
+
+def _raw_message(item: ParseEmailRequest) -> Union[str, bytes]:
+    """Message à parser : octets d'origine si fournis, sinon texte"""
+    if item.raw_email_b64:
+        return _decode_upload(base64.b64decode(item.raw_email_b64), item.encoding)
+    if not item.raw_email:
+        raise ValueError("raw_email ou raw_email_b64 requis")
+    return item.raw_email
+
+def _parse_email(request: ParseEmailRequest, raw_message: Union[str, bytes]) -> tuple:
+    """(parsed_data, clé externe) : parsing dans le pool de processus, hors thread DB"""
+    parsed_data = parse_pool.parse(raw_message)
+    return parsed_data, _external_id(request, raw_message, parsed_data)
+
+async def _ingest_email(request: ParseEmailRequest, raw_message: Union[str, bytes]) -> ParseEmailResponse:
+    """Parser, analyser et stocker un email.
+
+    Le parsing se fait sans connexion DB : une connexion n'est prise que pour
+    la lecture de la clé puis pour l'insertion, et DB_POOL_MAX_SIZE ne borne
+    pas le nombre de parsings simultanés. Un email déjà stocké (même clé)
+    n'est ni reparsé ni réanalysé : la ligne existante est renvoyée avec le
+    statut 'duplicate'.
+    """
+    # Redélivrance connue par son identifiant fournisseur : une lecture d'index suffit
+    if request.external_id:
+        key = _email_key(request, request.external_id)
+        existing = (await db.run(_find_existing, [key])).get(key)
+        if existing:
+            logger.debug(f"Email déjà stocké: {key}")
+            _count_result(request.provider, "duplicate")
+            return _existing_response(existing)
+
+    # Parse l'email (une seule fois, dans un processus du pool de parsing)
+    try:
+        parsed_data, external_id = await asyncio.to_thread(_parse_email, request, raw_message)
+    except Exception:
+        _count_result(request.provider, "error", "parse")
+        raise
+
+    try:
+        email_id = await db.run(_store_email, request, external_id, parsed_data)
+    except Exception:
+        _count_result(request.provider, "error", "store")
+        raise
+    if isinstance(email_id, dict):
+        _count_result(request.provider, "duplicate")
+        return _existing_response(email_id)
+
+    _count_result(request.provider, "success")
+    analysis_workers.notify()
+    return _build_response(email_id, parsed_data)
+
+def _store_email(request: ParseEmailRequest, external_id: str, parsed_data: dict) -> Union[int, dict]:
+    """Stocker un email parsé ; retourne son id, ou la ligne existante pour cette clé"""
+    key = _email_key(request, external_id)
+
+    def insert(cur) -> Optional[int]:
+        return repository.insert_email(
+            cur, request.provider, request.account, external_id, request.mailbox, parsed_data
+        )
+
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Insérer l'email dans la table emails (ON CONFLICT DO NOTHING)
+            email_id = insert(cur)
+            if email_id is None:
+                # Stocké entre-temps (livraison concurrente) ou même Message-ID
+                existing = repository.find_email(cur, *key)
+                if existing is None and repository.delete_stale_keys(cur, [key]):
+                    # Clé restée réservée pour un email supprimé : nouvel essai
+                    email_id = insert(cur)
+                if email_id is None:
+                    existing = existing or repository.find_email(cur, *key)
+                    conn.rollback()
+                    if existing is None:
+                        raise RuntimeError(f"Clé {key} réservée sans email correspondant")
+                    return existing
+
+            # Traiter les pièces jointes
+            repository.insert_attachments(cur, email_id, parsed_data.get('attachments', []))
+
+            # Analyse IA en file : traitée hors requête par les workers
+            if analysis_workers.enabled:
+                repository.enqueue_analyses(cur, [email_id])
+
+        conn.commit()
+    return email_id
 
 @app.post("/parse", response_model=ParseEmailResponse)
+@handle_errors("Erreur parsing")
 async def parse_email(request: ParseEmailRequest):
     """Analyser un email brut"""
     logger.info(f"Début parsing email provider={request.provider}")
 
     try:
-        # Parse l'email avec EmailAnalyzer
-        analyzer = EmailAnalyzer()
-        parsed_data = analyzer.parse_raw_email(request.raw_email)
+        raw_message = _raw_message(request)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Connexion DB
-        conn = get_db_connection()
+    return await _ingest_email(request, raw_message)
 
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            # Insérer l'email dans la table emails
-            cur.execute("""
-                INSERT INTO emails (
-                    provider, external_id, from_addr, to_addr, cc_addr,
-                    subject, sent_at, raw_headers, raw_body, mailbox
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id;
-            """, (
-                request.provider,
-                request.external_id,
-                parsed_data['from'],
-                parsed_data['to'],
-                parsed_data.get('cc', ''),
-                parsed_data['subject'],
-                parsed_data['sent_at'],
-                parsed_data['raw_headers'],
-                parsed_data['body'],
-                request.mailbox
+@app.post("/parse/raw", response_model=ParseEmailResponse)
+@handle_errors("Erreur parsing")
+async def parse_raw_email(
+    http_request: Request,
+    provider: str = "manual",
+    account: str = "",
+    external_id: Optional[str] = None,
+    mailbox: str = "INBOX"
+):
+    """Analyser un message RFC822 envoyé tel quel (message/rfc822 ou octet-stream).
+
+    Le corps peut être compressé (Content-Encoding: gzip).
+    """
+    logger.info(f"Début parsing email brut provider={provider}")
+
+    try:
+        raw_message = _decode_upload(
+            await http_request.body(),
+            http_request.headers.get("content-encoding")
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not raw_message:
+        raise HTTPException(status_code=400, detail="Message vide")
+
+    request = ParseEmailRequest(
+        provider=provider, account=account, external_id=external_id, mailbox=mailbox
+    )
+    return await _ingest_email(request, raw_message)
+
+def _store_batch(cur, prepared: list, retry_stale: bool = True) -> Dict[int, Union[int, dict]]:
+    """Écrire emails, pièces jointes et analyses avec des INSERT multi-lignes.
+
+    Retourne, par index, l'id de l'email inséré ou la ligne existante quand
+    la clé était déjà stockée (ou répétée dans le lot).
+    """
+    inserted = repository.insert_emails_batch(cur, [
+        {
+            'provider': item.provider,
+            'account': item.account,
+            'external_id': external_id,
+            'mailbox': item.mailbox,
+            'parsed_data': parsed_data,
+        }
+        for _, item, parsed_data, external_id in prepared
+    ])
+
+    outcomes: Dict[int, Union[int, dict]] = {}
+    email_ids = []
+    attachment_rows = []
+    duplicates = []
+    for index, item, parsed_data, external_id in prepared:
+        key = _email_key(item, external_id)
+        # pop : seule la première occurrence d'une clé répétée est l'insertion
+        email_id = inserted.pop(key, None)
+        if email_id is None:
+            duplicates.append((index, key))
+            continue
+        outcomes[index] = email_id
+        email_ids.append(email_id)
+        for attachment in parsed_data.get('attachments', []):
+            attachment_rows.append((
+                email_id,
+                attachment['filename'],
+                attachment['content_type'],
+                attachment['size'],
+                attachment.get('storage_uri'),
+                attachment.get('sha256')
             ))
 
-            email_id = cur.fetchone()['id']
+    if duplicates:
+        existing = repository.find_emails(cur, list(dict.fromkeys(key for _, key in duplicates)))
+        stale = {key for _, key in duplicates if key not in existing}
+        if stale and retry_stale and repository.delete_stale_keys(cur, sorted(stale)):
+            # Clés restées réservées pour des emails supprimés : nouvel essai pour ces éléments
+            retried = [entry for entry in prepared
+                       if entry[0] in {index for index, key in duplicates if key in stale}]
+            outcomes.update(_store_batch(cur, retried, retry_stale=False))
+            duplicates = [(index, key) for index, key in duplicates if key not in stale]
+        for index, key in duplicates:
+            if key not in existing:
+                raise RuntimeError(f"Clé {key} réservée sans email correspondant")
+            outcomes[index] = existing[key]
 
-            # Traiter les pièces jointes
-            for attachment in parsed_data.get('attachments', []):
-                cur.execute("""
-                    INSERT INTO attachments (email_id, filename, mime_type, size_bytes)
-                    VALUES (%s, %s, %s, %s);
-                """, (
-                    email_id,
-                    attachment['filename'],
-                    attachment['content_type'],
-                    attachment['size']
-                ))
-
-            # Analyse IA si clé OpenAI présente
-            analysis_result = None
-            if os.getenv("OPENAI_API_KEY"):
-                try:
-                    ai_agent = AIAgent()
-                    analysis = ai_agent.analyze_email(parsed_data)
-
-                    # Sauvegarder l'analyse
-                    cur.execute("""
-                        INSERT INTO analyses (email_id, summary, category, sentiment, score)
-                        VALUES (%s, %s, %s, %s, %s);
-                    """, (
-                        email_id,
-                        analysis.get('summary'),
-                        analysis.get('category'),
-                        analysis.get('sentiment'),
-                        analysis.get('score', 0.5)
-                    ))
-
-                    analysis_result = analysis
-                    logger.info(f"Email {email_id} analysé avec IA: {analysis.get('category')}")
-                except Exception as e:
-                    logger.warning(f"Erreur analyse IA: {e}")
-                    analysis_result = {"error": "Analyse IA indisponible"}
+    repository.insert_attachments_batch(cur, attachment_rows)
+    if analysis_workers.enabled:
+        repository.enqueue_analyses(cur, email_ids)
+    return outcomes
+
+def _parse_batch(items: List[ParseEmailRequest]) -> list:
+    """(parsed_data, clé externe, erreur) par élément : décodage et parsing hors thread DB"""
+    results: list = [None] * len(items)
+    decoded = []
+    for position, item in enumerate(items):
+        try:
+            decoded.append((position, item, _raw_message(item)))
+        except Exception as e:
+            results[position] = (None, None, str(e))
+
+    # Parsing réparti sur les processus du pool
+    parsed = parse_pool.parse_many([raw_message for _, _, raw_message in decoded])
+    for (position, item, raw_message), (parsed_data, error) in zip(decoded, parsed):
+        external_id = _external_id(item, raw_message, parsed_data) if error is None else None
+        results[position] = (parsed_data, external_id, error)
+    return results
+
+def _store_prepared(prepared: list) -> Dict[int, Union[int, dict, Exception]]:
+    """Stocker un lot parsé en une transaction ; rejoué élément par élément s'il est rejeté"""
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            try:
+                stored = _store_batch(cur, prepared)
+                conn.commit()
+            except psycopg2.Error as e:
+                conn.rollback()
+                logger.warning(f"Lot rejeté ({e.pgcode}) - insertion élément par élément")
+                stored = {}
+                for entry in prepared:
+                    cur.execute("SAVEPOINT batch_item;")
+                    try:
+                        stored.update(_store_batch(cur, [entry]))
+                        cur.execute("RELEASE SAVEPOINT batch_item;")
+                    except psycopg2.Error as item_error:
+                        cur.execute("ROLLBACK TO SAVEPOINT batch_item;")
+                        stored[entry[0]] = item_error
+                conn.commit()
+    return stored
+
+async def _ingest_batch(items: List[ParseEmailRequest]) -> ParseBatchResponse:
+    """Parser un lot d'emails et les stocker en une seule transaction.
+
+    Les emails déjà stockés (clé connue) sont renvoyés avec le statut
+    'duplicate' sans être reparsés. Le parsing se fait sans connexion DB.
+    Si le lot est rejeté par la base, il est rejoué élément par élément avec
+    des SAVEPOINT pour isoler les erreurs.
+    """
+    results: List[Optional[ParseBatchItemResult]] = [None] * len(items)
+    prepared = []
+
+    # Redélivrances connues par identifiant fournisseur : une requête pour tout le lot
+    known_keys = [_email_key(item, item.external_id) for item in items if item.external_id]
+    existing = await db.run(_find_existing, list(dict.fromkeys(known_keys))) if known_keys else {}
+
+    to_parse = []
+    for index, item in enumerate(items):
+        row = existing.get(_email_key(item, item.external_id)) if item.external_id else None
+        if row:
+            results[index] = ParseBatchItemResult(
+                index=index, external_id=item.external_id, status="duplicate",
+                result=_existing_response(row)
+            )
+            continue
+        to_parse.append((index, item))
+
+    parsed = await asyncio.to_thread(_parse_batch, [item for _, item in to_parse])
+    for (index, item), (parsed_data, external_id, error) in zip(to_parse, parsed):
+        if error is not None:
+            results[index] = ParseBatchItemResult(
+                index=index, external_id=item.external_id, status="error", error=error
+            )
+            continue
+        prepared.append((index, item, parsed_data, external_id))
+
+    store_failed = set()
+    if prepared:
+        stored = await db.run(_store_prepared, prepared)
+        analysis_workers.notify()
+        for index, item, parsed_data, _ in prepared:
+            outcome = stored[index]
+            if isinstance(outcome, Exception):
+                store_failed.add(index)
+                results[index] = ParseBatchItemResult(
+                    index=index, external_id=item.external_id,
+                    status="error", error=str(outcome).strip()
+                )
+            elif isinstance(outcome, dict):
+                results[index] = ParseBatchItemResult(
+                    index=index, external_id=item.external_id, status="duplicate",
+                    result=_existing_response(outcome)
+                )
             else:
-                logger.info("Pas de clé OpenAI - analyse IA désactivée")
+                results[index] = ParseBatchItemResult(
+                    index=index, external_id=item.external_id, status="success",
+                    result=_build_response(outcome, parsed_data)
+                )
 
-            # Marquer comme traité
-            cur.execute("""
-                UPDATE emails SET processed = TRUE, processed_at = NOW() WHERE id = %s;
-            """, (email_id,))
+    for item, result in zip(items, results):
+        _count_result(item.provider, result.status, "store" if result.index in store_failed else "parse")
 
-            conn.commit()
+    failed = sum(1 for r in results if r.status == "error")
+    return ParseBatchResponse(
+        total=len(items),
+        succeeded=len(items) - failed,
+        failed=failed,
+        duplicates=sum(1 for r in results if r.status == "duplicate"),
+        results=results
+    )
 
-        conn.close()
-
-        return ParseEmailResponse(
-            id=email_id,
-            from_addr=parsed_data['from'],
-            to_addr=parsed_data['to'],
-            subject=parsed_data['subject'],
-            category=analysis_result.get('category') if analysis_result else None,
-            sentiment=analysis_result.get('sentiment') if analysis_result else None,
-            summary=analysis_result.get('summary') if analysis_result else None,
-            processed=True,
-            status="success"
+@app.post("/parse/batch", response_model=ParseBatchResponse)
+@handle_errors("Erreur parsing lot")
+async def parse_email_batch(request: ParseBatchRequest):
+    """Analyser un lot d'emails bruts (une transaction par lot)"""
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Lot trop grand: {len(request.items)} > {MAX_BATCH_SIZE}"
         )
 
-    except Exception as e:
-        logger.error(f"Erreur parsing: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    logger.info(f"Début parsing lot de {len(request.items)} emails")
+
+    response = await _ingest_batch(request.items)
+    logger.info(
+        f"Lot terminé: {response.succeeded}/{response.total} emails stockés "
+        f"({response.duplicates} déjà présents)"
+    )
+    return response
 
 @app.get("/stats")
+@handle_errors("Erreur stats")
 async def get_stats():
-    """Statistiques du parser"""
-    conn = get_db_connection()
+    """Statistiques du parser (compteurs, répartitions, emails reçus par heure)"""
+    return await stats_cache.get()
+
+def _encode_cursor(sort_key: Union[datetime, float], email_id: int) -> str:
+    """Curseur opaque : (clé de tri, id) du dernier email de la page"""
+    key = sort_key.isoformat() if isinstance(sort_key, datetime) else repr(float(sort_key))
+    return base64.urlsafe_b64encode(f"{key}|{email_id}".encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: Optional[str], parse_key=datetime.fromisoformat) -> Optional[tuple]:
+    """(clé de tri, id) d'un curseur de _encode_cursor ; 400 s'il est invalide"""
+    if not cursor:
+        return None
     try:
+        key, email_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return parse_key(key), int(email_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+def _email_response(row: dict, model=EmailResponse):
+    """Ligne SQL (email + dernière analyse) vers le modèle de réponse"""
+    analysis = None
+    if row['analysis_id'] is not None:
+        analysis = EmailAnalysisResponse(
+            id=row['analysis_id'],
+            email_id=row['id'],
+            summary=row['summary'],
+            category=row['category'],
+            sentiment=row['sentiment'],
+            score=row['score'],
+            created_at=row['analysis_created_at']
+        )
+    fields = {name: row[name] for name in model.model_fields if name in row and name not in ('id', 'analysis')}
+    return model(id=row['id'], analysis=analysis, **fields)
+
+def _list_emails(filters: dict, after: Optional[tuple], limit: int) -> EmailListResponse:
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            # Une ligne de plus pour savoir s'il reste une page
+            rows = repository.list_emails(cur, filters, after, limit + 1)
+        conn.rollback()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return EmailListResponse(
+        data=[_email_response(row) for row in rows],
+        limit=limit,
+        hasMore=has_more,
+        next_cursor=_encode_cursor(rows[-1]['received_at'], rows[-1]['id']) if has_more else None
+    )
+
+def _read_email(email_id: int) -> Optional[EmailDetailResponse]:
+    with db.connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT COUNT(*) as total_emails FROM emails;")
-            total = cur.fetchone()['total_emails']
+            row = repository.get_email(cur, email_id)
+        conn.rollback()
+    if row is None:
+        return None
+    if row['archive_uri'] and row['raw_body'] is None:
+        # Corps déplacé en archive froide : relu à la demande
+        row.update(storage_maintenance.read_archived(row['archive_uri']))
+        row['archived'] = True
+    return _email_response(row, EmailDetailResponse)
 
-            cur.execute("SELECT COUNT(*) as analyzed FROM analyses;")
-            analyzed = cur.fetchone()['analyzed']
+@app.get("/emails", response_model=EmailListResponse)
+@handle_errors("Erreur liste emails")
+async def list_emails(
+    provider: Optional[str] = None,
+    mailbox: Optional[str] = None,
+    category: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    processed: Optional[bool] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None
+):
+    """Emails du plus récent au plus ancien, avec leur dernière analyse.
 
-            cur.execute("SELECT COUNT(*) as processed FROM emails WHERE processed = TRUE;")
-            processed = cur.fetchone()['processed']
+    Pagination par curseur : passer `next_cursor` de la réponse en `cursor`.
+    """
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit doit être entre 1 et {MAX_PAGE_SIZE}")
+    after = _decode_cursor(cursor)
 
-        conn.close()
-        return {
-            "total_emails": total,
-            "analyzed_emails": analyzed,
-            "processed_emails": processed
-        }
+    filters = {
+        'provider': provider, 'mailbox': mailbox, 'category': category, 'sentiment': sentiment,
+        'since': since, 'until': until, 'processed': processed,
+    }
+    return await db.run(_list_emails, filters, after, limit)
+
+@app.get("/emails/{email_id}", response_model=EmailDetailResponse)
+@handle_errors("Erreur lecture email {email_id}")
+async def get_email(email_id: int):
+    """Email complet avec sa dernière analyse et ses pièces jointes"""
+    email_detail = await db.run(_read_email, email_id)
+    if email_detail is None:
+        raise HTTPException(status_code=404, detail=f"Email {email_id} introuvable")
+    return email_detail
+
+def _read_attachment(email_id: int, attachment_id: int) -> Optional[dict]:
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            row = repository.get_attachment(cur, email_id, attachment_id)
+        conn.rollback()
+    return row
+
+@app.get("/emails/{email_id}/attachments/{attachment_id}")
+@handle_errors("Erreur lecture pièce jointe {attachment_id}")
+async def download_attachment(email_id: int, attachment_id: int):
+    """Contenu d'une pièce jointe, lu en flux depuis le stockage"""
+    attachment = await db.run(_read_attachment, email_id, attachment_id)
+    if attachment is None:
+        raise HTTPException(status_code=404, detail=f"Pièce jointe {attachment_id} introuvable")
+    if not attachment['storage_uri'] or attachment_store is None:
+        raise HTTPException(status_code=404, detail="Contenu de la pièce jointe non stocké")
+
+    filename = quote(attachment['filename'] or f"attachment-{attachment_id}")
+    return StreamingResponse(
+        attachment_store.stream(attachment['storage_uri']),
+        media_type=attachment['mime_type'] or "application/octet-stream",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{filename}"}
+    )
+
+def _search_emails(text: str, filters: dict, after: Optional[tuple], limit: int, sort: str) -> SearchResponse:
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            rows = repository.search_emails(cur, text, filters, after, limit + 1, sort)
+        conn.rollback()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return SearchResponse(
+        query=text,
+        sort=sort,
+        data=[_email_response(row, SearchResult) for row in rows],
+        limit=limit,
+        hasMore=has_more,
+        next_cursor=_encode_cursor(rows[-1]['sort_key'], rows[-1]['id']) if has_more else None
+    )
+
+@app.get("/search", response_model=SearchResponse)
+@handle_errors("Erreur recherche")
+async def search_emails(
+    q: str,
+    sort: str = "rank",
+    provider: Optional[str] = None,
+    mailbox: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None
+):
+    """Recherche plein texte (sujet et corps), avec classement et extraits surlignés.
+
+    `q` accepte la syntaxe websearch ("expression exacte", -exclu, or).
+    `sort` : 'rank' (pertinence) ou 'date' (plus récent d'abord).
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Paramètre q vide")
+    if sort not in repository.SEARCH_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort doit être parmi {sorted(repository.SEARCH_SORTS)}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit doit être entre 1 et {MAX_PAGE_SIZE}")
+    after = _decode_cursor(cursor, datetime.fromisoformat if sort == "date" else float)
+
+    filters = {'provider': provider, 'mailbox': mailbox, 'since': since, 'until': until}
+    return await db.run(_search_emails, q, filters, after, limit, sort)
+
+def _read_queue_stats() -> dict:
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            stats = repository.fetch_queue_stats(cur)
+        conn.rollback()
+    return stats
+
+def _requeue_dead() -> int:
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            count = repository.requeue_dead_jobs(cur)
+        conn.commit()
+    return count
+
+@app.get("/analysis/queue")
+@handle_errors("Erreur file d'analyse")
+async def get_analysis_queue():
+    """État de la file d'analyse IA"""
+    jobs = await db.run(_read_queue_stats)
+    return {"jobs": jobs, "workers": analysis_workers.metrics()}
+
+@app.post("/analysis/queue/retry-dead")
+@handle_errors("Erreur file d'analyse")
+async def retry_dead_analyses():
+    """Remettre en file les analyses abandonnées (statut 'dead')"""
+    requeued = await db.run(_requeue_dead)
+    analysis_workers.notify()
+    logger.info(f"{requeued} analyses remises en file")
+    return {"requeued": requeued}
+
+@app.get("/maintenance")
+@handle_errors("Erreur état maintenance")
+async def get_maintenance():
+    """Partitions, rétention, archivage et dernier passage de maintenance"""
+    return await db.run(storage_maintenance.status)
+
+@app.post("/maintenance/run")
+@handle_errors("Erreur maintenance")
+async def run_maintenance():
+    """Lancer immédiatement un passage de maintenance (partitions, rétention, archivage)"""
+    return await db.run(storage_maintenance.run_once)
+
+def _read_backlog() -> dict:
+    with db.connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            backlog = repository.fetch_backlog(cur)
+        conn.rollback()
+    return backlog
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Métriques Prometheus (format texte)"""
+    try:
+        backlog = await db.run(_read_backlog)
+        for status, count in backlog.items():
+            ANALYSIS_BACKLOG.labels(status).set(count)
     except Exception as e:
-        logger.error(f"Erreur stats: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        # Le reste des métriques reste utile quand la base ne répond pas
+        logger.warning(f"Métriques: file d'analyse illisible ({e})")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, Iterator
+from urllib.parse import urlparse
+
+logger = logging.getLogger("mail-parser.archive_store")
+
+
+class LocalArchiveStore:
+    """Stockage froid dans un répertoire local (ou un volume monté).
+
+    Interface minimale d'un stockage objet (put / get / delete par clé,
+    pointeur sous forme d'URI) : un client S3/MinIO peut le remplacer sans
+    toucher aux appelants. Les écritures sont atomiques (fichier temporaire
+    puis renommage) : un pointeur en base désigne toujours un fichier complet.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Clé d'archive invalide: {key}")
+        return path
+
+    def _path_of(self, uri: str) -> str:
+        parsed = urlparse(uri)
+        if parsed.scheme != "file":
+            raise ValueError(f"URI d'archive non supportée: {uri}")
+        return self._path(os.path.relpath(parsed.path, self.root))
+
+    def put(self, key: str, data: bytes) -> str:
+        """Écrire un objet et retourner son URI"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return f"file://{path}"
+
+    def get(self, uri: str) -> bytes:
+        with open(self._path_of(uri), "rb") as f:
+            return f.read()
+
+    def stream(self, uri: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Lire un objet par blocs (sans le charger entièrement)"""
+        with open(self._path_of(uri), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def delete(self, uri: str):
+        try:
+            os.unlink(self._path_of(uri))
+        except FileNotFoundError:
+            logger.debug(f"Objet d'archive déjà absent: {uri}")
+
+
+class ContentAddressedStore(LocalArchiveStore):
+    """Stockage des pièces jointes adressé par contenu (SHA-256).
+
+    La clé est l'empreinte du contenu décodé (sha256/ab/cd/<empreinte>) :
+    une pièce jointe reçue plusieurs fois (PDF transféré, signature...) n'est
+    écrite qu'une fois. L'écriture est en flux : les blocs sont hachés et
+    écrits dans un fichier temporaire au fil de l'eau, la mémoire ne dépend
+    pas de la taille de la pièce jointe.
+    """
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.blobs_written = 0
+        self.blobs_deduplicated = 0
+        self.bytes_written = 0
+        self.bytes_deduplicated = 0
+
+    @staticmethod
+    def key(sha256: str) -> str:
+        return f"sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+    def put_stream(self, chunks: Iterable[bytes]) -> Dict:
+        """Écrire un contenu reçu par blocs ; retourne uri, sha256, size et stored
+        (False si le contenu était déjà présent)"""
+        tmp_dir = os.path.join(self.root, ".tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            path = self._path(self.key(sha256))
+            stored = not os.path.exists(path)
+            if stored:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Écrivains concurrents du même contenu : le dernier renommage gagne, à l'identique
+                os.replace(tmp_path, path)
+            else:
+                os.unlink(tmp_path)
+                # Rafraîchir la date : le ramasse-miettes épargne les contenus récemment référencés
+                os.utime(path)
+            self.record(size, stored)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return {"uri": f"file://{path}", "sha256": sha256, "size": size, "stored": stored}
+
+    def uri(self, sha256: str) -> str:
+        return f"file://{self._path(self.key(sha256))}"
+
+    def delete_unused(self, sha256: str, grace_seconds: float) -> bool:
+        """Supprimer un contenu plus référencé, sauf s'il a été réécrit récemment"""
+        path = self._path(self.key(sha256))
+        try:
+            if time.time() - os.path.getmtime(path) < grace_seconds:
+                return False
+            os.unlink(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def record(self, size: int, stored: bool):
+        """Compter une écriture (faite ici ou dans un processus de parsing)"""
+        if stored:
+            self.blobs_written += 1
+            self.bytes_written += size
+        else:
+            self.blobs_deduplicated += 1
+            self.bytes_deduplicated += size
+
+    def metrics(self) -> Dict:
+        return {
+            "blobs_written": self.blobs_written,
+            "blobs_deduplicated": self.blobs_deduplicated,
+            "bytes_written": self.bytes_written,
+            "bytes_deduplicated": self.bytes_deduplicated,
+        }
@@ -0,0 +1,155 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from prometheus_client import Histogram
+
+logger = logging.getLogger("mail-parser.database")
+
+# Attente d'une connexion libre (saturation du pool)
+ACQUIRE_SECONDS = Histogram(
+    "mailparser_db_acquire_wait_seconds", "Attente d'une connexion du pool DB",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+
+class DatabaseUnavailable(Exception):
+    """Aucune connexion disponible dans le délai imparti"""
+
+
+class Database:
+    """Pool de connexions PostgreSQL partagé par tous les handlers.
+
+    psycopg2 est bloquant : les accès se font dans un pool de threads borné
+    (une connexion par thread au maximum) pour ne jamais bloquer la boucle
+    asyncio d'uvicorn.
+    """
+
+    def __init__(self):
+        self.database_url = os.getenv("MAIL_PARSER_DATABASE_URL")
+        self.min_size = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+        self.max_size = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+        self.acquire_timeout = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+
+        self.pool: Optional[ThreadedConnectionPool] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._acquire_timeouts = 0
+
+    def open(self):
+        """Créer le pool de connexions et le pool de threads"""
+        if not self.database_url:
+            raise ValueError("MAIL_PARSER_DATABASE_URL non définie")
+
+        self.pool = ThreadedConnectionPool(self.min_size, self.max_size, self.database_url)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_size,
+            thread_name_prefix="db"
+        )
+        logger.info(f"Pool DB ouvert (min={self.min_size}, max={self.max_size})")
+
+    def close(self):
+        """Fermer toutes les connexions"""
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self.pool:
+            self.pool.closeall()
+            self.pool = None
+            logger.info("Pool DB fermé")
+
+    @contextmanager
+    def connection(self):
+        """Emprunter une connexion au pool (rollback si exception)"""
+        if not self.pool:
+            raise DatabaseUnavailable("Pool DB non initialisé")
+
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.acquire_timeout)
+        ACQUIRE_SECONDS.observe(time.perf_counter() - start)
+        if not acquired:
+            with self._lock:
+                self._acquire_timeouts += 1
+            raise DatabaseUnavailable(
+                f"Aucune connexion disponible après {self.acquire_timeout}s"
+            )
+
+        conn = None
+        try:
+            conn = self.pool.getconn()
+            with self._lock:
+                self._in_use += 1
+            yield conn
+        except Exception:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._in_use -= 1
+                # Une connexion cassée est jetée plutôt que remise dans le pool
+                self.pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
+    async def run(self, func: Callable, *args, **kwargs):
+        """Exécuter une fonction bloquante dans le pool de threads DB"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            functools.partial(func, *args, **kwargs)
+        )
+
+    def ping(self) -> float:
+        """Vérifier la base avec SELECT 1 et retourner la latence en ms"""
+        start = time.perf_counter()
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+                cur.fetchone()
+            conn.rollback()
+        return (time.perf_counter() - start) * 1000
+
+    def usage(self) -> tuple:
+        """(connexions empruntées, attentes expirées)"""
+        with self._lock:
+            return self._in_use, self._acquire_timeouts
+
+    def health(self) -> dict:
+        """État du pool pour /health"""
+        with self._lock:
+            in_use = self._in_use
+            timeouts = self._acquire_timeouts
+
+        status = {
+            "open": self.pool is not None,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_use": in_use,
+            "available": self.max_size - in_use,
+            "acquire_timeout_s": self.acquire_timeout,
+            "acquire_timeouts": timeouts,
+        }
+
+        try:
+            status["latency_ms"] = round(self.ping(), 2)
+            status["ok"] = True
+        except Exception as e:
+            logger.warning(f"Health DB en échec: {e}")
+            status["ok"] = False
+            status["error"] = str(e)
+
+        return status
+
+
+db = Database()
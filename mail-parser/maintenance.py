@@ -0,0 +1,222 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from archive_store import LocalArchiveStore
+from database import Database
+import partitions
+import repository
+
+logger = logging.getLogger("mail-parser.maintenance")
+
+# Un seul processus à la fois fait la maintenance (verrou consultatif de session)
+MAINTENANCE_LOCK = "mail-parser-maintenance"
+
+# Contenu de pièce jointe réécrit depuis moins longtemps : peut-être en cours de référencement
+BLOB_GRACE_SECONDS = 3600
+
+
+class StorageMaintenance:
+    """Maintenance périodique du stockage des emails.
+
+    - crée à l'avance les partitions mensuelles (PARTITION_MONTHS_AHEAD) ;
+    - applique la rétention (RETENTION_MONTHS, 0 = illimitée) : les
+      partitions expirées sont détachées puis supprimées (RETENTION_MODE=drop)
+      ou seulement détachées (detach) pour un export externe ;
+    - archive les corps bruts plus vieux que ARCHIVE_AFTER_DAYS (0 = jamais)
+      dans ARCHIVE_DIR (gzip), en ne gardant en base que le pointeur.
+      Un email archivé reste trouvable par son sujet, plus par son corps.
+
+    Les contenus de pièces jointes (stockage adressé par contenu) des emails
+    supprimés sont effacés quand plus aucune pièce jointe n'y fait référence.
+    """
+
+    def __init__(self, database: Database, attachment_store=None):
+        self.db = database
+        self.attachment_store = attachment_store
+        self.interval = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "3600"))
+        self.months_ahead = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))
+        self.retention_months = int(os.getenv("RETENTION_MONTHS", "0"))
+        self.retention_drop = os.getenv("RETENTION_MODE", "drop").lower() == "drop"
+        self.archive_after_days = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+        self.archive_batch_size = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+        self.store = LocalArchiveStore(os.getenv("ARCHIVE_DIR", "/data/archive"))
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self.last_run: Dict = {}
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+        self._thread.start()
+        logger.info(f"Maintenance du stockage démarrée (toutes les {self.interval:.0f}s)")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def trigger(self):
+        """Lancer un passage sans attendre l'intervalle"""
+        self._wakeup.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erreur maintenance: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def run_once(self) -> Dict:
+        """Un passage complet ; ignoré si un autre processus le fait déjà"""
+        start = time.perf_counter()
+        with self.db.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_try_advisory_lock(hashtext(%s));", (MAINTENANCE_LOCK,))
+                if not cur.fetchone()[0]:
+                    conn.rollback()
+                    return {"skipped": "maintenance en cours dans un autre processus"}
+                try:
+                    result = {
+                        "partitions_created": partitions.ensure_partitions(cur, self.months_ahead),
+                    }
+                    conn.commit()
+                    result["retention"] = self._apply_retention(conn, cur)
+                    result["archived"] = self._archive_bodies(conn, cur)
+                finally:
+                    conn.rollback()
+                    cur.execute("SELECT pg_advisory_unlock(hashtext(%s));", (MAINTENANCE_LOCK,))
+                    conn.commit()
+
+        result["seconds"] = round(time.perf_counter() - start, 2)
+        result["finished_at"] = datetime.now(timezone.utc).isoformat()
+        self.last_run = result
+        if result["retention"] or result["archived"]:
+            logger.info(f"Maintenance: {result}")
+        return result
+
+    def _apply_retention(self, conn, cur) -> List[Dict]:
+        """Sortir les partitions expirées (une transaction par partition)"""
+        removed = []
+        blob_hashes = set()
+        for partition in partitions.expired_partitions(cur, self.retention_months):
+            outcome = partitions.remove_partition(cur, partition["name"], self.retention_drop)
+            conn.commit()
+            blob_hashes.update(outcome["blob_hashes"])
+            if self.retention_drop:
+                for uri in outcome["archive_uris"]:
+                    self.store.delete(uri)
+            removed.append({"partition": outcome["partition"], "emails": outcome["emails"]})
+
+        if self.retention_months > 0:
+            # Lignes expirées restantes (partition DEFAULT, partition emails_legacy pas
+            # encore entièrement expirée) : suppression ligne à ligne par la table
+            # parente, pour que les triggers (compteurs /stats, lignes dépendantes
+            # et clés) s'appliquent ; le filtre sur received_at écarte les autres partitions
+            cutoff = partitions.month_start(datetime.now(timezone.utc), -self.retention_months)
+            blob_hashes.update(partitions.attachment_hashes(
+                cur, "SELECT id FROM emails WHERE received_at < %s", (cutoff,)
+            ))
+            cur.execute("DELETE FROM emails WHERE received_at < %s RETURNING archive_uri;", (cutoff,))
+            uris = [uri for (uri,) in cur.fetchall() if uri]
+            if cur.rowcount:
+                removed.append({"partition": "emails", "emails": cur.rowcount})
+            conn.commit()
+            for uri in uris:
+                self.store.delete(uri)
+
+        self._collect_blobs(conn, cur, blob_hashes)
+        return removed
+
+    def _collect_blobs(self, conn, cur, hashes) -> int:
+        """Effacer les contenus de pièces jointes qui ne sont plus référencés"""
+        if self.attachment_store is None or not hashes:
+            return 0
+        unused = repository.unreferenced_blobs(cur, sorted(hashes))
+        conn.rollback()
+        deleted = sum(1 for sha256 in unused if self.attachment_store.delete_unused(sha256, BLOB_GRACE_SECONDS))
+        if deleted:
+            logger.info(f"{deleted} contenus de pièces jointes supprimés")
+        return deleted
+
+    def _archive_bodies(self, conn, cur) -> int:
+        """Déplacer en-têtes et corps bruts anciens vers l'archive, par lots"""
+        if self.archive_after_days <= 0:
+            return 0
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.archive_after_days)
+        archived = 0
+        while not self._stop.is_set():
+            cur.execute("""
+                SELECT id, received_at, raw_headers, raw_body FROM emails
+                WHERE archive_uri IS NULL AND received_at < %s
+                ORDER BY received_at
+                LIMIT %s;
+            """, (cutoff, self.archive_batch_size))
+            rows = cur.fetchall()
+            if not rows:
+                break
+
+            pointers = []
+            for email_id, received_at, raw_headers, raw_body in rows:
+                payload = json.dumps({"raw_headers": raw_headers, "raw_body": raw_body}).encode("utf-8")
+                key = f"{received_at:%Y/%m}/{email_id}.json.gz"
+                uri = self.store.put(key, gzip.compress(payload))
+                pointers.append((email_id, received_at, uri))
+
+            # Fichiers écrits avant le pointeur : un crash laisse au pire un fichier orphelin
+            execute_values(cur, """
+                UPDATE emails SET raw_headers = NULL, raw_body = NULL, archive_uri = v.uri
+                FROM (VALUES %s) AS v (id, received_at, uri)
+                WHERE emails.id = v.id AND emails.received_at = v.received_at;
+            """, pointers, template="(%s::bigint, %s::timestamptz, %s)")
+            conn.commit()
+            archived += len(rows)
+        return archived
+
+    def read_archived(self, uri: str) -> Dict:
+        """En-têtes et corps d'un email archivé"""
+        return json.loads(gzip.decompress(self.store.get(uri)))
+
+    def status(self) -> Dict:
+        """Partitions (taille, lignes estimées) et dernier passage"""
+        with self.db.connection() as conn:
+            with conn.cursor() as cur:
+                parts = partitions.partitions(cur)
+                cur.execute("""
+                    SELECT c.relname, c.reltuples::BIGINT, pg_total_relation_size(c.oid)
+                    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = 'emails'::regclass;
+                """)
+                sizes = {name: (rows, size) for name, rows, size in cur.fetchall()}
+            conn.rollback()
+
+        return {
+            "retention_months": self.retention_months,
+            "retention_mode": "drop" if self.retention_drop else "detach",
+            "archive_after_days": self.archive_after_days,
+            "partitions": [
+                {
+                    "name": p["name"],
+                    "from": p["from"].isoformat() if p["from"] else None,
+                    "to": p["to"].isoformat() if p["to"] else None,
+                    "estimated_rows": max(0, sizes.get(p["name"], (0, 0))[0]),
+                    "total_bytes": sizes.get(p["name"], (0, 0))[1],
+                }
+                for p in parts
+            ],
+            "last_run": self.last_run,
+        }
@@ -0,0 +1,171 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple, Union
+
+from prometheus_client import Histogram
+
+from archive_store import ContentAddressedStore
+from parser.email_analyzer import EmailAnalyzer
+
+logger = logging.getLogger("mail-parser.parse_pool")
+
+# Temps de parsing vu par l'appelant (file d'attente du pool comprise)
+PARSE_SECONDS = Histogram(
+    "mailparser_parse_duration_seconds", "Durée du parsing MIME par appel", ["mode"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+
+# Analyseur du processus fils (créé par _init_worker)
+_analyzer: Optional[EmailAnalyzer] = None
+
+
+def _init_worker(attachment_store_dir: str):
+    global _analyzer
+    store = ContentAddressedStore(attachment_store_dir) if attachment_store_dir else None
+    _analyzer = EmailAnalyzer(store)
+
+
+def _parse(raw_message: Union[str, bytes]) -> Dict:
+    return _analyzer.parse_raw_email(raw_message)
+
+
+def _parse_with(analyzer: EmailAnalyzer, raw_messages: List[Union[str, bytes]]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    """Parser un lot ; une erreur n'interrompt pas les messages suivants"""
+    results = []
+    for raw_message in raw_messages:
+        try:
+            results.append((analyzer.parse_raw_email(raw_message), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+def _parse_many(raw_messages: List[Union[str, bytes]]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+    return _parse_with(_analyzer, raw_messages)
+
+
+def _ready() -> int:
+    return os.getpid()
+
+
+def _configured_processes() -> int:
+    """PARSE_PROCESSES, sinon un processus par cœur (0 sur un seul cœur :
+    le passage par un processus ne fait alors qu'ajouter la sérialisation)"""
+    value = os.getenv("PARSE_PROCESSES", "").strip()
+    if value:
+        return int(value)
+    cores = os.cpu_count() or 1
+    return cores if cores > 1 else 0
+
+
+class ParsePool:
+    """Parsing MIME dans des processus dédiés.
+
+    Le parsing (parcours MIME, décodage base64 / quoted-printable, en-têtes)
+    est du CPU pur : dans les threads du pool DB il est sérialisé par le GIL
+    et un gros message ralentit toutes les requêtes en cours. PARSE_PROCESSES
+    processus (par défaut un par cœur) le font en parallèle ; 0 garde le
+    parsing dans le thread appelant.
+
+    Les processus sont lancés en « spawn » (pas de fork d'un processus qui a
+    déjà des threads et des connexions PostgreSQL) et écrivent eux-mêmes les
+    pièces jointes dans le stockage partagé. Un processus qui meurt (OOM,
+    plantage d'un codec C) casse tout l'exécuteur : il est alors recréé et
+    l'appel rejoué une fois.
+    """
+
+    def __init__(self, attachment_store: Optional[ContentAddressedStore] = None):
+        self.processes = _configured_processes()
+        # Messages envoyés ensemble à un processus lors d'un /parse/batch
+        self.batch_chunk = int(os.getenv("PARSE_BATCH_CHUNK", "8"))
+        self.attachment_store = attachment_store
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+        self.restarts = 0
+        self._analyzer = EmailAnalyzer(attachment_store)
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 0
+
+    def start(self):
+        if not self.enabled:
+            logger.info("Parsing dans les threads du service (PARSE_PROCESSES=0)")
+            return
+        self._executor = self._new_executor()
+        # Démarrer les processus maintenant plutôt qu'à la première requête
+        start = time.perf_counter()
+        pids = {self._executor.submit(_ready).result() for _ in range(self.processes)}
+        logger.info(
+            f"Pool de parsing démarré: {self.processes} processus "
+            f"({len(pids)} prêts en {time.perf_counter() - start:.1f}s)"
+        )
+
+    def _new_executor(self) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.attachment_store.root if self.attachment_store else "",)
+        )
+
+    def _restart(self, broken: Executor) -> Executor:
+        """Remplacer l'exécuteur cassé (une seule fois si plusieurs threads le constatent)"""
+        with self._executor_lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+                self.restarts += 1
+                logger.warning(f"Processus de parsing mort - pool recréé ({self.restarts} redémarrages)")
+            return self._executor
+
+    def stop(self):
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @PARSE_SECONDS.labels("single").time()
+    def parse(self, raw_message: Union[str, bytes]) -> Dict:
+        """Parser un message (bloquant : à appeler hors de la boucle asyncio)"""
+        executor = self._executor
+        if executor is None:
+            return self._analyzer.parse_raw_email(raw_message)
+        try:
+            parsed_data = executor.submit(_parse, raw_message).result()
+        except BrokenProcessPool:
+            parsed_data = self._restart(executor).submit(_parse, raw_message).result()
+        self._record(parsed_data)
+        return parsed_data
+
+    @PARSE_SECONDS.labels("batch").time()
+    def parse_many(self, raw_messages: List[Union[str, bytes]]) -> List[Tuple[Optional[Dict], Optional[str]]]:
+        """Parser un lot réparti sur les processus ; (parsed_data, erreur) par message"""
+        executor = self._executor
+        if executor is None:
+            return _parse_with(self._analyzer, raw_messages)
+        chunks = [raw_messages[i:i + self.batch_chunk] for i in range(0, len(raw_messages), self.batch_chunk)]
+        try:
+            results = [result for chunk_results in executor.map(_parse_many, chunks) for result in chunk_results]
+        except BrokenProcessPool:
+            executor = self._restart(executor)
+            results = [result for chunk_results in executor.map(_parse_many, chunks) for result in chunk_results]
+        for parsed_data, _ in results:
+            if parsed_data:
+                self._record(parsed_data)
+        return results
+
+    def _record(self, parsed_data: Dict):
+        """Compteurs du stockage : les écritures ont eu lieu dans un autre processus"""
+        if self.attachment_store is not None:
+            for attachment in parsed_data.get('attachments', []):
+                if attachment.get('storage_uri'):
+                    self.attachment_store.record(attachment['size'], attachment['stored'])
+
+    def metrics(self) -> Dict:
+        return {"processes": self.processes if self._executor else 0, "restarts": self.restarts}
+
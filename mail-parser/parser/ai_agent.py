@@ -1,18 +1,49 @@
 import os
+import json
 import logging
+import threading
 from typing import Dict, Optional
 
+from .classifier import LocalClassifier
+from .prompt_budget import prepare_body
+
 logger = logging.getLogger("mail-parser.ai_agent")
 
+BATCH_PROMPT = """
+Analyse chacun des emails ci-dessous et réponds uniquement avec un objet JSON
+{{"results": [{{"id": ..., "sentiment": ..., "category": ..., "summary": ..., "score": ...}}]}}
+contenant exactement un résultat par email, avec son id :
+- sentiment: "positif", "negatif", "neutre"
+- category: catégorie principale (ex: "facture", "commande", "support", "commercial")
+- summary: résumé en 1-2 phrases
+- score: score de confiance entre 0 et 1
+
+Emails (JSON):
+{emails}
+"""
+
 class AIAgent:
     """Agent IA pour l'analyse sémantique des emails"""
 
     def __init__(self):
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        # Budget de tokens du corps (historique cité et signature retirés, puis début + fin)
+        self.body_token_budget = int(os.getenv("OPENAI_BODY_TOKEN_BUDGET", "1000"))
+        self.batch_body_token_budget = int(os.getenv("OPENAI_BATCH_BODY_TOKEN_BUDGET", "400"))
+        self._stats_lock = threading.Lock()
+        self.body_stats = {"emails": 0, "truncated": 0, "original_tokens": 0, "kept_tokens": 0}
+        # Classifieur local : emails faciles sans appel au LLM, et analyse mock
+        self.classifier = LocalClassifier()
         if self.openai_api_key:
             try:
                 import openai
-                self.client = openai.OpenAI(api_key=self.openai_api_key)
+                # OPENAI_BASE_URL : API compatible (ex: bench/openai_standin.py)
+                self.client = openai.OpenAI(
+                    api_key=self.openai_api_key,
+                    base_url=os.getenv("OPENAI_BASE_URL") or None,
+                    timeout=float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60")),
+                    max_retries=0
+                )
                 logger.info("Client OpenAI initialisé")
             except ImportError:
                 logger.error("Bibliothèque OpenAI non installée")
@@ -21,20 +52,25 @@ class AIAgent:
             logger.info("Pas de clé OpenAI - mode mock")
             self.client = None
 
-    def analyze_email(self, parsed_email: Dict) -> Dict:
-        """Analyser un email avec l'IA"""
+    def analyze_email(self, parsed_email: Dict, fallback: bool = True) -> Dict:
+        """Analyser un email avec l'IA.
+
+        Avec fallback=False, les erreurs OpenAI sont propagées (la file
+        d'analyse gère les nouvelles tentatives) au lieu de retomber sur le mock.
+        """
         if not self.client:
             return self._mock_analysis(parsed_email)
 
         try:
             # Préparer le prompt
+            body = self._prepare_body(parsed_email, self.body_token_budget)
             email_content = f"""
             From: {parsed_email['from']}
             To: {parsed_email['to']}
             Subject: {parsed_email['subject']}
 
             Body:
-            {parsed_email['body']}
+            {body}
             """
 
             prompt = f"""
@@ -56,43 +92,110 @@ class AIAgent:
             )
 
             # Parser la réponse JSON
-            import json
             result = json.loads(response.choices[0].message.content)
             logger.info(f"Analyse IA complétée: {result.get('category', 'unknown')}")
             return result
 
         except Exception as e:
             logger.error(f"Erreur analyse OpenAI: {e}")
+            if not fallback:
+                raise
             return self._mock_analysis(parsed_email)
 
+    def _prepare_body(self, parsed_email: Dict, max_tokens: int) -> str:
+        """Corps nettoyé et tronqué pour le prompt, avec comptage de ce qui est coupé"""
+        body, stats = prepare_body(parsed_email.get('body') or '', max_tokens)
+        with self._stats_lock:
+            self.body_stats["emails"] += 1
+            self.body_stats["truncated"] += 1 if stats["truncated_chars"] else 0
+            self.body_stats["original_tokens"] += stats["original_tokens"]
+            self.body_stats["kept_tokens"] += stats["kept_tokens"]
+        if stats["original_tokens"] != stats["kept_tokens"]:
+            logger.debug(
+                f"Corps réduit de {stats['original_tokens']} à {stats['kept_tokens']} tokens "
+                f"(cité: {stats['quoted_chars']}, signature: {stats['signature_chars']}, "
+                f"coupé: {stats['truncated_chars']} caractères)"
+            )
+        return body
+
+    def metrics(self) -> Dict:
+        """Tokens de corps envoyés au modèle et économisés"""
+        with self._stats_lock:
+            stats = dict(self.body_stats)
+        stats["saved_tokens"] = stats["original_tokens"] - stats["kept_tokens"]
+        return stats
+
+    def analyze_emails(self, parsed_emails: Dict[str, Dict], fallback: bool = True) -> Dict[str, Dict]:
+        """Analyser plusieurs emails en un seul appel au modèle.
+
+        `parsed_emails` associe un id à chaque email ; le résultat contient une
+        analyse par id. Un élément absent ou illisible dans la réponse retombe
+        sur `_mock_analysis`. Avec fallback=False, l'échec de l'appel lui-même
+        est propagé (la file d'analyse gère les nouvelles tentatives).
+        """
+        if not parsed_emails:
+            return {}
+        if not self.client:
+            return {key: self._mock_analysis(item) for key, item in parsed_emails.items()}
+
+        try:
+            emails = [
+                {
+                    "id": str(key),
+                    "from": item.get('from', ''),
+                    "to": item.get('to', ''),
+                    "subject": item.get('subject', ''),
+                    "body": self._prepare_body(item, self.batch_body_token_budget),
+                }
+                for key, item in parsed_emails.items()
+            ]
+            prompt = BATCH_PROMPT.format(emails=json.dumps(emails, ensure_ascii=False))
+
+            response = self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=120 * len(emails) + 50,
+                temperature=0.3,
+                response_format={"type": "json_object"}
+            )
+            content = response.choices[0].message.content
+
+        except Exception as e:
+            logger.error(f"Erreur analyse OpenAI (lot de {len(parsed_emails)}): {e}")
+            if not fallback:
+                raise
+            return {key: self._mock_analysis(item) for key, item in parsed_emails.items()}
+
+        by_id = {}
+        try:
+            payload = json.loads(content)
+            items = payload.get("results", []) if isinstance(payload, dict) else payload
+            for item in items:
+                if isinstance(item, dict) and item.get("category"):
+                    by_id[str(item.get("id"))] = {k: v for k, v in item.items() if k != "id"}
+        except (ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Réponse IA (lot) illisible: {e}")
+
+        results = {}
+        for key, item in parsed_emails.items():
+            result = by_id.get(str(key))
+            if result is None:
+                logger.warning(f"Pas d'analyse pour l'email {key} dans la réponse du lot - mock")
+                result = self._mock_analysis(item)
+            results[key] = result
+
+        logger.info(f"Analyse IA (lot) complétée: {len(by_id)}/{len(parsed_emails)} emails")
+        return results
+
     def _mock_analysis(self, parsed_email: Dict) -> Dict:
-        """Analyse mock si pas d'IA disponible"""
+        """Analyse mock si pas d'IA disponible (meilleure estimation du classifieur local)"""
         logger.debug("Utilisation analyse mock")
 
-        # Logique simple basée sur le subject
-        subject = parsed_email.get('subject', '').lower()
-
-        # Détection de catégorie simple
-        if any(word in subject for word in ['facture', 'invoice', 'bill']):
-            category = "facture"
-            sentiment = "neutre"
-        elif any(word in subject for word in ['commande', 'order']):
-            category = "commande"
-            sentiment = "positif"
-        elif any(word in subject for word in ['support', 'help', 'problème']):
-            category = "support"
-            sentiment = "neutre"
-        elif any(word in subject for word in ['urgent', 'important']):
-            category = "urgent"
-            sentiment = "neutre"
-        else:
-            category = "general"
-            sentiment = "neutre"
-
+        category, _, _ = self.classifier.predict(parsed_email)
         return {
-            "sentiment": sentiment,
+            "sentiment": self.classifier.sentiments.get(category, "neutre"),
             "category": category,
             "summary": f"Email de {parsed_email.get('from', 'unknown')} concernant: {parsed_email.get('subject', 'N/A')}",
             "score": 0.7,
             "analysis_type": "mock"
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,219 @@
+"""Extraction du corps lisible d'un email (texte ou HTML), normalisé une fois.
+
+Le texte retourné est celui que stockent les emails (raw_body) et que
+réutilisent la recherche plein texte, l'analyse IA et l'empreinte du cache
+d'analyses : pas de balises, pas de caractères invisibles, espaces réduits.
+"""
+import logging
+import re
+import unicodedata
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger("mail-parser.body_text")
+
+# Texte brut plus court : comparé à la version HTML d'une multipart/alternative
+# (partie texte de façade type « Voir cet email dans votre navigateur »)
+SHORT_PLAIN_CHARS = 500
+# Taille des morceaux passés au parseur HTML incrémental
+HTML_FEED_CHARS = 64 * 1024
+
+# Charsets déclarés mais faux ou inconnus : repli dans cet ordre
+FALLBACK_CHARSETS = ('utf-8', 'cp1252')
+CHARSET_ALIASES = {'unknown-8bit': 'cp1252', 'x-unknown': 'cp1252', 'iso-8859-1': 'cp1252', 'latin1': 'cp1252'}
+
+_BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'center', 'dd', 'div', 'dl', 'dt', 'figcaption',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav',
+    'ol', 'p', 'pre', 'section', 'table', 'tbody', 'thead', 'tfoot', 'tr', 'ul',
+))
+# Blocs d'une ligne (pas de ligne vide après : éléments de liste, rangées)
+_LINE_TAGS = frozenset(('dd', 'dt', 'li', 'tr'))
+_SKIP_TAGS = frozenset(('head', 'noscript', 'script', 'style', 'svg', 'template', 'title'))
+_CELL_TAGS = frozenset(('td', 'th'))
+_VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'))
+_HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden|max-height\s*:\s*0', re.IGNORECASE)
+
+# Invisibles des newsletters (remplissage de pré-en-tête, césures, BOM)
+_INVISIBLE = re.compile(
+    '[\u00ad\u034f\u061c\u115f\u1160\u17b4\u17b5\u180e'
+    '\u200b-\u200f\u2060-\u2064\ufeff]+'
+)
+_HSPACE = re.compile(r'[^\S\n]+')
+_SPACE_AROUND_NEWLINE = re.compile(r' *\n *')
+_BLANK_LINES = re.compile(r'\n{3,}')
+_DATA_SPACE = re.compile(r'\s+')
+# Blocs sans texte visible retirés avant le parseur (souvent la moitié d'une
+# newsletter : CSS du <head>, commentaires conditionnels Outlook)
+_INERT_BLOCKS = re.compile(
+    r'<!--.*?-->|<(head|style|script)\b[^>]*>.*?</\1\s*>', re.IGNORECASE | re.DOTALL
+)
+# Saut de ligne structurel, distinct des retours à la ligne du source HTML
+_BREAK = '\x00'
+
+
+class _HTMLText(HTMLParser):
+    """Conversion HTML -> texte en flux (html.parser de la bibliothèque standard).
+
+    Les blocs deviennent des retours à la ligne, les cellules des espaces ;
+    scripts, styles et éléments masqués (pré-en-têtes display:none) sont
+    ignorés. Tolérant au HTML invalide des emails.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip = 0
+        self._pre = 0
+        # (balise, profondeur) de l'élément masqué en cours
+        self._hidden: Optional[list] = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._hidden is not None:
+            if tag == self._hidden[0] and tag not in _VOID_TAGS:
+                self._hidden[1] += 1
+            return
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+            return
+        if tag not in _VOID_TAGS:
+            style = next((value for name, value in attrs if name == 'style' and value), None)
+            if (style and _HIDDEN_STYLE.search(style)) or any(name == 'hidden' for name, _ in attrs):
+                self._hidden = [tag, 1]
+                return
+        if tag == 'br':
+            self.parts.append(_BREAK)
+        elif tag == 'pre':
+            self._pre += 1
+            self.parts.append(_BREAK)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append(_BREAK)
+            if tag == 'li':
+                self.parts.append('- ')
+        elif tag in _CELL_TAGS:
+            self.parts.append(' ')
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self._hidden is not None:
+            if tag == self._hidden[0]:
+                self._hidden[1] -= 1
+                if self._hidden[1] == 0:
+                    self._hidden = None
+            return
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == 'pre':
+            self._pre = max(0, self._pre - 1)
+            self.parts.append(_BREAK)
+        elif tag in _BLOCK_TAGS and tag not in _LINE_TAGS:
+            self.parts.append(_BREAK)
+
+    def handle_data(self, data):
+        if self._skip or self._hidden is not None:
+            return
+        self.parts.append(data.replace('\n', _BREAK) if self._pre else data)
+
+
+def html_to_text(html: str) -> str:
+    """Texte lisible d'un document HTML (non normalisé)"""
+    html = _INERT_BLOCKS.sub(' ', html.replace(_BREAK, ''))
+    converter = _HTMLText()
+    try:
+        for start in range(0, len(html), HTML_FEED_CHARS):
+            converter.feed(html[start:start + HTML_FEED_CHARS])
+        converter.close()
+    except Exception as e:
+        # html.parser ne lève presque jamais : garder ce qui a été converti
+        logger.warning(f"HTML illisible, conversion partielle: {e}")
+    # Espaces du source HTML réduits en une passe, puis sauts structurels
+    return _DATA_SPACE.sub(' ', ''.join(converter.parts)).replace(_BREAK, '\n')
+
+
+def normalize_text(text: str) -> str:
+    """Forme normalisée : NFC, sans invisibles, espaces et lignes vides réduits"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFC', text.replace('\r\n', '\n').replace('\r', '\n'))
+    text = _INVISIBLE.sub('', text)
+    text = _HSPACE.sub(' ', text)
+    text = _SPACE_AROUND_NEWLINE.sub('\n', text)
+    text = _BLANK_LINES.sub('\n\n', text)
+    return text.strip()
+
+
+def decode_part(part) -> str:
+    """Décoder une partie texte avec son charset déclaré, replis si faux ou inconnu"""
+    payload = part.get_payload(decode=True) or b''
+    declared = (part.get_content_charset() or '').lower()
+    charsets = [CHARSET_ALIASES.get(declared, declared)] if declared else []
+    for charset in charsets + [c for c in FALLBACK_CHARSETS if c not in charsets]:
+        try:
+            return payload.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return payload.decode('utf-8', errors='replace')
+
+
+def _is_attachment(part) -> bool:
+    return part.get_content_disposition() == 'attachment' or (
+        part.get_filename() is not None and part.get_content_disposition() != 'inline'
+    )
+
+
+def _part_text(part) -> Tuple[str, str]:
+    """(texte, format) d'une partie : 'plain', 'html' ou '' si rien d'affichable"""
+    content_type = part.get_content_type()
+    if part.is_multipart():
+        children = part.get_payload()
+        if content_type == 'multipart/alternative':
+            return _select_alternative(children)
+        if content_type == 'multipart/related':
+            # La racine est la première partie (le reste : images intégrées)
+            return _part_text(children[0]) if children else ('', '')
+        # multipart/mixed, signed... : parties affichées les unes à la suite
+        texts, formats = [], []
+        for child in children:
+            if _is_attachment(child) or child.get_content_type() == 'message/rfc822':
+                continue
+            text, fmt = _part_text(child)
+            if text:
+                texts.append(text)
+                formats.append(fmt)
+        return '\n\n'.join(texts), (formats[0] if formats else '')
+
+    if _is_attachment(part):
+        return '', ''
+    if content_type == 'text/plain':
+        return normalize_text(decode_part(part)), 'plain'
+    if content_type == 'text/html':
+        return normalize_text(html_to_text(decode_part(part))), 'html'
+    return '', ''
+
+
+def _select_alternative(children) -> Tuple[str, str]:
+    """Choisir entre les versions d'une multipart/alternative.
+
+    Le texte brut est préféré (fidèle, pas de conversion) sauf s'il est
+    vide ou n'est qu'une façade bien plus courte que la version HTML.
+    """
+    plain = next((c for c in children if c.get_content_type() == 'text/plain'), None)
+    others = [c for c in reversed(children) if c is not plain]
+
+    plain_text = _part_text(plain)[0] if plain is not None else ''
+    if len(plain_text) >= SHORT_PLAIN_CHARS:
+        return plain_text, 'plain'
+    for other in others:
+        text, fmt = _part_text(other)
+        if text and len(text) > 2 * len(plain_text):
+            return text, fmt
+    return (plain_text, 'plain') if plain_text else ('', '')
+
+
+def extract_body(msg) -> Tuple[str, str]:
+    """Corps lisible normalisé du message et son format d'origine ('plain' | 'html' | '')"""
+    return _part_text(msg)
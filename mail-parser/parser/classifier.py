@@ -0,0 +1,264 @@
+import json
+import logging
+import math
+import os
+import re
+import zlib
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # modèle n-grammes optionnel
+    np = None
+
+logger = logging.getLogger("mail-parser.classifier")
+
+FIELDS = ('subject', 'sender', 'body')
+
+# Règles par défaut : (catégorie, sentiment, champ, motif, poids[, priorité]).
+# `sender` est l'adresse complète de l'expéditeur (partie locale et domaine).
+# Les textes sont mis en minuscules avant la recherche : motifs en minuscules.
+# À score égal, la catégorie de plus haute priorité l'emporte (« URGENT :
+# facture » est urgent).
+DEFAULT_RULES = [
+    ("facture", "neutre", "subject", r"\b(factures?|invoices?|bills?|re[çc]us?|receipts?|avoirs?|relev[ée]s? de compte)\b", 2.0),
+    ("facture", "neutre", "body", r"\b(montant (ttc|ht|d[ûu])|total (ttc|[àa] payer)|amount due|[ée]ch[ée]ance|due date|iban)\b", 1.0),
+    ("facture", "neutre", "sender", r"^(billing|factur\w*|invoices?|compta\w*)@", 1.0),
+    ("commande", "positif", "subject", r"\b(commandes?|orders?|achats?|purchases?)\b", 2.0),
+    ("commande", "positif", "subject", r"\b(exp[ée]di\w*|shipped|livr[ée]e?s?|delivered)\b", 1.0),
+    ("commande", "positif", "body", r"\b(num[ée]ro de commande|order (number|#)|r[ée]capitulatif de (votre )?commande|suivi de (colis|livraison)|tracking number)\b", 1.0),
+    ("commande", "positif", "sender", r"^(orders?|commandes?|shop|boutique|store)@", 1.0),
+    ("support", "neutre", "subject", r"\b(support|help|aide|probl[èe]mes?|tickets?|incidents?|bugs?|pannes?)\b", 2.0),
+    ("support", "neutre", "body", r"\b(ne fonctionne (pas|plus)|doesn'?t work|message d'erreur|error message)\b", 1.0),
+    ("support", "neutre", "sender", r"^(support|help|helpdesk|assistance|sav)@", 1.0),
+    ("urgent", "neutre", "subject", r"\b(urgent|important|asap|imm[ée]diat\w*)\b", 2.0, 1),
+    ("newsletter", "neutre", "body", r"(se d[ée]sabonner|d[ée]sinscri\w+|unsubscribe|voir (cet|ce message|la version) (email|en ligne)|view (this email|in browser))", 2.0),
+    ("newsletter", "neutre", "sender", r"^(newsletters?|news|marketing|infolettre)@", 1.0),
+]
+
+
+class Rule:
+    def __init__(self, category: str, sentiment: str, field: str, pattern: str, weight: float = 1.0,
+                 priority: int = 0):
+        if field not in FIELDS:
+            raise ValueError(f"Champ de règle inconnu: {field}")
+        if weight <= 0:
+            raise ValueError(f"Poids de règle non positif: {weight}")
+        try:
+            # Compilé seul : groupes nommés et références arrière du motif restent valides
+            self.regex = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Motif invalide {pattern!r}: {e}") from e
+        self.category = category
+        self.sentiment = sentiment
+        self.field = field
+        self.pattern = pattern
+        self.weight = weight
+        self.priority = priority
+
+
+def load_rules(path: Optional[str] = None) -> List[Rule]:
+    """Règles depuis CLASSIFIER_RULES (JSON {"rules": [...]}) ou règles par défaut.
+
+    Une règle invalide (champ inconnu, motif qui ne compile pas, poids nul)
+    fait échouer le chargement en indiquant son rang dans le fichier.
+    """
+    path = path or os.getenv("CLASSIFIER_RULES")
+    if not path:
+        return [Rule(*rule) for rule in DEFAULT_RULES]
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = []
+    for index, entry in enumerate(data["rules"]):
+        try:
+            rules.append(Rule(**entry))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Règle n°{index} invalide dans {path}: {e}") from e
+    logger.info(f"{len(rules)} règles de classification chargées depuis {path}")
+    return rules
+
+
+def _features(text: str, buckets: int) -> Dict[int, float]:
+    """Unigrammes et bigrammes de mots hachés (crc32, stable d'un processus à l'autre)"""
+    words = re.findall(r"\w+", text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    features: Dict[int, float] = {}
+    for gram in grams:
+        index = zlib.crc32(gram.encode("utf-8")) % buckets
+        features[index] = features.get(index, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in features.values())) or 1.0
+    return {k: v / norm for k, v in features.items()}
+
+
+class HashedNGramModel:
+    """Régression logistique multinomiale sur n-grammes hachés (NumPy requis)"""
+
+    def __init__(self, classes: List[str], buckets: int = 2 ** 18):
+        if np is None:
+            raise RuntimeError("NumPy requis pour le modèle n-grammes")
+        self.classes = list(classes)
+        self.buckets = buckets
+        self.weights = np.zeros((buckets, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+
+    @staticmethod
+    def text_of(parsed_email: Dict) -> str:
+        sender = parseaddr(parsed_email.get('from') or '')[1]
+        return f"{parsed_email.get('subject') or ''} {sender} {(parsed_email.get('body') or '')[:5000]}"
+
+    def predict_proba(self, parsed_email: Dict) -> Dict[str, float]:
+        features = _features(self.text_of(parsed_email), self.buckets)
+        if features:
+            index = np.fromiter(features.keys(), dtype=np.int64)
+            values = np.fromiter(features.values(), dtype=np.float32)
+            logits = values @ self.weights[index] + self.bias
+        else:
+            logits = self.bias.copy()
+        exp = np.exp(logits - logits.max())
+        probs = exp / exp.sum()
+        return dict(zip(self.classes, probs.tolist()))
+
+    def fit(self, emails: List[Dict], labels: List[str], epochs: int = 5, learning_rate: float = 0.5):
+        """Descente de gradient stochastique sur des emails étiquetés"""
+        targets = [self.classes.index(label) for label in labels]
+        samples = [_features(self.text_of(e), self.buckets) for e in emails]
+        for _ in range(epochs):
+            for features, target in zip(samples, targets):
+                index = np.fromiter(features.keys(), dtype=np.int64)
+                values = np.fromiter(features.values(), dtype=np.float32)
+                logits = values @ self.weights[index] + self.bias
+                exp = np.exp(logits - logits.max())
+                gradient = exp / exp.sum()
+                gradient[target] -= 1.0
+                self.weights[index] -= learning_rate * np.outer(values, gradient)
+                self.bias -= learning_rate * gradient
+        return self
+
+    def save(self, path: str):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias,
+                            classes=np.array(self.classes), buckets=self.buckets)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNGramModel":
+        data = np.load(path)
+        model = cls([str(c) for c in data["classes"]], int(data["buckets"]))
+        model.weights = data["weights"]
+        model.bias = data["bias"]
+        return model
+
+
+class LocalClassifier:
+    """Classification locale des emails faciles, avant tout appel au LLM.
+
+    Chaque règle est recherchée séparément dans son champ : des règles qui
+    se recouvrent comptent toutes. Le score d'une catégorie est la somme des
+    poids des règles trouvées ; la confiance combine ce score et l'écart avec
+    la catégorie suivante. À score égal, la priorité des règles départage
+    (une catégorie de priorité inférieure n'est alors pas concurrente), sinon
+    l'ordre des règles ; deux catégories à égalité parfaite donnent une
+    confiance nulle. Seuls le début et
+    la fin du corps sont lus (CLASSIFIER_BODY_CHARS au total) : les mentions
+    de désinscription ou de montant sont en tête ou en pied de message. Si un modèle
+    n-grammes est configuré (CLASSIFIER_MODEL), il prend le relais quand les
+    règles ne sont pas assez sûres.
+    """
+
+    def __init__(self, rules: Optional[List[Rule]] = None, model_path: Optional[str] = None):
+        self.rules = rules if rules is not None else load_rules()
+        self.min_confidence = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.8"))
+        self.body_chars = int(os.getenv("CLASSIFIER_BODY_CHARS", "2000"))
+        self.sentiments = {rule.category: rule.sentiment for rule in self.rules}
+        # Départage à score égal : priorité la plus haute, puis première règle de la catégorie
+        self._rank: Dict[str, Tuple[int, int]] = {}
+        for index, rule in enumerate(self.rules):
+            priority, first = self._rank.get(rule.category, (rule.priority, index))
+            self._rank[rule.category] = (max(priority, rule.priority), first)
+
+        self.model: Optional[HashedNGramModel] = None
+        model_path = model_path or os.getenv("CLASSIFIER_MODEL")
+        if model_path:
+            if np is None:
+                logger.warning("CLASSIFIER_MODEL défini mais NumPy absent - règles seules")
+            else:
+                self.model = HashedNGramModel.load(model_path)
+                logger.info(f"Modèle n-grammes chargé ({len(self.model.classes)} classes)")
+
+    def scores(self, parsed_email: Dict) -> Dict[str, float]:
+        """Somme des poids des règles déclenchées, par catégorie"""
+        body = parsed_email.get('body') or ''
+        if len(body) > self.body_chars:
+            half = self.body_chars // 2
+            body = f"{body[:half]}\n{body[-half:]}"
+        texts = {
+            'subject': (parsed_email.get('subject') or '').lower(),
+            'sender': parseaddr(parsed_email.get('from') or '')[1].lower(),
+            'body': body.lower(),
+        }
+        scores: Dict[str, float] = {}
+        for rule in self.rules:
+            if rule.regex.search(texts[rule.field]):
+                scores[rule.category] = scores.get(rule.category, 0.0) + rule.weight
+        return scores
+
+    def predict(self, parsed_email: Dict) -> Tuple[str, float, str]:
+        """(catégorie, confiance entre 0 et 1, source 'rules' | 'model')"""
+        ranked = sorted(
+            self.scores(parsed_email).items(),
+            key=lambda item: (-item[1], -self._rank[item[0]][0], self._rank[item[0]][1])
+        )
+        category, confidence = "general", 0.0
+        if ranked:
+            category, best = ranked[0]
+            priority = self._rank[category][0]
+            # Concurrents : score inférieur, ou même score sans priorité plus basse
+            second = max(
+                (score for other, score in ranked[1:]
+                 if score < best or self._rank[other][0] >= priority),
+                default=0.0
+            )
+            confidence = (1 - math.exp(-best)) * (best - second) / best
+
+        if confidence < self.min_confidence and self.model is not None:
+            probs = self.model.predict_proba(parsed_email)
+            model_category, model_confidence = max(probs.items(), key=lambda item: item[1])
+            if model_confidence > confidence:
+                return model_category, model_confidence, "model"
+
+        return category, confidence, "rules"
+
+    def classify(self, parsed_email: Dict) -> Optional[Dict]:
+        """Analyse locale si la confiance atteint CLASSIFIER_MIN_CONFIDENCE, sinon None"""
+        category, confidence, source = self.predict(parsed_email)
+        if confidence < self.min_confidence:
+            return None
+        return self.analysis(parsed_email, category, confidence, source)
+
+    def analysis(self, parsed_email: Dict, category: str, confidence: float, source: str) -> Dict:
+        """Résultat au format des analyses IA"""
+        return {
+            "sentiment": self.sentiments.get(category, "neutre"),
+            "category": category,
+            "summary": f"Email de {parsed_email.get('from', 'unknown')} concernant: {parsed_email.get('subject', 'N/A')}",
+            "score": round(confidence, 3),
+            "analysis_type": f"local-{source}",
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Entraîner le modèle n-grammes (CLASSIFIER_MODEL)")
+    parser.add_argument("corpus", help="JSONL : une ligne {subject, from, body, category} par email")
+    parser.add_argument("--out", required=True, help="fichier .npz produit")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--buckets", type=int, default=2 ** 18)
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+    labels = [entry["category"] for entry in corpus]
+    model = HashedNGramModel(sorted(set(labels)), args.buckets).fit(corpus, labels, args.epochs)
+    model.save(args.out)
+    print(f"Modèle entraîné sur {len(corpus)} emails ({len(model.classes)} classes) -> {args.out}")
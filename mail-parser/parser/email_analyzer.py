@@ -1,29 +1,80 @@
+import binascii
 import email
+import re
+from email import policy
 from email.parser import Parser
 from datetime import datetime
 from email.utils import parsedate_to_datetime
+from typing import Union
 import logging
 
+from .body_text import extract_body
+
+# En-têtes exposés dans les métadonnées (décodés)
+DISPLAY_HEADERS = ('from', 'to', 'cc', 'subject', 'date')
+
+# Décodage base64 des pièces jointes par tranches (multiple de 4 caractères)
+DECODE_CHUNK_CHARS = 256 * 1024
+_NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
 logger = logging.getLogger("mail-parser.analyzer")
 
+
+def _raw_payload(part):
+    """Charge non décodée d'une partie : str (partie simple) ou liste (multipart, message/rfc822).
+
+    Même objet que part.get_payload(), sans sa copie : en compat32,
+    get_payload() sans decode retourne Message._payload tel quel après un
+    utils._has_surrogates(), qui ré-encode tout le texte pour y chercher des
+    octets non ASCII (copie complète d'une pièce jointe de plusieurs dizaines
+    de Mo). Seul accès à l'attribut privé, avec repli sur get_payload() si sa
+    forme change ; l'équivalence est vérifiée par tests/test_email_analyzer.py.
+    """
+    payload = getattr(part, '_payload', None)
+    if isinstance(payload, (str, list)):
+        return payload
+    return part.get_payload()
+
 class EmailAnalyzer:
-    """Analyseur d'emails bruts"""
+    """Analyseur d'emails bruts.
+
+    Avec un `attachment_store` (ContentAddressedStore), le contenu décodé des
+    pièces jointes y est écrit en flux et son URI est retournée ; sans, seules
+    les métadonnées (dont la taille décodée) sont extraites.
+    """
+
+    def __init__(self, attachment_store=None):
+        self.attachment_store = attachment_store
 
-    def parse_raw_email(self, raw_email: str) -> dict:
-        """Parse un email brut selon votre schéma"""
+    def parse_raw_email(self, raw_email: Union[str, bytes]) -> dict:
+        """Parse un email brut selon votre schéma.
+
+        Les octets RFC822 d'origine (bytes) sont préférables au texte : le
+        charset de chaque partie est respecté et rien n'est perdu au décodage.
+        """
         try:
-            # Parser l'email
-            msg = email.message_from_string(raw_email)
+            # Parser l'email une seule fois. L'arbre MIME reste en compat32 (les
+            # en-têtes structurés de policy.default coûtent ~3x plus cher sur
+            # chaque get_content_type) ; seuls les en-têtes affichés passent
+            # par policy.default pour être décodés (RFC 2047, 8 bits).
+            if isinstance(raw_email, bytes):
+                msg = email.message_from_bytes(raw_email)
+            else:
+                msg = email.message_from_string(raw_email)
+            headers = self._decoded_headers(msg)
+            body, body_format = self._extract_body(msg)
 
             # Extraire métadonnées selon votre schéma
             parsed_data = {
-                'from': msg.get('From', ''),
-                'to': msg.get('To', ''),
-                'cc': msg.get('Cc', ''),
-                'subject': msg.get('Subject', ''),
-                'sent_at': self._parse_date(msg.get('Date')),
+                'from': headers.get('from', ''),
+                'to': headers.get('to', ''),
+                'cc': headers.get('cc', ''),
+                'subject': headers.get('subject', ''),
+                'message_id': ''.join(str(msg.get('message-id') or '').split()),
+                'sent_at': self._parse_date(headers.get('date')),
                 'raw_headers': self._extract_headers(msg),
-                'body': self._extract_body(msg),
+                'body': body,
+                'body_format': body_format,
                 'attachments': self._extract_attachments(msg)
             }
 
@@ -34,6 +85,20 @@ class EmailAnalyzer:
             logger.error(f"Erreur parsing email: {e}")
             raise
 
+    def _decoded_headers(self, msg) -> dict:
+        """Décoder From/To/Cc/Subject/Date avec le registre d'en-têtes moderne"""
+        headers = {}
+        for name, value in msg.raw_items():
+            key = name.lower()
+            if key not in DISPLAY_HEADERS or key in headers:
+                continue
+            try:
+                headers[key] = str(policy.default.header_fetch_parse(name, value))
+            except Exception as e:
+                logger.warning(f"En-tête {name} illisible: {e}")
+                headers[key] = ''
+        return headers
+
     def _parse_date(self, date_str: str) -> str:
         """Parse la date RFC 2822 vers TIMESTAMPTZ"""
         if not date_str:
@@ -50,29 +115,23 @@ class EmailAnalyzer:
         """Extraire tous les en-têtes bruts"""
         try:
             headers = []
-            for key, value in msg.items():
+            for key, value in msg.raw_items():
                 headers.append(f"{key}: {value}")
             return "\n".join(headers)
         except Exception as e:
             logger.warning(f"Erreur extraction headers: {e}")
             return ""
 
-    def _extract_body(self, msg) -> str:
-        """Extraire le corps du message"""
+    def _extract_body(self, msg) -> tuple:
+        """Corps lisible normalisé (texte brut ou HTML converti) et son format"""
         try:
-            if msg.is_multipart():
-                for part in msg.walk():
-                    if part.get_content_type() == "text/plain":
-                        return part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                return ""
-            else:
-                return msg.get_payload(decode=True).decode('utf-8', errors='ignore')
+            return extract_body(msg)
         except Exception as e:
             logger.warning(f"Erreur extraction body: {e}")
-            return ""
+            return "", ""
 
     def _extract_attachments(self, msg) -> list:
-        """Extraire métadonnées des pièces jointes"""
+        """Extraire les pièces jointes (métadonnées, contenu vers le stockage)"""
         attachments = []
         try:
             if msg.is_multipart():
@@ -80,12 +139,59 @@ class EmailAnalyzer:
                     if part.get_content_disposition() == 'attachment':
                         filename = part.get_filename()
                         if filename:
-                            attachments.append({
-                                'filename': filename,
-                                'content_type': part.get_content_type(),
-                                'size': len(part.get_payload())
-                            })
+                            attachments.append(self._store_attachment(part, filename))
         except Exception as e:
             logger.warning(f"Erreur extraction pièces jointes: {e}")
 
-        return attachments
\ No newline at end of file
+        return attachments
+
+    def _store_attachment(self, part, filename: str) -> dict:
+        """Décoder une pièce jointe en flux ; taille réelle (octets décodés)"""
+        attachment = {
+            'filename': filename,
+            'content_type': part.get_content_type(),
+            'size': 0,
+            'sha256': None,
+            'storage_uri': None,
+            'stored': False  # contenu nouveau (False : déjà présent ou non stocké)
+        }
+        chunks = self._iter_decoded(part)
+        if self.attachment_store is not None:
+            blob = self.attachment_store.put_stream(chunks)
+            attachment.update(
+                size=blob['size'], sha256=blob['sha256'], storage_uri=blob['uri'], stored=blob['stored']
+            )
+        else:
+            attachment['size'] = sum(len(chunk) for chunk in chunks)
+        return attachment
+
+    def _iter_decoded(self, part):
+        """Contenu décodé d'une partie, par blocs.
+
+        Le base64 (quasi toutes les pièces jointes) est décodé tranche par
+        tranche : jamais de copie décodée complète en mémoire, même pour un
+        message de plusieurs dizaines de Mo. Les autres encodages passent par
+        get_payload(decode=True).
+        """
+        payload = _raw_payload(part)
+        if isinstance(payload, list):
+            # message/rfc822 joint : le message complet est la pièce jointe
+            yield b''.join(p.as_bytes() for p in payload)
+            return
+        if str(part.get('content-transfer-encoding', '')).strip().lower() != 'base64':
+            yield part.get_payload(decode=True) or b''
+            return
+
+        pending = ''
+        for start in range(0, len(payload), DECODE_CHUNK_CHARS):
+            pending += _NOT_BASE64.sub('', payload[start:start + DECODE_CHUNK_CHARS])
+            usable = len(pending) - len(pending) % 4
+            if usable:
+                yield binascii.a2b_base64(pending[:usable])
+                pending = pending[usable:]
+        if pending:
+            # Fin tronquée : compléter le remplissage comme le fait email.message
+            try:
+                yield binascii.a2b_base64(pending + '=' * (-len(pending) % 4))
+            except binascii.Error:
+                logger.warning("Fin de pièce jointe base64 invalide ignorée")
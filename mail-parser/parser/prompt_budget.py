@@ -0,0 +1,103 @@
+import math
+import re
+from typing import Dict, Tuple
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # estimation locale si tiktoken est absent
+    _ENCODING = None
+
+# Début d'un message cité : « Le 3 mars 2024 à 10:00, X a écrit : », « On ... wrote: »,
+# séparateurs Outlook/Thunderbird et blocs d'en-têtes « De : / From: » de transfert.
+_REPLY_MARKERS = re.compile(
+    r"^\s*("
+    r"le .{0,120}a [ée]crit\s*:"
+    r"|on .{0,120}wrote\s*:"
+    r"|-{2,}\s*(original message|message d'origine|forwarded message|message transf[ée]r[ée])\s*-{2,}"
+    r"|_{10,}"
+    r"|(de|from)\s*:.*\n\s*(envoy[ée]|sent|date)\s*:"
+    r")",
+    re.IGNORECASE | re.MULTILINE
+)
+# Signature : délimiteur RFC 3676 « -- » ou pied de message mobile
+_SIGNATURE = re.compile(
+    r"^(-- ?|envoy[ée] de mon .*|sent from my .*|t[ée]l[ée]charger outlook pour .*|get outlook for .*)$",
+    re.IGNORECASE | re.MULTILINE
+)
+_QUOTED_LINE = re.compile(r"^[ \t]*>.*(\n|$)", re.MULTILINE)
+_SPACES = re.compile(r"[ \t ]+")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Part du budget gardée en tête lors d'une coupe (le reste va à la fin)
+HEAD_SHARE = 0.7
+# Tokens réservés au marqueur de coupe
+MARKER_TOKENS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Nombre de tokens du texte (tiktoken si installé, sinon ~4 caractères par token de mot)"""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text))
+
+
+def clean_body(body: str) -> Tuple[str, Dict]:
+    """Retirer l'historique cité, la signature et les espaces superflus"""
+    stats = {"quoted_chars": 0, "signature_chars": 0}
+
+    marker = _REPLY_MARKERS.search(body)
+    if marker and marker.start() > 0:
+        stats["quoted_chars"] += len(body) - marker.start()
+        body = body[:marker.start()]
+
+    without_quotes = _QUOTED_LINE.sub("", body)
+    stats["quoted_chars"] += len(body) - len(without_quotes)
+    body = without_quotes
+
+    signature = _SIGNATURE.search(body)
+    if signature and signature.start() > 0:
+        stats["signature_chars"] = len(body) - signature.start()
+        body = body[:signature.start()]
+
+    body = _SPACES.sub(" ", body)
+    body = _BLANK_LINES.sub("\n\n", body)
+    return body.strip(), stats
+
+
+def truncate_to_budget(text: str, max_tokens: int) -> Tuple[str, int]:
+    """Garder le début et la fin du texte dans `max_tokens` ; retourne (texte, caractères coupés)"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text, 0
+
+    # Caractères par token propres à ce texte
+    budget_chars = max(0, int(len(text) * (max_tokens - MARKER_TOKENS) / tokens))
+    head = int(budget_chars * HEAD_SHARE)
+    tail = budget_chars - head
+    cut = len(text) - head - tail
+    return f"{text[:head]}\n[... {cut} caractères coupés ...]\n{text[-tail:] if tail else ''}", cut
+
+
+def prepare_body(body: str, max_tokens: int) -> Tuple[str, Dict]:
+    """Corps prêt pour le prompt et mesures de ce qui a été retiré"""
+    body = body or ""
+    original_tokens = estimate_tokens(body)
+    cleaned, stats = clean_body(body)
+    if not cleaned:
+        # Message entièrement cité (transfert sans commentaire) : garder l'original
+        cleaned = _BLANK_LINES.sub("\n\n", _SPACES.sub(" ", body)).strip()
+        stats = {"quoted_chars": 0, "signature_chars": 0}
+    text, truncated_chars = truncate_to_budget(cleaned, max_tokens)
+
+    stats.update({
+        "original_chars": len(body),
+        "original_tokens": original_tokens,
+        "kept_chars": len(text),
+        "kept_tokens": estimate_tokens(text),
+        "truncated_chars": truncated_chars,
+    })
+    return text, stats
@@ -0,0 +1,221 @@
+"""Partitionnement mensuel de la table emails (par received_at).
+
+Chaque mois a sa partition (emails_pAAAAMM) ; une partition DEFAULT reçoit
+les dates hors plage. Les partitions expirées sont détachées puis
+supprimées d'un bloc, sans DELETE ni VACUUM sur la table chaude.
+"""
+import logging
+import re
+from datetime import datetime, timezone
+from typing import List, Optional
+
+logger = logging.getLogger("mail-parser.partitions")
+
+EMAILS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS emails (
+      id            BIGINT NOT NULL DEFAULT nextval('emails_id_seq'),
+      provider      TEXT NOT NULL,
+      account       TEXT NOT NULL DEFAULT '',
+      external_id   TEXT,
+      message_id    TEXT,
+      from_addr     TEXT,
+      to_addr       TEXT,
+      cc_addr       TEXT,
+      subject       TEXT,
+      sent_at       TIMESTAMPTZ,
+      received_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      raw_headers   TEXT,
+      raw_body      TEXT,
+      archive_uri   TEXT,  -- en-têtes et corps archivés (raw_* alors NULL)
+      mailbox       TEXT DEFAULT 'INBOX',
+      processed     BOOLEAN DEFAULT FALSE,
+      processed_at  TIMESTAMPTZ,
+      error         TEXT,
+      search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('french', COALESCE(subject, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(subject, '')), 'A') ||
+        setweight(to_tsvector('french', LEFT(COALESCE(raw_body, ''), 100000)), 'B') ||
+        setweight(to_tsvector('english', LEFT(COALESCE(raw_body, ''), 100000)), 'B')
+      ) STORED,
+      PRIMARY KEY (id, received_at)
+    ) PARTITION BY RANGE (received_at);
+"""
+
+# Index de l'ancienne table recréés sur la table partitionnée
+LEGACY_INDEXES = (
+    "uq_emails_source", "idx_emails_provider_extid", "idx_emails_received",
+    "idx_emails_provider_received", "idx_emails_mailbox_received", "idx_emails_processed",
+    "idx_emails_unprocessed", "idx_emails_search",
+)
+# Tables qui référençaient emails(id) par clé étrangère
+DEPENDENT_TABLES = ("analyses", "attachments", "analysis_jobs")
+
+_BOUNDS = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def month_start(moment: datetime, offset: int = 0) -> datetime:
+    """Premier jour (UTC) du mois de `moment`, décalé de `offset` mois"""
+    moment = moment.astimezone(timezone.utc)
+    index = moment.year * 12 + moment.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month: datetime) -> str:
+    return f"emails_p{month:%Y%m}"
+
+
+def _bound(value: str) -> Optional[datetime]:
+    value = value.strip()
+    if value.upper() in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def partitions(cur) -> List[dict]:
+    """Partitions de emails avec leurs bornes (None : MINVALUE / MAXVALUE)"""
+    cur.execute("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'emails'::regclass
+        ORDER BY c.relname;
+    """)
+    result = []
+    for name, bound in cur.fetchall():
+        match = _BOUNDS.search(bound)
+        result.append({
+            "name": name,
+            "default": match is None,
+            "from": _bound(match.group(1)) if match else None,
+            "to": _bound(match.group(2)) if match else None,
+        })
+    return result
+
+
+def ensure_partitions(cur, months_ahead: int = 2) -> List[str]:
+    """Créer les partitions du mois courant et des `months_ahead` suivants"""
+    existing = [p for p in partitions(cur) if not p["default"]]
+    created = []
+    now = datetime.now(timezone.utc)
+    for offset in range(months_ahead + 1):
+        start, end = month_start(now, offset), month_start(now, offset + 1)
+        # Mois déjà couvert (partition mensuelle ou ancienne table rattachée)
+        if any((p["from"] is None or p["from"] < end) and (p["to"] is None or p["to"] > start)
+               for p in existing):
+            continue
+        name = partition_name(start)
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF emails FOR VALUES FROM (%s) TO (%s);",
+            (start, end)
+        )
+        created.append(name)
+    cur.execute("CREATE TABLE IF NOT EXISTS emails_default PARTITION OF emails DEFAULT;")
+    if created:
+        logger.info(f"Partitions créées: {', '.join(created)}")
+    return created
+
+
+def migrate_legacy_emails(cur) -> bool:
+    """Convertir une table emails non partitionnée (installation existante).
+
+    L'ancienne table devient la partition emails_legacy (MINVALUE -> mois
+    prochain) : pas de copie de données, seules les contraintes et index
+    incompatibles sont remplacés. La clé primaire (id) devient (id,
+    received_at) comme celle de la table parente (un seul parcours pour
+    construire l'index). Les clés étrangères vers emails(id) sont retirées
+    (impossibles sans la clé de partition) : la suppression en cascade est
+    assurée par un trigger.
+    """
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('emails');")
+    row = cur.fetchone()
+    if row is None or row[0] != 'r':
+        return False
+
+    logger.info("Conversion de la table emails en table partitionnée...")
+    # Toutes les clés étrangères vers emails, quel que soit leur nom
+    cur.execute("""
+        SELECT conrelid::regclass::text, conname FROM pg_constraint
+        WHERE confrelid = 'emails'::regclass AND contype = 'f';
+    """)
+    for table, constraint in cur.fetchall():
+        cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}";')
+    cur.execute("""
+        SELECT tgname FROM pg_trigger WHERE tgrelid = 'emails'::regclass AND NOT tgisinternal;
+    """)
+    for (trigger,) in cur.fetchall():
+        cur.execute(f"DROP TRIGGER {trigger} ON emails;")
+    for index in LEGACY_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {index};")
+
+    cur.execute("""
+        SELECT conname FROM pg_constraint WHERE conrelid = 'emails'::regclass AND contype = 'p';
+    """)
+    row = cur.fetchone()
+    cur.execute("ALTER TABLE emails RENAME TO emails_legacy;")
+    # Une partition ne peut pas avoir d'autre clé primaire que celle de la parente
+    if row:
+        cur.execute(f'ALTER TABLE emails_legacy DROP CONSTRAINT "{row[0]}";')
+    cur.execute("ALTER TABLE emails_legacy ADD CONSTRAINT emails_legacy_pkey PRIMARY KEY (id, received_at);")
+    cur.execute(EMAILS_TABLE_DDL)
+    cur.execute("ALTER SEQUENCE emails_id_seq OWNED BY emails.id;")
+    upper = month_start(datetime.now(timezone.utc), 1)
+    cur.execute("ALTER TABLE emails ATTACH PARTITION emails_legacy FOR VALUES FROM (MINVALUE) TO (%s);", (upper,))
+    cur.execute("""
+        INSERT INTO email_keys (provider, account, mailbox, external_id, email_id, received_at)
+        SELECT provider, account, COALESCE(mailbox, 'INBOX'), external_id, id, received_at
+        FROM emails_legacy WHERE external_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    """)
+    logger.info(f"Table emails partitionnée (données existantes dans emails_legacy, jusqu'au {upper:%Y-%m-%d})")
+    return True
+
+
+def expired_partitions(cur, retention_months: int) -> List[dict]:
+    """Partitions entièrement antérieures à la fenêtre de rétention"""
+    if retention_months <= 0:
+        return []
+    cutoff = month_start(datetime.now(timezone.utc), -retention_months)
+    return [p for p in partitions(cur)
+            if not p["default"] and p["to"] is not None and p["to"] <= cutoff]
+
+
+def attachment_hashes(cur, email_ids_sql: str, params: tuple = ()) -> List[str]:
+    """Empreintes des pièces jointes des emails sélectionnés par `email_ids_sql`"""
+    cur.execute(f"""
+        SELECT DISTINCT content_sha256 FROM attachments
+        WHERE content_sha256 IS NOT NULL AND email_id IN ({email_ids_sql});
+    """, params)
+    return [sha256 for (sha256,) in cur.fetchall()]
+
+
+def remove_partition(cur, name: str, drop: bool = True) -> dict:
+    """Sortir une partition de emails (détacher, puis supprimer si `drop`).
+
+    Les lignes dépendantes (analyses, pièces jointes, jobs, clés) et les
+    compteurs de /stats sont mis à jour dans la même transaction. Retourne
+    le nombre d'emails, les URI d'archive à effacer après validation et les
+    empreintes des pièces jointes supprimées (à vérifier avant effacement :
+    un contenu peut être partagé avec des emails plus récents).
+    """
+    cur.execute(f"SELECT COUNT(*), array_remove(array_agg(archive_uri), NULL) FROM {name};")
+    count, archive_uris = cur.fetchone()
+    blob_hashes = attachment_hashes(cur, f"SELECT id FROM {name}")
+
+    # Compteurs /stats : DETACH/DROP ne déclenchent pas les triggers
+    cur.execute(f"""
+        INSERT INTO stats_deltas (hour, dimension, key, delta)
+        SELECT date_trunc('hour', received_at), 'provider', provider, -COUNT(*)
+        FROM {name} GROUP BY 1, 3
+        UNION ALL
+        SELECT date_trunc('hour', received_at), 'processed', '', -COUNT(*)
+        FROM {name} WHERE processed GROUP BY 1;
+    """)
+    for table in DEPENDENT_TABLES + ("email_keys",):
+        cur.execute(f"DELETE FROM {table} WHERE email_id IN (SELECT id FROM {name});")
+
+    cur.execute(f"ALTER TABLE emails DETACH PARTITION {name};")
+    if drop:
+        cur.execute(f"DROP TABLE {name};")
+    logger.info(f"Partition {name} {'supprimée' if drop else 'détachée'} ({count} emails)")
+    return {"partition": name, "emails": count, "archive_uris": archive_uris or [],
+            "blob_hashes": blob_hashes}
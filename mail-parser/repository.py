@@ -0,0 +1,602 @@
+"""Accès aux données : requêtes SQL utilisées par les handlers"""
+import logging
+from typing import Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from prometheus_client import Histogram
+
+logger = logging.getLogger("mail-parser.repository")
+
+# Durée des requêtes par groupe (lookup, ingest, read, search, queue, analysis, stats, maintenance)
+DB_SECONDS = Histogram(
+    "mailparser_db_statement_duration_seconds", "Durée des requêtes SQL par groupe", ["group"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+
+# Clé d'idempotence d'un email : (provider, account, mailbox, external_id)
+EMAIL_KEY_COLUMNS = "provider, account, mailbox, external_id"
+
+_EXISTING_EMAIL_COLUMNS = """
+    e.id, e.provider, e.account, e.mailbox, e.external_id,
+    e.from_addr, e.to_addr, e.subject,
+    a.category, a.sentiment, a.summary
+"""
+# Dernière analyse de chaque email (index idx_analyses_email_latest)
+_LATEST_ANALYSIS_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT id, summary, category, sentiment, score, created_at FROM analyses
+        WHERE analyses.email_id = e.id
+        ORDER BY created_at DESC, id DESC
+        LIMIT 1
+    ) a ON TRUE
+"""
+_EMAIL_LIST_COLUMNS = """
+    e.id, e.provider, e.account, e.external_id, e.message_id,
+    e.from_addr, e.to_addr, e.cc_addr, e.subject, e.sent_at, e.received_at,
+    e.mailbox, e.processed, e.processed_at, e.error,
+    a.id AS analysis_id, a.summary, a.category, a.sentiment, a.score,
+    a.created_at AS analysis_created_at
+"""
+
+
+@DB_SECONDS.labels("lookup").time()
+def find_email(cur, provider: str, account: str, mailbox: str, external_id: str) -> Optional[Dict]:
+    """Email déjà stocké pour cette clé, avec sa dernière analyse (None sinon)"""
+    cur.execute(f"""
+        SELECT {_EXISTING_EMAIL_COLUMNS}
+        FROM email_keys k
+        JOIN emails e ON e.id = k.email_id AND e.received_at = k.received_at
+        {_LATEST_ANALYSIS_JOIN}
+        WHERE k.provider = %s AND k.account = %s AND k.mailbox = %s AND k.external_id = %s;
+    """, (provider, account, mailbox, external_id))
+    return cur.fetchone()
+
+
+@DB_SECONDS.labels("ingest").time()
+def delete_stale_keys(cur, keys: List[tuple]) -> int:
+    """Libérer les clés réservées dont l'email n'existe plus (supprimé sans sa clé)"""
+    if not keys:
+        return 0
+    execute_values(cur, f"""
+        DELETE FROM email_keys k
+        USING (VALUES %s) AS v ({EMAIL_KEY_COLUMNS})
+        WHERE (k.provider, k.account, k.mailbox, k.external_id)
+              = (v.provider, v.account, v.mailbox, v.external_id)
+          AND NOT EXISTS (
+            SELECT 1 FROM emails e WHERE e.id = k.email_id AND e.received_at = k.received_at
+          );
+    """, keys, page_size=len(keys))
+    return cur.rowcount
+
+
+@DB_SECONDS.labels("lookup").time()
+def find_emails(cur, keys: List[tuple]) -> Dict[tuple, Dict]:
+    """Emails déjà stockés pour plusieurs clés, indexés par clé"""
+    if not keys:
+        return {}
+    rows = execute_values(cur, f"""
+        SELECT {_EXISTING_EMAIL_COLUMNS}
+        FROM (VALUES %s) AS v ({EMAIL_KEY_COLUMNS})
+        JOIN email_keys k USING ({EMAIL_KEY_COLUMNS})
+        JOIN emails e ON e.id = k.email_id AND e.received_at = k.received_at
+        {_LATEST_ANALYSIS_JOIN};
+    """, keys, page_size=len(keys), fetch=True)
+    return {(r['provider'], r['account'], r['mailbox'], r['external_id']): r for r in rows}
+
+
+def _email_filters(filters: Dict) -> tuple:
+    """Clauses WHERE (et paramètres) des filtres portant sur la table emails"""
+    clauses, params = [], []
+    for column in ('provider', 'mailbox'):
+        if filters.get(column) is not None:
+            clauses.append(f"e.{column} = %s")
+            params.append(filters[column])
+    if filters.get('since') is not None:
+        clauses.append("e.received_at >= %s")
+        params.append(filters['since'])
+    if filters.get('until') is not None:
+        clauses.append("e.received_at < %s")
+        params.append(filters['until'])
+    if filters.get('processed') is True:
+        clauses.append("e.processed")
+    elif filters.get('processed') is False:
+        clauses.append("NOT e.processed")
+    return clauses, params
+
+
+def emails_query(filters: Dict, after: Optional[tuple], limit: int) -> tuple:
+    """Requête de liste (SQL, paramètres) : filtres et pagination par clé.
+
+    Tri du plus récent au plus ancien sur (received_at, id) ; `after` est
+    le couple (received_at, id) du dernier email de la page précédente. Les
+    filtres sur l'analyse portent sur la dernière analyse de l'email.
+    """
+    clauses, params = _email_filters(filters)
+    for column in ('category', 'sentiment'):
+        if filters.get(column) is not None:
+            # Semi-jointure indexée (idx_analyses_<colonne>) puis contrôle sur la dernière analyse
+            clauses.append(f"e.id IN (SELECT email_id FROM analyses WHERE {column} = %s)")
+            clauses.append(f"a.{column} = %s")
+            params.extend([filters[column], filters[column]])
+    if after is not None:
+        clauses.append("(e.received_at, e.id) < (%s, %s)")
+        params.extend(after)
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""
+        SELECT {_EMAIL_LIST_COLUMNS}
+        FROM emails e
+        {_LATEST_ANALYSIS_JOIN}
+        {where}
+        ORDER BY e.received_at DESC, e.id DESC
+        LIMIT %s;
+    """
+    return sql, params + [limit]
+
+
+# Extraits surlignés : calculés sur la page seulement (ts_headline relit le texte)
+_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=25, MinWords=8"
+SEARCH_SORTS = {
+    # tri -> (expression de tri, type du curseur)
+    'rank': ("ts_rank_cd(e.search_vector, q.query, 32)", "real"),
+    'date': ("e.received_at", "timestamptz"),
+}
+
+
+def search_query(text: str, filters: Dict, after: Optional[tuple], limit: int,
+                 sort: str = 'rank') -> tuple:
+    """Recherche plein texte (SQL, paramètres) sur emails.search_vector (GIN).
+
+    La requête utilisateur (syntaxe websearch : "expression", -exclu, or)
+    est analysée en français et en anglais. Tri par pertinence ou par date,
+    pagination par clé sur (tri, id).
+    """
+    order, cursor_type = SEARCH_SORTS[sort]
+    clauses, params = _email_filters(filters)
+    if after is not None:
+        # Cast explicite : la valeur renvoyée doit se comparer exactement à la clé
+        clauses.append(f"({order}, e.id) < (%s::{cursor_type}, %s)")
+        params.extend(after)
+    where = "".join(f" AND {clause}" for clause in clauses)
+
+    sql = f"""
+        WITH q AS (
+            SELECT websearch_to_tsquery('french', %s) || websearch_to_tsquery('english', %s) AS query
+        ),
+        page AS (
+            SELECT e.id, {order} AS sort_key, ts_rank_cd(e.search_vector, q.query, 32) AS rank
+            FROM emails e, q
+            WHERE e.search_vector @@ q.query{where}
+            ORDER BY sort_key DESC, e.id DESC
+            LIMIT %s
+        )
+        SELECT {_EMAIL_LIST_COLUMNS}, page.sort_key, page.rank,
+               ts_headline('french', COALESCE(e.subject, ''), q.query,
+                           'StartSel=<mark>, StopSel=</mark>, HighlightAll=true') AS subject_highlight,
+               ts_headline('french', LEFT(COALESCE(e.raw_body, ''), 20000), q.query,
+                           '{_HEADLINE_OPTIONS}') AS snippet
+        FROM page
+        JOIN emails e ON e.id = page.id
+        CROSS JOIN q
+        {_LATEST_ANALYSIS_JOIN}
+        ORDER BY page.sort_key DESC, e.id DESC;
+    """
+    return sql, [text, text] + params + [limit]
+
+
+@DB_SECONDS.labels("search").time()
+def search_emails(cur, text: str, filters: Dict, after: Optional[tuple], limit: int,
+                  sort: str = 'rank') -> List[Dict]:
+    """Page de résultats de recherche, avec dernière analyse et extraits"""
+    sql, params = search_query(text, filters, after, limit, sort)
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+@DB_SECONDS.labels("read").time()
+def list_emails(cur, filters: Dict, after: Optional[tuple], limit: int) -> List[Dict]:
+    """Page d'emails avec leur dernière analyse (une seule requête)"""
+    sql, params = emails_query(filters, after, limit)
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+@DB_SECONDS.labels("read").time()
+def get_email(cur, email_id: int) -> Optional[Dict]:
+    """Email complet : en-têtes, corps, dernière analyse et pièces jointes"""
+    cur.execute(f"""
+        SELECT {_EMAIL_LIST_COLUMNS}, e.raw_headers, e.raw_body, e.archive_uri
+        FROM emails e
+        {_LATEST_ANALYSIS_JOIN}
+        WHERE e.id = %s;
+    """, (email_id,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+
+    cur.execute("""
+        SELECT id, email_id, filename, mime_type, size_bytes, storage_uri, content_sha256
+        FROM attachments WHERE email_id = %s ORDER BY id;
+    """, (email_id,))
+    row['attachments'] = cur.fetchall()
+    return row
+
+
+@DB_SECONDS.labels("ingest").time()
+def insert_email(cur, provider: str, account: str, external_id: str, mailbox: str,
+                 parsed_data: Dict) -> Optional[int]:
+    """Insérer un email déjà traité et retourner son id (None s'il existe déjà pour cette clé).
+
+    La clé est réservée dans email_keys (ON CONFLICT DO NOTHING) et l'email
+    n'est inséré que si la réservation a réussi, dans la même instruction.
+    """
+    cur.execute(f"""
+        WITH email_key AS (
+            INSERT INTO email_keys ({EMAIL_KEY_COLUMNS}, email_id, received_at)
+            VALUES (%s, %s, %s, %s, nextval('emails_id_seq'), NOW())
+            ON CONFLICT ({EMAIL_KEY_COLUMNS}) DO NOTHING
+            RETURNING email_id, received_at
+        )
+        INSERT INTO emails (
+            id, received_at, provider, account, external_id, message_id, from_addr, to_addr,
+            cc_addr, subject, sent_at, raw_headers, raw_body, mailbox,
+            processed, processed_at
+        )
+        SELECT email_id, received_at, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE, NOW()
+        FROM email_key
+        RETURNING id;
+    """, (
+        provider, account, mailbox, external_id,
+        provider,
+        account,
+        external_id,
+        parsed_data.get('message_id') or None,
+        parsed_data['from'],
+        parsed_data['to'],
+        parsed_data.get('cc', ''),
+        parsed_data['subject'],
+        parsed_data['sent_at'],
+        parsed_data['raw_headers'],
+        parsed_data['body'],
+        mailbox
+    ))
+    row = cur.fetchone()
+    return row['id'] if row else None
+
+
+@DB_SECONDS.labels("ingest").time()
+def insert_attachments(cur, email_id: int, attachments: List[Dict]):
+    """Insérer les métadonnées des pièces jointes (contenu déjà stocké)"""
+    for attachment in attachments:
+        cur.execute("""
+            INSERT INTO attachments (email_id, filename, mime_type, size_bytes, storage_uri, content_sha256)
+            VALUES (%s, %s, %s, %s, %s, %s);
+        """, (
+            email_id,
+            attachment['filename'],
+            attachment['content_type'],
+            attachment['size'],
+            attachment.get('storage_uri'),
+            attachment.get('sha256')
+        ))
+
+
+@DB_SECONDS.labels("read").time()
+def get_attachment(cur, email_id: int, attachment_id: int) -> Optional[Dict]:
+    """Métadonnées d'une pièce jointe d'un email"""
+    cur.execute("""
+        SELECT id, email_id, filename, mime_type, size_bytes, storage_uri, content_sha256
+        FROM attachments WHERE id = %s AND email_id = %s;
+    """, (attachment_id, email_id))
+    return cur.fetchone()
+
+
+@DB_SECONDS.labels("maintenance").time()
+def unreferenced_blobs(cur, hashes: List[str]) -> List[str]:
+    """Empreintes qui ne sont plus référencées par aucune pièce jointe"""
+    if not hashes:
+        return []
+    cur.execute("""
+        SELECT h FROM unnest(%s::text[]) AS h
+        WHERE NOT EXISTS (SELECT 1 FROM attachments WHERE content_sha256 = h);
+    """, (list(hashes),))
+    return [row[0] for row in cur.fetchall()]
+
+
+@DB_SECONDS.labels("analysis").time()
+def insert_analysis(cur, email_id: int, analysis: Dict):
+    """Sauvegarder le résultat d'une analyse IA"""
+    cur.execute("""
+        INSERT INTO analyses (email_id, summary, category, sentiment, score)
+        VALUES (%s, %s, %s, %s, %s);
+    """, (
+        email_id,
+        analysis.get('summary'),
+        analysis.get('category'),
+        analysis.get('sentiment'),
+        analysis.get('score', 0.5)
+    ))
+
+
+@DB_SECONDS.labels("ingest").time()
+def insert_emails_batch(cur, rows: List[Dict]) -> Dict[tuple, int]:
+    """Insérer plusieurs emails déjà traités en une requête multi-lignes.
+
+    Chaque ligne contient provider, account, external_id, mailbox et
+    parsed_data. Les lignes dont la clé existe déjà (ou est répétée dans le
+    lot) sont ignorées ; retourne les ids insérés, indexés par clé.
+    """
+    values = [(
+        row['provider'],
+        row['account'],
+        row['external_id'],
+        row['parsed_data'].get('message_id') or None,
+        row['parsed_data']['from'],
+        row['parsed_data']['to'],
+        row['parsed_data'].get('cc', ''),
+        row['parsed_data']['subject'],
+        row['parsed_data']['sent_at'],
+        row['parsed_data']['raw_headers'],
+        row['parsed_data']['body'],
+        row['mailbox'],
+        idx
+    ) for idx, row in enumerate(rows)]
+
+    result = execute_values(cur, f"""
+        WITH input (
+            provider, account, external_id, message_id, from_addr, to_addr, cc_addr,
+            subject, sent_at, raw_headers, raw_body, mailbox, ord
+        ) AS (VALUES %s),
+        numbered AS MATERIALIZED (
+            SELECT input.*, nextval('emails_id_seq') AS id, NOW() AS received_at
+            FROM input ORDER BY ord
+        ),
+        email_keys_inserted AS (
+            INSERT INTO email_keys ({EMAIL_KEY_COLUMNS}, email_id, received_at)
+            SELECT {EMAIL_KEY_COLUMNS}, id, received_at FROM numbered ORDER BY ord
+            ON CONFLICT ({EMAIL_KEY_COLUMNS}) DO NOTHING
+            RETURNING email_id
+        )
+        INSERT INTO emails (
+            id, received_at, provider, account, external_id, message_id, from_addr, to_addr,
+            cc_addr, subject, sent_at, raw_headers, raw_body, mailbox,
+            processed, processed_at
+        )
+        SELECT n.id, n.received_at, n.provider, n.account, n.external_id, n.message_id,
+               n.from_addr, n.to_addr, n.cc_addr, n.subject, n.sent_at::timestamptz,
+               n.raw_headers, n.raw_body, n.mailbox, TRUE, NOW()
+        FROM numbered n
+        JOIN email_keys_inserted k ON k.email_id = n.id
+        ORDER BY n.ord
+        RETURNING id, {EMAIL_KEY_COLUMNS};
+    """, values, page_size=len(values) or 1, fetch=True)
+    return {(r['provider'], r['account'], r['mailbox'], r['external_id']): r['id'] for r in result}
+
+
+@DB_SECONDS.labels("ingest").time()
+def insert_attachments_batch(cur, rows: List[tuple]):
+    """Insérer des pièces jointes (email_id, filename, mime_type, size_bytes, storage_uri, content_sha256)"""
+    if not rows:
+        return
+    execute_values(cur, """
+        INSERT INTO attachments (email_id, filename, mime_type, size_bytes, storage_uri, content_sha256)
+        VALUES %s;
+    """, rows, page_size=1000)
+
+
+@DB_SECONDS.labels("analysis").time()
+def insert_analyses_batch(cur, rows: List[tuple]):
+    """Insérer des analyses (email_id, summary, category, sentiment, score)"""
+    if not rows:
+        return
+    execute_values(cur, """
+        INSERT INTO analyses (email_id, summary, category, sentiment, score)
+        VALUES %s;
+    """, rows, page_size=1000)
+
+
+@DB_SECONDS.labels("stats").time()
+def compact_stats(cur) -> int:
+    """Reporter les deltas des triggers dans stats_hourly et stats_totals.
+
+    Un seul compacteur à la fois (verrou consultatif) ; les deltas insérés
+    pendant la compaction restent pour la suivante.
+    """
+    cur.execute("""
+        WITH lock AS (
+            SELECT pg_try_advisory_xact_lock(hashtext('stats_compact')) AS acquired
+        ),
+        moved AS (
+            DELETE FROM stats_deltas
+            WHERE (SELECT acquired FROM lock)
+            RETURNING hour, dimension, key, delta
+        ),
+        hourly AS (
+            INSERT INTO stats_hourly (hour, dimension, key, value)
+            SELECT hour, dimension, key, SUM(delta) FROM moved GROUP BY 1, 2, 3
+            ON CONFLICT (hour, dimension, key) DO UPDATE
+            SET value = stats_hourly.value + EXCLUDED.value
+        )
+        INSERT INTO stats_totals (dimension, key, value)
+        SELECT dimension, key, SUM(delta) FROM moved GROUP BY 1, 2
+        ON CONFLICT (dimension, key) DO UPDATE
+        SET value = stats_totals.value + EXCLUDED.value;
+    """)
+    return cur.rowcount
+
+
+@DB_SECONDS.labels("stats").time()
+def fetch_stats(cur, rate_hours: int = 24) -> Dict:
+    """Compteurs pour /stats, lus dans les tables de compteurs (sans scanner emails)"""
+    cur.execute("""
+        SELECT dimension, key, SUM(value)::BIGINT AS value
+        FROM (
+            SELECT dimension, key, value FROM stats_totals
+            UNION ALL
+            SELECT dimension, key, delta FROM stats_deltas
+        ) counters
+        GROUP BY dimension, key;
+    """)
+    breakdowns: Dict[str, Dict[str, int]] = {}
+    for row in cur.fetchall():
+        if row['value']:
+            breakdowns.setdefault(row['dimension'], {})[row['key']] = row['value']
+
+    cur.execute("""
+        SELECT hour, SUM(value)::BIGINT AS emails
+        FROM (
+            SELECT hour, value FROM stats_hourly
+            WHERE dimension = 'provider' AND hour >= date_trunc('hour', NOW()) - make_interval(hours => %s)
+            UNION ALL
+            SELECT hour, delta FROM stats_deltas
+            WHERE dimension = 'provider' AND hour >= date_trunc('hour', NOW()) - make_interval(hours => %s)
+        ) ingest
+        GROUP BY hour
+        ORDER BY hour;
+    """, (rate_hours, rate_hours))
+    ingest_per_hour = [
+        {"hour": row['hour'].isoformat(), "emails": row['emails']} for row in cur.fetchall()
+    ]
+
+    by_provider = breakdowns.get('provider', {})
+    by_category = breakdowns.get('category', {})
+    return {
+        "total_emails": sum(by_provider.values()),
+        "analyzed_emails": sum(by_category.values()),
+        "processed_emails": breakdowns.get('processed', {}).get('', 0),
+        "by_provider": by_provider,
+        "by_category": by_category,
+        "by_sentiment": breakdowns.get('sentiment', {}),
+        "ingest_per_hour": ingest_per_hour,
+    }
+
+
+@DB_SECONDS.labels("queue").time()
+def enqueue_analyses(cur, email_ids: List[int]):
+    """Créer un job d'analyse IA par email (ignoré s'il existe déjà)"""
+    if not email_ids:
+        return
+    execute_values(cur, """
+        INSERT INTO analysis_jobs (email_id) VALUES %s
+        ON CONFLICT (email_id) DO NOTHING;
+    """, [(email_id,) for email_id in email_ids], page_size=1000)
+
+
+@DB_SECONDS.labels("queue").time()
+def claim_analysis_jobs(cur, limit: int, lock_timeout_seconds: float) -> List[Dict]:
+    """Réserver jusqu'à `limit` jobs prêts (SKIP LOCKED : pas d'attente entre workers).
+
+    Un job resté 'running' plus de `lock_timeout_seconds` (worker arrêté en
+    cours de route) est repris. Chaque job contient l'email à analyser sous
+    la clé 'email' (absente si l'email a été supprimé).
+    """
+    cur.execute("""
+        UPDATE analysis_jobs j
+        SET status = 'running', attempts = j.attempts + 1,
+            locked_at = NOW(), updated_at = NOW()
+        FROM (
+            SELECT id FROM analysis_jobs
+            WHERE (status = 'pending' AND run_after <= NOW())
+               OR (status = 'running' AND locked_at < NOW() - make_interval(secs => %s))
+            ORDER BY run_after, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ) next_job
+        WHERE j.id = next_job.id
+        RETURNING j.id, j.email_id, j.attempts;
+    """, (lock_timeout_seconds, limit))
+    jobs = cur.fetchall()
+    if not jobs:
+        return []
+
+    cur.execute("""
+        SELECT id, from_addr, to_addr, cc_addr, subject, raw_body
+        FROM emails WHERE id = ANY(%s);
+    """, ([job['email_id'] for job in jobs],))
+    emails = {row['id']: row for row in cur.fetchall()}
+
+    for job in jobs:
+        email_row = emails.get(job['email_id'])
+        if email_row:
+            job['email'] = {
+                'from': email_row['from_addr'] or '',
+                'to': email_row['to_addr'] or '',
+                'cc': email_row['cc_addr'] or '',
+                'subject': email_row['subject'] or '',
+                'body': email_row['raw_body'] or '',
+            }
+    return sorted(jobs, key=lambda job: job['id'])
+
+
+@DB_SECONDS.labels("queue").time()
+def complete_analysis_job(cur, job_id: int):
+    """Marquer un job comme terminé"""
+    cur.execute("""
+        UPDATE analysis_jobs
+        SET status = 'done', locked_at = NULL, last_error = NULL, updated_at = NOW()
+        WHERE id = %s;
+    """, (job_id,))
+
+
+@DB_SECONDS.labels("queue").time()
+def fail_analysis_job(cur, job_id: int, error: str, retry_in_seconds: Optional[float]):
+    """Replanifier un job en échec, ou le passer en 'dead' (retry_in_seconds=None)"""
+    if retry_in_seconds is None:
+        cur.execute("""
+            UPDATE analysis_jobs
+            SET status = 'dead', locked_at = NULL, last_error = %s, updated_at = NOW()
+            WHERE id = %s;
+        """, (error, job_id))
+    else:
+        cur.execute("""
+            UPDATE analysis_jobs
+            SET status = 'pending', locked_at = NULL, last_error = %s,
+                run_after = NOW() + make_interval(secs => %s), updated_at = NOW()
+            WHERE id = %s;
+        """, (error, retry_in_seconds, job_id))
+
+
+@DB_SECONDS.labels("queue").time()
+def requeue_dead_jobs(cur) -> int:
+    """Remettre en file les jobs en échec définitif"""
+    cur.execute("""
+        UPDATE analysis_jobs
+        SET status = 'pending', attempts = 0, run_after = NOW(), updated_at = NOW()
+        WHERE status = 'dead';
+    """)
+    return cur.rowcount
+
+
+@DB_SECONDS.labels("queue").time()
+def fetch_queue_stats(cur) -> Dict:
+    """Taille de la file d'analyse par statut et âge du plus ancien job en attente"""
+    cur.execute("SELECT status, COUNT(*) AS count FROM analysis_jobs GROUP BY status;")
+    counts = {row['status']: row['count'] for row in cur.fetchall()}
+
+    cur.execute("""
+        SELECT EXTRACT(EPOCH FROM NOW() - MIN(created_at)) AS oldest
+        FROM analysis_jobs WHERE status = 'pending';
+    """)
+    oldest = cur.fetchone()['oldest']
+
+    return {
+        "pending": counts.get('pending', 0),
+        "running": counts.get('running', 0),
+        "done": counts.get('done', 0),
+        "dead": counts.get('dead', 0),
+        "oldest_pending_seconds": round(float(oldest), 1) if oldest is not None else None
+    }
+
+
+@DB_SECONDS.labels("queue").time()
+def fetch_backlog(cur) -> Dict:
+    """Jobs en attente et en cours (index partiel idx_analysis_jobs_ready)"""
+    cur.execute("""
+        SELECT COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+               COUNT(*) FILTER (WHERE status = 'running') AS running
+        FROM analysis_jobs WHERE status IN ('pending', 'running');
+    """)
+    row = cur.fetchone()
+    return {"pending": row['pending'], "running": row['running']}
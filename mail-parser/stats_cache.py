@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from psycopg2.extras import RealDictCursor
+
+from database import Database
+import repository
+
+logger = logging.getLogger("mail-parser.stats")
+
+
+class StatsCache:
+    """Statistiques de /stats gardées en mémoire quelques secondes.
+
+    Les requêtes simultanées partagent un seul rafraîchissement (une tâche
+    en vol, attendue par tous) : N tableaux de bord qui interrogent /stats
+    en même temps coûtent une lecture des compteurs, pas N. La compaction
+    des deltas est faite au passage, au plus toutes les STATS_COMPACT_SECONDS.
+    """
+
+    def __init__(self, database: Database):
+        self.db = database
+        self.ttl = float(os.getenv("STATS_CACHE_TTL_SECONDS", "5"))
+        self.compact_interval = float(os.getenv("STATS_COMPACT_SECONDS", "60"))
+        self.rate_hours = int(os.getenv("STATS_RATE_HOURS", "24"))
+
+        self._value: Optional[Dict] = None
+        self._expires_at = 0.0
+        self._inflight: Optional[asyncio.Future] = None
+        self._last_compaction = 0.0
+        self.hits = 0
+        self.refreshes = 0
+        self.coalesced = 0
+
+    def _read(self) -> Dict:
+        """Compacter si besoin puis lire les compteurs (bloquant, hors boucle)"""
+        with self.db.connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                if time.monotonic() - self._last_compaction >= self.compact_interval:
+                    moved = repository.compact_stats(cur)
+                    conn.commit()
+                    self._last_compaction = time.monotonic()
+                    logger.debug(f"Compteurs compactés ({moved} lignes)")
+                stats = repository.fetch_stats(cur, self.rate_hours)
+            conn.rollback()
+        return stats
+
+    async def _refresh(self) -> Dict:
+        try:
+            stats = await self.db.run(self._read)
+            self.refreshes += 1
+            self._value = stats
+            self._expires_at = time.monotonic() + self.ttl
+            return stats
+        finally:
+            self._inflight = None
+
+    async def get(self) -> Dict:
+        """Statistiques en cache, ou rafraîchies une seule fois pour tous les appelants"""
+        if self._value is not None and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._value
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh())
+        else:
+            self.coalesced += 1
+        # shield : l'annulation d'un appelant n'interrompt pas la lecture partagée
+        return await asyncio.shield(self._inflight)
+
+    def metrics(self) -> Dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "coalesced": self.coalesced,
+        }
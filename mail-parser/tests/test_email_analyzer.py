@@ -0,0 +1,82 @@
+"""Décodage des pièces jointes par EmailAnalyzer.
+
+_raw_payload lit Message._payload (attribut privé de email.message) pour
+éviter la copie faite par get_payload() : ces tests vérifient qu'il rend le
+même objet que get_payload(), et que le décodage base64 par tranches donne
+les mêmes octets que get_payload(decode=True).
+
+    cd mail-parser
+    python -m unittest discover -s tests -v
+"""
+import email
+import os
+import sys
+import unittest
+from email.mime.application import MIMEApplication
+from email.mime.message import MIMEMessage
+from email.mime.multipart import MIMEMultipart
+from email.mime.nonmultipart import MIMENonMultipart
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from parser import email_analyzer  # noqa: E402
+from parser.email_analyzer import EmailAnalyzer, _raw_payload  # noqa: E402
+
+# Plus de deux tranches de décodage, taille non multiple de 3 (remplissage '=')
+CONTENT = bytes(range(256)) * (email_analyzer.DECODE_CHUNK_CHARS // 128) + b"fin"
+
+
+def _build_message() -> bytes:
+    msg = MIMEMultipart()
+    msg["Subject"] = "Pièces jointes"
+    msg.attach(MIMEText("Corps du message, accentué.", "plain", "utf-8"))
+    attachment = MIMEApplication(CONTENT, "octet-stream")
+    attachment.add_header("Content-Disposition", "attachment", filename="donnees.bin")
+    msg.attach(attachment)
+    text = MIMENonMultipart("text", "plain", charset="utf-8")
+    text["Content-Transfer-Encoding"] = "quoted-printable"
+    text.set_payload("ligne =C3=A9 " * 50)
+    text.add_header("Content-Disposition", "attachment", filename="notes.txt")
+    msg.attach(text)
+    forwarded = MIMEMessage(MIMEText("Message transféré", "plain", "utf-8"))
+    forwarded.add_header("Content-Disposition", "attachment", filename="transfere.eml")
+    msg.attach(forwarded)
+    return msg.as_bytes()
+
+
+class RawPayloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.msg = email.message_from_bytes(_build_message())
+        self.parts = list(self.msg.walk())
+
+    def test_same_object_as_get_payload(self):
+        for part in self.parts:
+            with self.subTest(part.get_content_type()):
+                self.assertIs(_raw_payload(part), part.get_payload())
+
+    def test_shapes(self):
+        shapes = {part.get_content_type(): type(_raw_payload(part)) for part in self.parts}
+        self.assertIs(shapes["multipart/mixed"], list)
+        self.assertIs(shapes["message/rfc822"], list)
+        self.assertIs(shapes["application/octet-stream"], str)
+
+    def test_streamed_decode_matches_get_payload(self):
+        analyzer = EmailAnalyzer()
+        for part in self.parts:
+            if part.is_multipart() or part.get_content_type() == "message/rfc822":
+                continue
+            with self.subTest(part.get_content_type()):
+                streamed = b"".join(analyzer._iter_decoded(part))
+                self.assertEqual(streamed, part.get_payload(decode=True))
+
+    def test_attachment_sizes(self):
+        attachments = EmailAnalyzer().parse_raw_email(_build_message())["attachments"]
+        sizes = {a["filename"]: a["size"] for a in attachments}
+        self.assertEqual(sizes["donnees.bin"], len(CONTENT))
+        self.assertEqual(sizes["notes.txt"], len(("ligne é " * 50).encode()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+"""Plans de GET /emails : chaque filtre doit pouvoir passer par un index.
+
+Les requêtes sont construites par repository.emails_query (les mêmes que
+l'API) puis passées à EXPLAIN (FORMAT JSON). Un parcours séquentiel de
+`emails` (ou d'une de ses partitions) ou de `analyses` fait échouer le cas.
+`enable_seqscan` est désactivé : sur une base de test presque vide le
+planificateur préfère un parcours séquentiel, on vérifie donc qu'un index
+*peut* servir.
+
+Nécessite PostgreSQL (ignoré sans MAIL_PARSER_DATABASE_URL) ; le schéma est
+créé par app.init_database :
+
+    cd mail-parser
+    MAIL_PARSER_DATABASE_URL=postgresql://... python -m unittest discover -s tests -v
+"""
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+DATABASE_URL = os.getenv("MAIL_PARSER_DATABASE_URL")
+
+NOW = datetime.now(timezone.utc)
+CURSOR = (NOW - timedelta(days=1), 10 ** 9)
+
+# (nom, filtres, curseur)
+CASES = [
+    ("sans filtre", {}, None),
+    ("page suivante", {}, CURSOR),
+    ("provider", {"provider": "imap"}, CURSOR),
+    ("mailbox", {"mailbox": "INBOX"}, CURSOR),
+    ("période", {"since": NOW - timedelta(days=7), "until": NOW}, None),
+    ("non traités", {"processed": False}, None),
+    ("traités", {"processed": True}, CURSOR),
+    ("catégorie", {"category": "facture"}, None),
+    ("sentiment", {"sentiment": "negatif"}, CURSOR),
+    ("combinés", {"provider": "imap", "category": "facture", "since": NOW - timedelta(days=30)}, None),
+]
+TABLES = {"emails", "analyses"}
+
+
+def _table(relation):
+    """Partitions mensuelles de emails (emails_pAAAAMM, emails_legacy...) ramenées à emails"""
+    if relation and relation.startswith("emails_"):
+        return "emails"
+    return relation
+
+
+def _walk(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+@unittest.skipUnless(DATABASE_URL, "MAIL_PARSER_DATABASE_URL non défini")
+class EmailIndexPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import psycopg2
+
+        import app
+
+        app.db.open()
+        try:
+            app.init_database()
+        finally:
+            app.db.close()
+        cls.conn = psycopg2.connect(DATABASE_URL)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def test_filters_use_indexes(self):
+        import repository
+
+        with self.conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off;")
+            for name, filters, cursor in CASES:
+                with self.subTest(name):
+                    sql, params = repository.emails_query(filters, cursor, 51)
+                    cur.execute("EXPLAIN (FORMAT JSON) " + sql.strip().rstrip(";"), params)
+                    nodes = list(_walk(cur.fetchone()[0][0]["Plan"]))
+                    seq_scans = sorted({
+                        n["Relation Name"] for n in nodes
+                        if n["Node Type"] == "Seq Scan" and _table(n.get("Relation Name")) in TABLES
+                    })
+                    self.assertEqual(seq_scans, [], f"parcours séquentiel pour « {name} »")
+        self.conn.rollback()
+
+
+if __name__ == "__main__":
+    unittest.main()